@@ -0,0 +1,215 @@
+"""Multi-image, multi-process batch runner for the test.py pipeline.
+
+    python3 batch.py photos/ 'corpus/**/*.jpg' --output batch_output -j 8
+
+Every image is a job with its own output namespace
+(<output>/<job id>/) holding the Huffman codes, bitstreams and a log,
+so concurrent jobs never share files. Jobs are handed to a process pool one
+at a time (imap_unordered with chunksize=1), so idle workers keep pulling
+the next image instead of waiting on a fixed partition. Every finished job
+is appended to <output>/manifest.jsonl; a rerun skips the sources already
+recorded there unless --restart is given.
+
+The Chisel test harness writes to a fixed hw_output/ directory, so batch
+jobs run the bit-exact software model of unittest.py (DCT, quantization,
+zigzag, then RLE and Delta as in jpegModel.scala) in place of sbt, and the
+rest of the test.py pipeline unchanged.
+"""
+import argparse
+import contextlib
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+
+import numpy as np
+
+import srcpath  # noqa: F401
+from huffman_backend import build_library
+from huffman_table import COMPONENT_TABLES, COMPONENTS
+from test import create_bitstream, perform_huffman_coding, read_blocks
+from unittest import JPEGDCT, JPEGQuantization, JPEGZigzag
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.ppm', '.tif', '.tiff')
+MANIFEST = 'manifest.jsonl'
+
+
+def find_images(patterns, extensions=IMAGE_EXTENSIONS):
+    """Expand directories (recursively), globs and files into image paths."""
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for root, _, files in os.walk(pattern):
+                paths.extend(os.path.join(root, name) for name in files
+                             if name.lower().endswith(extensions))
+        else:
+            paths.extend(path for path in glob.glob(pattern, recursive=True)
+                         if os.path.isfile(path))
+    return sorted(set(os.path.abspath(path) for path in paths))
+
+
+def job_id(path):
+    """Output directory name of an image: its stem plus a path hash."""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    digest = hashlib.sha1(path.encode('utf-8')).hexdigest()[:10]
+    return f"{stem}-{digest}"
+
+
+def run_length(zigzag):
+    """RLE of a zigzag vector as (count, value) pairs, as RLE in jpegModel"""
+    zigzag = np.asarray(zigzag)
+    starts = np.flatnonzero(np.diff(zigzag, prepend=zigzag[0] - 1))
+    counts = np.diff(starts, append=len(zigzag))
+    pairs = np.empty(2 * len(starts), dtype=np.int64)
+    pairs[0::2] = counts
+    pairs[1::2] = zigzag[starts]
+    return pairs.tolist()
+
+
+def software_encode(blocks):
+    """RLE and Delta data of the software model, shaped like
+    `read_encoded_blocks` output.
+
+    Args:
+        blocks: {'Y': blocks, 'Cb': blocks, 'Cr': blocks} from read_blocks
+
+    Returns:
+        (rle_data, delta_data)
+    """
+    dct = JPEGDCT()
+    zigzag = JPEGZigzag()
+    rle_data, delta_data = {}, {}
+    for component in COMPONENTS:
+        quant = JPEGQuantization(qt_choice=COMPONENT_TABLES[component][0])
+        scanned = zigzag.scan_blocks(
+            quant.quantize(dct.process_blocks(np.asarray(blocks[component]))))
+        rle_data[component] = [run_length(row) for row in scanned]
+        # The Delta output of a block starts with its own DC value.
+        delta_data[component] = [[int(row[0])] for row in scanned]
+    return rle_data, delta_data
+
+
+def run_job(job):
+    """Run the pipeline on one image inside its own output directory."""
+    source, output_dir, backend = job
+    os.makedirs(output_dir, exist_ok=True)
+    start = time.perf_counter()
+    record = {'source': source, 'output': output_dir,
+              'input_bytes': os.path.getsize(source)}
+    try:
+        with open(os.path.join(output_dir, 'log.txt'), 'w') as log, \
+                contextlib.redirect_stdout(log):
+            blocks = dict(zip(('Y', 'Cb', 'Cr'), read_blocks(source)))
+            rle_data, delta_data = software_encode(blocks)
+            perform_huffman_coding({"RLE": rle_data, "Delta": delta_data},
+                                   output_dir=output_dir, backend=backend)
+            bitstream_dir = os.path.join(output_dir, 'bitstream')
+            create_bitstream(rle_data, delta_data, output_dir=bitstream_dir)
+        record['status'] = 'ok'
+        record['output_bytes'] = sum(
+            os.path.getsize(os.path.join(bitstream_dir, name))
+            for name in os.listdir(bitstream_dir))
+        record['pixels'] = int(blocks['Y'].size)
+    except Exception as e:
+        record['status'] = 'error'
+        record['error'] = f"{type(e).__name__}: {e}"
+    record['seconds'] = time.perf_counter() - start
+    return record
+
+
+def read_manifest(output_root):
+    """Sources already completed in an earlier run."""
+    path = os.path.join(output_root, MANIFEST)
+    done = set()
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue    # Truncated by an interrupted run
+                if record.get('status') == 'ok':
+                    done.add(record['source'])
+    return done
+
+
+def run_batch(sources, output_root, workers=None, restart=False,
+              backend="python"):
+    """Run every source through the pipeline on a pool of processes.
+
+    Returns:
+        dict: Throughput summary of the jobs run in this invocation
+    """
+    os.makedirs(output_root, exist_ok=True)
+    manifest_path = os.path.join(output_root, MANIFEST)
+    if restart and os.path.exists(manifest_path):
+        os.remove(manifest_path)
+    done = read_manifest(output_root)
+    jobs = [(source, os.path.join(output_root, job_id(source)), backend)
+            for source in sources if source not in done]
+
+    if backend == "c":
+        build_library()    # Once, before the workers need it
+
+    summary = {'images': 0, 'skipped': len(sources) - len(jobs), 'errors': 0,
+               'input_bytes': 0, 'raw_bytes': 0, 'output_bytes': 0}
+    start = time.perf_counter()
+    with multiprocessing.Pool(workers) as pool, \
+            open(manifest_path, 'a') as manifest:
+        for record in pool.imap_unordered(run_job, jobs, chunksize=1):
+            manifest.write(json.dumps(record) + "\n")
+            manifest.flush()
+            if record['status'] == 'ok':
+                summary['images'] += 1
+                summary['input_bytes'] += record['input_bytes']
+                summary['output_bytes'] += record['output_bytes']
+                summary['raw_bytes'] += 3 * record['pixels']
+            else:
+                summary['errors'] += 1
+                print(f"Failed {record['source']}: {record['error']}")
+    elapsed = time.perf_counter() - start
+    summary['seconds'] = elapsed
+    summary['images_per_s'] = summary['images'] / elapsed if elapsed else 0.0
+    summary['mb_per_s'] = (summary['input_bytes'] / 1e6 / elapsed
+                           if elapsed else 0.0)
+    return summary
+
+
+def print_summary(summary):
+    print(f"\nBatch Results:")
+    print(f"Images: {summary['images']} "
+          f"(skipped {summary['skipped']}, failed {summary['errors']})")
+    print(f"Elapsed: {summary['seconds']:.2f}s")
+    print(f"Throughput: {summary['images_per_s']:.2f} images/s, "
+          f"{summary['mb_per_s']:.2f} MB/s")
+    if summary['output_bytes']:
+        # Same measure as test.py: Y, Cb and Cr samples over bitstream bytes
+        print(f"Compression ratio: "
+              f"{summary['raw_bytes'] / summary['output_bytes']:.2f}:1")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Run the JPEG encode pipeline over many images')
+    parser.add_argument('inputs', nargs='+',
+                        help='Image files, directories or glob patterns')
+    parser.add_argument('--output', default='batch_output',
+                        help='Root of the per-job output directories')
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help='Worker processes (default: CPU count)')
+    parser.add_argument('--restart', action='store_true',
+                        help='Ignore the manifest and rerun every image')
+    parser.add_argument('--huffman-backend', choices=['python', 'c'],
+                        default='python',
+                        help='Huffman coder used by perform_huffman_coding')
+    args = parser.parse_args()
+
+    sources = find_images(args.inputs)
+    print(f"Found {len(sources)} images")
+    print_summary(run_batch(sources, args.output, args.workers,
+                            args.restart, args.huffman_backend))
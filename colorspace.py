@@ -0,0 +1,83 @@
+"""Fused RGB -> YCbCr + level shift + 8x8 blocking.
+
+The Chisel encoder takes YCbCr samples; the color conversion in front of it
+is PIL's `convert('YCbCr')` (read_bmp). `rgb_to_ycbcr_blocks` reproduces
+that conversion bit for bit (checked over all 2**24 RGB values) with the
+same fixed-point scheme: per-channel lookup tables of the JFIF coefficients
+scaled by 2**6, summed and shifted right by 6 bits. It reads the RGB buffer
+once in block order and writes level-shifted int16 Y, Cb and Cr straight
+into (N, 8, 8) block stacks, replacing convert + split + np.array +
+extract_blocks.
+"""
+import numpy as np
+
+import profiler
+
+SCALE_BITS = 6
+
+# JFIF coefficients (rows: Y, Cb, Cr; columns: R, G, B).
+YCBCR_COEFFICIENTS = np.array([
+    [0.29900, 0.58700, 0.11400],
+    [-0.16874, -0.33126, 0.50000],
+    [0.50000, -0.41869, -0.08131],
+])
+
+
+def _lookup_table(coefficient):
+    """round(coefficient * v * 2**SCALE_BITS) for every sample value v.
+
+    Negative entries are one larger than the rounded product (except at 0),
+    exactly as in PIL's tables.
+    """
+    values = np.arange(256)
+    table = np.rint(coefficient * (1 << SCALE_BITS) * values)
+    if coefficient < 0:
+        table += values > 0
+    return table.astype(np.int16)
+
+
+# COLOR_TABLES[component, channel] is a 256-entry int16 table; every sum of
+# three entries fits int16.
+COLOR_TABLES = np.array([[_lookup_table(c) for c in row]
+                         for row in YCBCR_COEFFICIENTS])
+# Level shift of each component after the right shift: Y is stored with a
+# -128 shift, Cb and Cr carry a +128 offset that the shift cancels.
+LEVEL_OFFSETS = (-128, 0, 0)
+
+
+@profiler.traced()
+def rgb_to_ycbcr_blocks(rgb):
+    """Convert an RGB image to level-shifted YCbCr blocks in one pass.
+
+    Args:
+        rgb : (H, W, 3) uint8 array (any strides, e.g. from ingest.load_rgb)
+              with H and W multiples of 8.
+
+    Returns:
+        (y_blocks, cb_blocks, cr_blocks) : (N, 8, 8) int16 stacks in raster
+        block order, equal to extract_blocks applied to read_bmp's planes.
+    """
+    rgb = np.asarray(rgb)
+    height, width, _ = rgb.shape
+    if width % 8 != 0 or height % 8 != 0:
+        raise ValueError(f"Image dimensions must be multiples of 8! "
+                         f"Current size: {width}x{height}")
+    block_rows, block_cols = height // 8, width // 8
+    out = np.empty((3, block_rows, block_cols, 8, 8), dtype=np.int16)
+    # Work one block row (8 image rows) at a time so the gathered samples
+    # and the sums stay in cache; the row is read in block order directly.
+    for row in range(block_rows):
+        strip = rgb[row * 8:(row + 1) * 8].reshape(8, block_cols, 8, 3)
+        strip = strip.transpose(1, 0, 2, 3)
+        r, g, b = strip[..., 0], strip[..., 1], strip[..., 2]
+        for component in range(3):
+            tables = COLOR_TABLES[component]
+            target = out[component, row]
+            np.add(tables[0][r], tables[1][g], out=target)
+            target += tables[2][b]
+            target >>= SCALE_BITS
+            if LEVEL_OFFSETS[component]:
+                target += LEVEL_OFFSETS[component]
+    profiler.count("blocks", 3 * block_rows * block_cols)
+    y, cb, cr = out.reshape(3, -1, 8, 8)
+    return y, cb, cr
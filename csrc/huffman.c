@@ -2,10 +2,16 @@
 #include <stdlib.h>
 #include <string.h>
 
-#define MAX_TREE_HT 100
-#define MAX_PAIRS 1000
 #define MAX_CODE_LEN 32
 #define BITS_PER_BYTE 8
+#define INITIAL_CAPACITY 1024
+
+// Error codes of the library API
+#define HUFFMAN_OK 0
+#define HUFFMAN_ERR_ALLOC -1
+#define HUFFMAN_ERR_CODE_LEN -2
+#define HUFFMAN_ERR_CAPACITY -3
+#define HUFFMAN_ERR_INVALID_CODE -4
 
 // RLE pair structure
 typedef struct {
@@ -16,8 +22,9 @@ typedef struct {
 // Structure to store Huffman codes
 typedef struct {
     RLEPair pair;
-    char code[MAX_CODE_LEN];
+    char code[MAX_CODE_LEN + 1];
     int code_len;
+    unsigned int bits;        // code as an integer, MSB first
 } HuffmanCode;
 
 // Huffman tree node structure
@@ -34,14 +41,22 @@ typedef struct MinHeap {
     Node** array;
 } MinHeap;
 
+// Open-addressing hash map from an RLE pair to an index
+typedef struct {
+    RLEPair* keys;
+    int* indices;             // -1 marks an empty slot
+    int capacity;             // power of two
+} PairMap;
+
 // Bit writer for compression
 typedef struct {
     unsigned char buffer;
     int bits_count;
-    FILE* output_file;
+    FILE* output_file;        // NULL: keep the bytes in memory only
     unsigned char* all_bytes;  // Store all byte
-    int byte_count;           // current byte
-    int total_capacity;       // Capacity
+    long byte_count;          // current byte
+    long total_capacity;      // Capacity
+    int failed;               // set when a realloc fails
 } BitWriter;
 
 // Bit reader for decompression
@@ -51,55 +66,146 @@ typedef struct {
     FILE* input_file;
 } BitReader;
 
-// Initialize bit writer
+// Create a pair map able to hold `count` keys
+PairMap* createPairMap(int count) {
+    PairMap* map = (PairMap*)malloc(sizeof(PairMap));
+    if (!map) return NULL;
+    map->capacity = 16;
+    while (map->capacity < 2 * count) map->capacity <<= 1;
+    map->keys = (RLEPair*)malloc(map->capacity * sizeof(RLEPair));
+    map->indices = (int*)malloc(map->capacity * sizeof(int));
+    if (!map->keys || !map->indices) {
+        free(map->keys);
+        free(map->indices);
+        free(map);
+        return NULL;
+    }
+    for (int i = 0; i < map->capacity; i++) map->indices[i] = -1;
+    return map;
+}
+
+void freePairMap(PairMap* map) {
+    if (!map) return;
+    free(map->keys);
+    free(map->indices);
+    free(map);
+}
+
+static unsigned int hashPair(RLEPair pair) {
+    unsigned int h = (unsigned int)pair.run_length * 0x9E3779B1u;
+    h ^= (unsigned int)pair.value + 0x7F4A7C15u + (h << 6) + (h >> 2);
+    h ^= h >> 16;
+    h *= 0x85EBCA6Bu;
+    h ^= h >> 13;
+    return h;
+}
+
+// Slot of `pair`: either holding it or the empty slot where it belongs
+static int findSlot(const PairMap* map, RLEPair pair) {
+    unsigned int mask = (unsigned int)map->capacity - 1;
+    unsigned int slot = hashPair(pair) & mask;
+    while (map->indices[slot] >= 0 &&
+           (map->keys[slot].run_length != pair.run_length ||
+            map->keys[slot].value != pair.value)) {
+        slot = (slot + 1) & mask;
+    }
+    return (int)slot;
+}
+
+// Index stored for `pair`, or -1
+int lookupPair(const PairMap* map, RLEPair pair) {
+    return map->indices[findSlot(map, pair)];
+}
+
+// Store `index` for `pair` (the map never fills: capacity >= 2 * count)
+void insertPair(PairMap* map, RLEPair pair, int index) {
+    int slot = findSlot(map, pair);
+    map->keys[slot] = pair;
+    map->indices[slot] = index;
+}
+
+// Initialize bit writer; filename may be NULL for an in-memory writer
 BitWriter* createBitWriter(const char* filename) {
     BitWriter* writer = (BitWriter*)malloc(sizeof(BitWriter));
+    if (!writer) return NULL;
     writer->buffer = 0;
     writer->bits_count = 0;
-    writer->output_file = fopen(filename, "wb");
-    writer->total_capacity = 1024;  // init
+    writer->output_file = filename ? fopen(filename, "wb") : NULL;
+    writer->total_capacity = INITIAL_CAPACITY;  // init
     writer->all_bytes = (unsigned char*)malloc(writer->total_capacity);
     writer->byte_count = 0;
+    writer->failed = writer->all_bytes == NULL;
     return writer;
 }
 
+static void appendByte(BitWriter* writer, unsigned char byte) {
+    if (writer->failed) return;
+    if (writer->output_file) {
+        fwrite(&byte, 1, 1, writer->output_file);
+    }
+    if (writer->byte_count >= writer->total_capacity) {
+        unsigned char* grown = (unsigned char*)realloc(
+            writer->all_bytes, writer->total_capacity * 2);
+        if (!grown) {
+            writer->failed = 1;
+            return;
+        }
+        writer->all_bytes = grown;
+        writer->total_capacity *= 2;
+    }
+    writer->all_bytes[writer->byte_count++] = byte;
+}
+
 // Write a single bit
 void writeBit(BitWriter* writer, int bit) {
     writer->buffer = (writer->buffer << 1) | (bit & 1);
     writer->bits_count++;
-    
+
     if (writer->bits_count == BITS_PER_BYTE) {
-        fwrite(&writer->buffer, 1, 1, writer->output_file);
-        if (writer->byte_count >= writer->total_capacity) {
-            writer->total_capacity *= 2;
-            writer->all_bytes = (unsigned char*)realloc(writer->all_bytes, writer->total_capacity);
-        }
-        writer->all_bytes[writer->byte_count++] = writer->buffer;
+        appendByte(writer, writer->buffer);
         writer->buffer = 0;
         writer->bits_count = 0;
     }
 }
 
-// Flush remaining bits
-void flushBitWriter(BitWriter* writer) {
+// Write the `length` low bits of `bits`, MSB first
+void writeBits(BitWriter* writer, unsigned int bits, int length) {
+    for (int i = length - 1; i >= 0; i--) {
+        writeBit(writer, (bits >> i) & 1);
+    }
+}
+
+// Pad the last partial byte with zeros
+void finishBitWriter(BitWriter* writer) {
     if (writer->bits_count > 0) {
         writer->buffer <<= (BITS_PER_BYTE - writer->bits_count);
-        writer->all_bytes[writer->byte_count++] = writer->buffer;
-        fwrite(&writer->buffer, 1, 1, writer->output_file);
+        appendByte(writer, writer->buffer);
+        writer->buffer = 0;
+        writer->bits_count = 0;
     }
-    
+}
+
+void freeBitWriter(BitWriter* writer) {
+    if (!writer) return;
+    if (writer->output_file) fclose(writer->output_file);
+    free(writer->all_bytes);
+    free(writer);
+}
+
+// Flush remaining bits
+void flushBitWriter(BitWriter* writer) {
+    finishBitWriter(writer);
+
     printf("\nBit stream:\n");
-    for (int i = 0; i < writer->byte_count; i++) {
+    for (long i = 0; i < writer->byte_count; i++) {
         for (int j = 7; j >= 0; j--) {
             printf("%d", (writer->all_bytes[i] >> j) & 1);
         }
         printf(" ");
     }
     printf("\n");
-    
-    fclose(writer->output_file);
-    free(writer->all_bytes);
-    free(writer);
+
+    if (writer->output_file) fflush(writer->output_file);
 }
 
 // Initialize bit reader
@@ -117,46 +223,66 @@ int readBit(BitReader* reader) {
         fread(&reader->buffer, 1, 1, reader->input_file);
         reader->bits_count = BITS_PER_BYTE;
     }
-    
+
     int bit = (reader->buffer >> (reader->bits_count - 1)) & 1;
     reader->bits_count--;
     return bit;
 }
 
-// Function to read RLE data from file
-int readRLEFromFile(const char* filename, RLEPair* data) {
+// Function to read RLE data from file; *data grows as needed
+int readRLEFromFile(const char* filename, RLEPair** data) {
     FILE* file = fopen(filename, "r");
     if (file == NULL) {
         printf("Error opening file: %s\n", filename);
         return -1;
     }
 
+    int capacity = INITIAL_CAPACITY;
     int count = 0;
-    while (!feof(file) && count < MAX_PAIRS) {
-        if (fscanf(file, "%d %d", &data[count].run_length, &data[count].value) == 2) {
-            count++;
+    *data = (RLEPair*)malloc(capacity * sizeof(RLEPair));
+    RLEPair pair;
+    while (*data && fscanf(file, "%d %d", &pair.run_length, &pair.value) == 2) {
+        if (count == capacity) {
+            capacity *= 2;
+            RLEPair* grown = (RLEPair*)realloc(*data, capacity * sizeof(RLEPair));
+            if (!grown) break;
+            *data = grown;
         }
+        (*data)[count++] = pair;
     }
 
     fclose(file);
-    return count;
+    return *data ? count : -1;
 }
 
 // Function to create a new node
 Node* newNode(RLEPair data, int freq) {
     Node* temp = (Node*)malloc(sizeof(Node));
+    if (!temp) return NULL;
     temp->left = temp->right = NULL;
     temp->data = data;
     temp->frequency = freq;
     return temp;
 }
 
+void freeTree(Node* root) {
+    if (!root) return;
+    freeTree(root->left);
+    freeTree(root->right);
+    free(root);
+}
+
 // Function to create a min heap
 MinHeap* createMinHeap(int capacity) {
     MinHeap* minHeap = (MinHeap*)malloc(sizeof(MinHeap));
+    if (!minHeap) return NULL;
     minHeap->size = 0;
     minHeap->capacity = capacity;
     minHeap->array = (Node**)malloc(minHeap->capacity * sizeof(Node*));
+    if (!minHeap->array) {
+        free(minHeap);
+        return NULL;
+    }
     return minHeap;
 }
 
@@ -173,11 +299,11 @@ void minHeapify(MinHeap* minHeap, int idx) {
     int left = 2 * idx + 1;
     int right = 2 * idx + 2;
 
-    if (left < minHeap->size && 
+    if (left < minHeap->size &&
         minHeap->array[left]->frequency < minHeap->array[smallest]->frequency)
         smallest = left;
 
-    if (right < minHeap->size && 
+    if (right < minHeap->size &&
         minHeap->array[right]->frequency < minHeap->array[smallest]->frequency)
         smallest = right;
 
@@ -197,12 +323,12 @@ void buildMinHeap(MinHeap* minHeap) {
 // Function to extract minimum value node
 Node* extractMin(MinHeap* minHeap) {
     if (minHeap->size <= 0) return NULL;
-    
+
     Node* temp = minHeap->array[0];
     minHeap->array[0] = minHeap->array[minHeap->size - 1];
     --minHeap->size;
     minHeapify(minHeap, 0);
-    
+
     return temp;
 }
 
@@ -210,174 +336,226 @@ Node* extractMin(MinHeap* minHeap) {
 void insertMinHeap(MinHeap* minHeap, Node* minHeapNode) {
     ++minHeap->size;
     int i = minHeap->size - 1;
-    
+
     while (i && minHeapNode->frequency < minHeap->array[(i - 1) / 2]->frequency) {
         minHeap->array[i] = minHeap->array[(i - 1) / 2];
         i = (i - 1) / 2;
     }
-    
+
     minHeap->array[i] = minHeapNode;
 }
 
-// Build Huffman Tree
-Node* buildHuffmanTree(RLEPair* data, int size) {
-    // First count frequencies
-    int freq[MAX_PAIRS] = {0};
-    int unique_count = 0;
-    RLEPair unique_pairs[MAX_PAIRS];
-    
+// Build Huffman Tree; *unique_count receives the number of distinct pairs
+Node* buildHuffmanTree(const RLEPair* data, int size, int* unique_count) {
+    *unique_count = 0;
+    if (size <= 0) return NULL;
+
+    // First count frequencies, finding each pair through the hash map
+    int* freq = (int*)malloc(size * sizeof(int));
+    RLEPair* unique_pairs = (RLEPair*)malloc(size * sizeof(RLEPair));
+    PairMap* map = createPairMap(size);
+    MinHeap* minHeap = NULL;
+    Node* root = NULL;
+    if (!freq || !unique_pairs || !map) goto cleanup;
+
     for (int i = 0; i < size; i++) {
-        int found = 0;
-        for (int j = 0; j < unique_count; j++) {
-            if (unique_pairs[j].run_length == data[i].run_length && 
-                unique_pairs[j].value == data[i].value) {
-                freq[j]++;
-                found = 1;
-                break;
-            }
-        }
-        if (!found) {
-            unique_pairs[unique_count] = data[i];
-            freq[unique_count] = 1;
-            unique_count++;
+        int index = lookupPair(map, data[i]);
+        if (index >= 0) {
+            freq[index]++;
+        } else {
+            insertPair(map, data[i], *unique_count);
+            unique_pairs[*unique_count] = data[i];
+            freq[*unique_count] = 1;
+            (*unique_count)++;
         }
     }
-    
-    // Calculate the usage rate
-    int used_symbols = 0;
-    for (int i = 0; i < unique_count; i++) {
-        if (freq[i] > 0) {  // Only count symbols with non-zero frequency
-            used_symbols++;
-        }
-    }
-    float usage_rate = (float)used_symbols / unique_count * 100.0;
-    printf("Huffman Table Usage Rate (Build Tree): %.2f%%\n", usage_rate);
-    
+
     // Create a min heap
-    MinHeap* minHeap = createMinHeap(unique_count);
-    
+    minHeap = createMinHeap(*unique_count);
+    if (!minHeap) goto cleanup;
+
     // Add all nodes to min heap
-    for (int i = 0; i < unique_count; ++i)
+    for (int i = 0; i < *unique_count; ++i) {
         minHeap->array[i] = newNode(unique_pairs[i], freq[i]);
-    
-    minHeap->size = unique_count;
+        if (!minHeap->array[i]) {
+            for (int j = 0; j < i; j++) free(minHeap->array[j]);
+            goto cleanup;
+        }
+    }
+
+    minHeap->size = *unique_count;
     buildMinHeap(minHeap);
-    
+
     // Build Huffman tree
     while (minHeap->size != 1) {
         Node* left = extractMin(minHeap);
         Node* right = extractMin(minHeap);
-        
+
         RLEPair dummy = {0, 0};
         Node* top = newNode(dummy, left->frequency + right->frequency);
-        
+        if (!top) {
+            freeTree(left);
+            freeTree(right);
+            while (minHeap->size) freeTree(extractMin(minHeap));
+            goto cleanup;
+        }
+
         top->left = left;
         top->right = right;
-        
+
         insertMinHeap(minHeap, top);
     }
-    
-    return extractMin(minHeap);
+
+    root = extractMin(minHeap);
+
+cleanup:
+    free(freq);
+    free(unique_pairs);
+    freePairMap(map);
+    if (minHeap) {
+        free(minHeap->array);
+        free(minHeap);
+    }
+    return root;
 }
 
-// Store Huffman codes in array
-void storeCode(HuffmanCode* codes, int* code_count, Node* root, int arr[], int top) {
+// Store Huffman codes in array; returns HUFFMAN_ERR_CODE_LEN when a code
+// would be longer than MAX_CODE_LEN bits
+int storeCode(HuffmanCode* codes, int* code_count, Node* root, int arr[], int top) {
+    int status = HUFFMAN_OK;
+    if (top > MAX_CODE_LEN) return HUFFMAN_ERR_CODE_LEN;
+
     if (root->left) {
         arr[top] = 0;
-        storeCode(codes, code_count, root->left, arr, top + 1);
+        status = storeCode(codes, code_count, root->left, arr, top + 1);
+        if (status != HUFFMAN_OK) return status;
     }
-    
+
     if (root->right) {
         arr[top] = 1;
-        storeCode(codes, code_count, root->right, arr, top + 1);
+        status = storeCode(codes, code_count, root->right, arr, top + 1);
+        if (status != HUFFMAN_OK) return status;
     }
-    
+
     if (!root->left && !root->right) {
-        codes[*code_count].pair = root->data;
-        codes[*code_count].code_len = top;
-        
-        char code_str[MAX_CODE_LEN] = {0};
+        // A tree of a single symbol still needs a one-bit code.
+        if (top == 0) {
+            arr[top++] = 0;
+        }
+        HuffmanCode* code = &codes[*code_count];
+        code->pair = root->data;
+        code->code_len = top;
+        code->bits = 0;
         for (int i = 0; i < top; i++) {
-            code_str[i] = arr[i] + '0';
+            code->code[i] = arr[i] + '0';
+            code->bits = (code->bits << 1) | (unsigned int)arr[i];
         }
-        strcpy(codes[*code_count].code, code_str);
-        
+        code->code[top] = '\0';
+
         (*code_count)++;
     }
+    return status;
+}
+
+// Build the code table of `data`; *codes is allocated by this function
+static int buildCodes(const RLEPair* data, int size, HuffmanCode** codes, int* code_count) {
+    int unique_count = 0;
+    int arr[MAX_CODE_LEN + 1];
+    *codes = NULL;
+    *code_count = 0;
+    if (size <= 0) return HUFFMAN_OK;
+
+    Node* root = buildHuffmanTree(data, size, &unique_count);
+    if (!root) return HUFFMAN_ERR_ALLOC;
+    *codes = (HuffmanCode*)malloc(unique_count * sizeof(HuffmanCode));
+    if (!*codes) {
+        freeTree(root);
+        return HUFFMAN_ERR_ALLOC;
+    }
+    int status = storeCode(*codes, code_count, root, arr, 0);
+    freeTree(root);
+    return status;
 }
 
 // Find Huffman code for a given RLE pair
-const char* findCode(HuffmanCode* codes, int code_count, RLEPair pair) {
+const HuffmanCode* findCode(const PairMap* map, const HuffmanCode* codes, RLEPair pair) {
+    int index = lookupPair(map, pair);
+    return index >= 0 ? &codes[index] : NULL;
+}
+
+static PairMap* createCodeMap(const HuffmanCode* codes, int code_count) {
+    PairMap* map = createPairMap(code_count);
+    if (!map) return NULL;
     for (int i = 0; i < code_count; i++) {
-        if (codes[i].pair.run_length == pair.run_length && 
-            codes[i].pair.value == pair.value) {
-            return codes[i].code;
+        insertPair(map, codes[i].pair, i);
+    }
+    return map;
+}
+
+// Huffman code every pair of `data` into `writer`
+static int encodePairs(BitWriter* writer, const RLEPair* data, int data_size,
+                       const HuffmanCode* codes, int code_count) {
+    PairMap* map = createCodeMap(codes, code_count);
+    if (!map) return HUFFMAN_ERR_ALLOC;
+    for (int i = 0; i < data_size; i++) {
+        const HuffmanCode* code = findCode(map, codes, data[i]);
+        if (code) {
+            writeBits(writer, code->bits, code->code_len);
         }
     }
-    return NULL;
+    freePairMap(map);
+    return writer->failed ? HUFFMAN_ERR_ALLOC : HUFFMAN_OK;
 }
 
-void writeCompressedData(const char* output_file, RLEPair* data, int data_size, 
+void writeCompressedData(const char* output_file, RLEPair* data, int data_size,
                         HuffmanCode* codes, int code_count) {
     BitWriter* writer = createBitWriter(output_file);
 
     fprintf(writer->output_file, "%d\n", code_count);
-    
+
     // Write the coding table
     for (int i = 0; i < code_count; i++) {
-        fprintf(writer->output_file, "%d %d %s\n", 
-                codes[i].pair.run_length, 
-                codes[i].pair.value, 
+        fprintf(writer->output_file, "%d %d %s\n",
+                codes[i].pair.run_length,
+                codes[i].pair.value,
                 codes[i].code);
     }
     fprintf(writer->output_file, "---\n");
 
+    // Number of coded bits, so padding of the last byte is not decoded
+    long bit_count = 0;
+    PairMap* map = createCodeMap(codes, code_count);
+    for (int i = 0; map && i < data_size; i++) {
+        const HuffmanCode* code = findCode(map, codes, data[i]);
+        if (code) bit_count += code->code_len;
+    }
+    freePairMap(map);
+    fprintf(writer->output_file, "%ld\n", bit_count);
+
     // Binary representation file
     char binary_file[256];
-    sprintf(binary_file, "%s.binary.txt", output_file);
+    snprintf(binary_file, sizeof(binary_file), "%s.binary.txt", output_file);
     FILE* binary_out = fopen(binary_file, "w");
-    
+
     fprintf(binary_out, "%d\n", code_count);
     for (int i = 0; i < code_count; i++) {
-        fprintf(binary_out, "%d %d %s\n", 
-                codes[i].pair.run_length, 
-                codes[i].pair.value, 
+        fprintf(binary_out, "%d %d %s\n",
+                codes[i].pair.run_length,
+                codes[i].pair.value,
                 codes[i].code);
     }
     fprintf(binary_out, "---\n");
 
-    // Calculate Huffman Table Usage Rate
-    int used_symbols = 0;
-    for (int i = 0; i < code_count; i++) {
-        int found = 0;
-        for (int j = 0; j < data_size; j++) {
-            if (codes[i].pair.run_length == data[j].run_length && 
-                codes[i].pair.value == data[j].value) {
-                found = 1;
-                break;
-            }
-        }
-        if (found) {
-            used_symbols++;
-        }
-    }
-    float usage_rate = (float)used_symbols / code_count * 100.0;
-    printf("Huffman Table Usage Rate (Write Data): %.2f%%\n", usage_rate);
+    // Every code in the table comes from the data, so all are used
+    printf("Huffman Table Usage Rate (Write Data): %.2f%%\n", code_count ? 100.0 : 0.0);
 
     // Write the compressed data
-    for (int i = 0; i < data_size; i++) {
-        const char* code = findCode(codes, code_count, data[i]);
-        if (code) {
-            for (int j = 0; code[j]; j++) {
-                writeBit(writer, code[j] - '0');
-            }
-        }
-    }
-    
+    encodePairs(writer, data, data_size, codes, code_count);
+
     flushBitWriter(writer);
 
     // Write binary representation
-    for (int i = 0; i < writer->byte_count; i++) {
+    for (long i = 0; i < writer->byte_count; i++) {
         for (int j = 7; j >= 0; j--) {
             fprintf(binary_out, "%d", (writer->all_bytes[i] >> j) & 1);
         }
@@ -386,117 +564,282 @@ void writeCompressedData(const char* output_file, RLEPair* data, int data_size,
     fprintf(binary_out, "\n");
 
     fclose(binary_out);
+    freeBitWriter(writer);
+}
+
+// Decode `bit_count` bits of `bytes` with a code table into `pairs`;
+// returns the number of pairs or a negative error code
+static long decodePairs(const unsigned char* bytes, long bit_count,
+                        const HuffmanCode* codes, int code_count,
+                        RLEPair* pairs, long pair_capacity) {
+    // Rebuild the code tree: node 0 is the root, children[2 * n + bit].
+    long node_capacity = 2L * code_count + 1;
+    int* children = (int*)malloc(2 * node_capacity * sizeof(int));
+    int* leaf = (int*)malloc(node_capacity * sizeof(int));
+    long count = 0;
+    if (!children || !leaf) {
+        free(children);
+        free(leaf);
+        return HUFFMAN_ERR_ALLOC;
+    }
+    for (long i = 0; i < 2 * node_capacity; i++) children[i] = -1;
+    for (long i = 0; i < node_capacity; i++) leaf[i] = -1;
+    int nodes = 1;
+    for (int i = 0; i < code_count; i++) {
+        int node = 0;
+        for (int j = 0; j < codes[i].code_len; j++) {
+            int bit = codes[i].code[j] - '0';
+            if (children[2 * node + bit] < 0) {
+                if (nodes >= node_capacity) {
+                    count = HUFFMAN_ERR_INVALID_CODE;
+                    goto cleanup;
+                }
+                children[2 * node + bit] = nodes++;
+            }
+            node = children[2 * node + bit];
+        }
+        leaf[node] = i;
+    }
+
+    int node = 0;
+    for (long i = 0; i < bit_count; i++) {
+        int bit = (bytes[i / BITS_PER_BYTE] >> (7 - i % BITS_PER_BYTE)) & 1;
+        node = children[2 * node + bit];
+        if (node < 0) {
+            count = HUFFMAN_ERR_INVALID_CODE;
+            goto cleanup;
+        }
+        if (leaf[node] >= 0) {
+            if (count >= pair_capacity) {
+                count = HUFFMAN_ERR_CAPACITY;
+                goto cleanup;
+            }
+            pairs[count++] = codes[leaf[node]].pair;
+            node = 0;
+        }
+    }
+
+cleanup:
+    free(children);
+    free(leaf);
+    return count;
 }
 
 // Function to decompress data
 void decompressData(const char* output_file) {
     FILE* in = fopen("hw_output/compressed.bin", "rb");
     FILE* out = fopen(output_file, "w");
-    
+
     if (!in || !out) {
         printf("Error opening files\n");
+        if (in) fclose(in);
+        if (out) fclose(out);
         return;
     }
-    
+
     // Read code table size
     int code_count;
-    fscanf(in, "%d\n", &code_count);
-    
+    if (fscanf(in, "%d\n", &code_count) != 1 || code_count < 0) {
+        printf("Error: Invalid code table\n");
+        goto cleanup;
+    }
+
     // Read code table
-    HuffmanCode codes[MAX_PAIRS];
+    HuffmanCode* codes = (HuffmanCode*)malloc((code_count ? code_count : 1) * sizeof(HuffmanCode));
     for (int i = 0; i < code_count; i++) {
-        fscanf(in, "%d %d %s\n",
+        fscanf(in, "%d %d %32s\n",
                &codes[i].pair.run_length,
                &codes[i].pair.value,
                codes[i].code);
+        codes[i].code_len = (int)strlen(codes[i].code);
     }
-    
-    // Skip marker line
+
+    // Skip marker line, then read the number of coded bits
     char line[256];
+    long bit_count = -1;
     fgets(line, sizeof(line), in);
-    
-    // Read and decode bits
-    char current_code[MAX_CODE_LEN] = {0};
-    int code_pos = 0;
-    unsigned char byte;
-    
-    // Keep reading bytes until EOF
-    while (fread(&byte, 1, 1, in) == 1) {
-        // Process each bit in the byte
-        for (int bit = 7; bit >= 0; bit--) {
-            // Get current bit
-            char current_bit = ((byte >> bit) & 1) + '0';
-            current_code[code_pos++] = current_bit;
-            current_code[code_pos] = '\0';
-            
-            // Try to match current code
-            for (int i = 0; i < code_count; i++) {
-                if (strcmp(current_code, codes[i].code) == 0) {
-                    fprintf(out, "%d %d\n",
-                            codes[i].pair.run_length,
-                            codes[i].pair.value);
-                    code_pos = 0;
-                    current_code[0] = '\0';
-                    break;
-                }
-            }
-            
-            if (code_pos >= MAX_CODE_LEN) {
-                printf("Error: Invalid code encountered\n");
-                goto cleanup;
-            }
+    if (fscanf(in, "%ld", &bit_count) != 1 || fgetc(in) != '\n') {
+        printf("Error: Missing bit count\n");
+        free(codes);
+        goto cleanup;
+    }
+
+    // Read the remaining bytes
+    long capacity = INITIAL_CAPACITY, size = 0;
+    unsigned char* bytes = (unsigned char*)malloc(capacity);
+    size_t got;
+    while (bytes && (got = fread(bytes + size, 1, capacity - size, in)) > 0) {
+        size += (long)got;
+        if (size == capacity) {
+            capacity *= 2;
+            unsigned char* grown = (unsigned char*)realloc(bytes, capacity);
+            if (!grown) break;
+            bytes = grown;
         }
     }
 
+    if (bit_count > size * BITS_PER_BYTE) bit_count = size * BITS_PER_BYTE;
+    RLEPair* pairs = (RLEPair*)malloc((bit_count + 1) * sizeof(RLEPair));
+    long count = bytes && pairs
+        ? decodePairs(bytes, bit_count, codes, code_count, pairs, bit_count + 1)
+        : HUFFMAN_ERR_ALLOC;
+    if (count < 0) {
+        printf("Error: Invalid code encountered\n");
+    }
+    for (long i = 0; i < count; i++) {
+        fprintf(out, "%d %d\n", pairs[i].run_length, pairs[i].value);
+    }
+    free(pairs);
+    free(bytes);
+    free(codes);
+
 cleanup:
     fclose(in);
     fclose(out);
 }
 
+/*
+ * Library API (build with -DHUFFMAN_LIB -shared -fPIC).
+ *
+ * Pairs are passed as flat int arrays {run_length, value, ...} and code
+ * tables as rows of HUFFMAN_TABLE_COLUMNS ints:
+ * {run_length, value, code_len, code bits (MSB first)}.
+ */
+#define HUFFMAN_TABLE_COLUMNS 4
+
+// Build the Huffman code table of `pair_count` pairs and pack the coded
+// pairs into `out`. Capacities: `table` needs pair_count rows, `out` needs
+// pair_count * MAX_CODE_LEN / 8 + 1 bytes. Returns HUFFMAN_OK or an error
+// code; on HUFFMAN_ERR_CAPACITY *out_bytes holds the required size.
+int huffman_encode(const int* pairs, int pair_count,
+                   int* table, int table_capacity, int* table_count,
+                   unsigned char* out, long out_capacity,
+                   long* out_bytes, long* out_bits) {
+    HuffmanCode* codes = NULL;
+    int code_count = 0;
+    *table_count = 0;
+    *out_bytes = 0;
+    *out_bits = 0;
+
+    int status = buildCodes((const RLEPair*)pairs, pair_count, &codes, &code_count);
+    if (status != HUFFMAN_OK) {
+        free(codes);
+        return status;
+    }
+    if (code_count > table_capacity) {
+        free(codes);
+        return HUFFMAN_ERR_CAPACITY;
+    }
+    for (int i = 0; i < code_count; i++) {
+        int* row = &table[i * HUFFMAN_TABLE_COLUMNS];
+        row[0] = codes[i].pair.run_length;
+        row[1] = codes[i].pair.value;
+        row[2] = codes[i].code_len;
+        row[3] = (int)codes[i].bits;
+    }
+    *table_count = code_count;
+
+    BitWriter* writer = createBitWriter(NULL);
+    if (!writer) {
+        free(codes);
+        return HUFFMAN_ERR_ALLOC;
+    }
+    status = encodePairs(writer, (const RLEPair*)pairs, pair_count, codes, code_count);
+    *out_bits = writer->byte_count * BITS_PER_BYTE + writer->bits_count;
+    finishBitWriter(writer);
+    if (status == HUFFMAN_OK && writer->failed) status = HUFFMAN_ERR_ALLOC;
+    *out_bytes = writer->byte_count;
+    if (status == HUFFMAN_OK) {
+        if (writer->byte_count > out_capacity) {
+            status = HUFFMAN_ERR_CAPACITY;
+        } else {
+            memcpy(out, writer->all_bytes, writer->byte_count);
+        }
+    }
+    freeBitWriter(writer);
+    free(codes);
+    return status;
+}
+
+// Decode `bit_count` bits of `data` with a table of huffman_encode into
+// `pairs` (room for pair_capacity pairs). Returns the number of decoded
+// pairs or a negative error code.
+long huffman_decode(const unsigned char* data, long bit_count,
+                    const int* table, int table_count,
+                    int* pairs, long pair_capacity) {
+    HuffmanCode* codes = (HuffmanCode*)malloc((table_count ? table_count : 1) * sizeof(HuffmanCode));
+    if (!codes) return HUFFMAN_ERR_ALLOC;
+    for (int i = 0; i < table_count; i++) {
+        const int* row = &table[i * HUFFMAN_TABLE_COLUMNS];
+        if (row[2] <= 0 || row[2] > MAX_CODE_LEN) {
+            free(codes);
+            return HUFFMAN_ERR_CODE_LEN;
+        }
+        codes[i].pair.run_length = row[0];
+        codes[i].pair.value = row[1];
+        codes[i].code_len = row[2];
+        codes[i].bits = (unsigned int)row[3];
+        for (int j = 0; j < row[2]; j++) {
+            codes[i].code[j] = ((codes[i].bits >> (row[2] - 1 - j)) & 1) + '0';
+        }
+        codes[i].code[row[2]] = '\0';
+    }
+    long count = decodePairs(data, bit_count, codes, table_count,
+                             (RLEPair*)pairs, pair_capacity);
+    free(codes);
+    return count;
+}
 
+#ifndef HUFFMAN_LIB
 int main() {
-    RLEPair data[MAX_PAIRS];
-    HuffmanCode codes[MAX_PAIRS];
+    RLEPair* data = NULL;
+    HuffmanCode* codes = NULL;
     int code_count = 0;
-    
+
     // Read RLE data
-    int size = readRLEFromFile("hw_output/rle_output.txt", data);
+    int size = readRLEFromFile("hw_output/rle_output.txt", &data);
     if (size < 0) {
         return 1;
     }
-    
+
     // Print read data
     printf("Read RLE data:\n");
     for (int i = 0; i < size; i++) {
         printf("%d %d\n", data[i].run_length, data[i].value);
     }
-    
+
     // Build Huffman tree and get codes
-    Node* root = buildHuffmanTree(data, size);
-    int arr[MAX_TREE_HT], top = 0;
-    storeCode(codes, &code_count, root, arr, top);
-    
+    if (buildCodes(data, size, &codes, &code_count) != HUFFMAN_OK) {
+        printf("Error: Cannot build Huffman codes\n");
+        free(codes);
+        free(data);
+        return 1;
+    }
+
     // Write compressed data
     writeCompressedData("hw_output/compressed.bin", data, size, codes, code_count);
-    
+
     // Write human-readable code table
     FILE* code_table = fopen("hw_output/code_table.txt", "w");
     fprintf(code_table, "Huffman Codes:\n");
     for (int i = 0; i < code_count; i++) {
-        fprintf(code_table, "(%d,%d): %s\n", 
-                codes[i].pair.run_length, 
-                codes[i].pair.value, 
+        fprintf(code_table, "(%d,%d): %s\n",
+                codes[i].pair.run_length,
+                codes[i].pair.value,
                 codes[i].code);
     }
     fclose(code_table);
-    
+
     // Test decompression
     decompressData("hw_output/decompressed.txt");
-    
+
     printf("\nCompression completed:\n");
     printf("1. Compressed data written to 'compressed.bin'\n");
     printf("2. Code table written to 'code_table.txt'\n");
     printf("3. Decompressed data written to 'decompressed.txt'\n");
     printf("4. Binary representation written to 'compressed.bin.binary.txt'\n");
+    free(codes);
+    free(data);
     return 0;
-}
\ No newline at end of file
+}
+#endif
@@ -0,0 +1,231 @@
+"""Arai-Agui-Nakajima (AAN) fast forward DCT over (N, 8, 8) block stacks.
+
+`JPEGDCT` in unittest.py reproduces the Chisel datapath bit for bit and is
+what hardware results are checked against. This module is the fast
+production path: a separable float AAN transform whose per-coefficient
+output scale factors are folded into the quantization table, so quantizing
+costs a single multiply per coefficient.
+
+Error bound (measured against the exact orthonormal float64 DCT of 8-bit
+level-shifted input, i.e. values in [-128, 127]):
+
+    dtype=np.float64 : max |error| < 1e-10
+    dtype=np.float32 : max |error| < 2e-3
+
+The float32 bound is far below the 0.5 rounding step of the quantizer, so a
+quantized coefficient can only differ from exact-DCT quantization when the
+exact value lies within 2e-3 / Q of a rounding boundary. Integer input often
+lands exactly on x.5 (e.g. the DC term is sum / 8), and such ties may round
+either way in both precisions.
+
+Flat blocks: an AC coefficient is the inner product of the block minus its
+mean with a zero-sum basis function, so for every AC (u, v)
+
+    |F(u, v)| <= sum |x - mean| * max |basis(u, v)|     (L1 bound)
+    |F(u, v)| <= sqrt(sum (x - mean) ** 2)              (Parseval)
+
+`quantize` classifies blocks with these bounds first; a block whose bound
+(plus the float32 error above) stays below Q / 2 for every AC term has all
+AC terms quantize to zero and only its DC term (sum / 8) is computed. The
+result is identical to running the full transform on it. Classifying costs
+about a sixth of the transform, so it pays off once roughly a fifth of the
+blocks are flat (smooth regions, chroma, low quality settings); pass
+skip_flat=False for uniformly busy content.
+
+The bit-exact `JPEGDCT` model keeps the full path: its truncating integer
+arithmetic leaves nonzero AC terms even for constant blocks.
+"""
+import numpy as np
+
+import profiler
+from unittest import JPEGQuantization
+
+# AAN output k of a 1-D pass is scaled by AAN_SCALE[k] * 2 * sqrt(2) relative
+# to the orthonormal DCT; a 2-D transform is therefore scaled by
+# AAN_SCALE[u] * AAN_SCALE[v] * 8.
+AAN_SCALE = np.array([1.0] + [np.cos(k * np.pi / 16) * np.sqrt(2)
+                              for k in range(1, 8)])
+AAN_SCALE_2D = np.outer(AAN_SCALE, AAN_SCALE) * 8
+
+_C4 = 0.707106781186547524    # cos(4 * pi / 16)
+_C6 = 0.382683432365089772    # cos(6 * pi / 16)
+_C2_MINUS_C6 = 0.541196100146196984   # cos(2 * pi / 16) - cos(6 * pi / 16)
+_C2_PLUS_C6 = 1.306562964876376527    # cos(2 * pi / 16) + cos(6 * pi / 16)
+
+# Largest |orthonormal 2-D DCT basis function (u, v)| over the block.
+_k = np.arange(8)
+_BASIS_1D = np.cos(np.outer(_k, 2 * _k + 1) * np.pi / 16) * np.where(
+    _k == 0, np.sqrt(1 / 8), 0.5)[:, None]
+BASIS_PEAK = np.outer(np.abs(_BASIS_1D).max(axis=1),
+                      np.abs(_BASIS_1D).max(axis=1))
+# Covers the float32 transform error, so a classified block also quantizes
+# to zero through the full transform, and the float32 rounding of the
+# Parseval bound (the L1 bound is exact for 8-bit samples).
+FLAT_MARGIN = 4e-3
+# Smallest share of flat blocks for which `quantize` splits the stack.
+FLAT_SPLIT_FRACTION = 1 / 8
+_SUM_WEIGHTS = np.ones(64, dtype=np.float32)
+_MEAN_WEIGHTS = _SUM_WEIGHTS / 64
+
+
+def flat_bounds(quant_table, margin=FLAT_MARGIN):
+    """Thresholds that prove all AC terms of a block quantize to zero.
+
+    Args:
+        quant_table : (8, 8) quantization table.
+        margin      : Transform error allowed for on top of the bound.
+
+    Returns:
+        (limits, l1_limits): the per-term limits Q / 2 - margin of the 63 AC
+        terms in ascending order, and l1_limits[k], the largest L1 deviation
+        for which the L1 bound holds on the first k of them (k = 0..63).
+    """
+    limits = np.asarray(quant_table, dtype=np.float64).ravel()[1:] / 2
+    limits = limits - margin
+    ratios = limits / BASIS_PEAK.ravel()[1:]
+    order = np.argsort(limits, kind='stable')
+    l1_limits = np.empty(64)
+    l1_limits[0] = np.inf
+    l1_limits[1:] = np.minimum.accumulate(ratios[order])
+    return limits[order], l1_limits
+
+
+def _aan_pass(data):
+    """One 1-D AAN butterfly pass along the first axis of `data`."""
+    d = data
+    tmp0, tmp7 = d[0] + d[7], d[0] - d[7]
+    tmp1, tmp6 = d[1] + d[6], d[1] - d[6]
+    tmp2, tmp5 = d[2] + d[5], d[2] - d[5]
+    tmp3, tmp4 = d[3] + d[4], d[3] - d[4]
+
+    # Even part
+    tmp10, tmp13 = tmp0 + tmp3, tmp0 - tmp3
+    tmp11, tmp12 = tmp1 + tmp2, tmp1 - tmp2
+    out = np.empty_like(data)
+    out[0] = tmp10 + tmp11
+    out[4] = tmp10 - tmp11
+    z1 = (tmp12 + tmp13) * _C4
+    out[2] = tmp13 + z1
+    out[6] = tmp13 - z1
+
+    # Odd part
+    tmp10 = tmp4 + tmp5
+    tmp11 = tmp5 + tmp6
+    tmp12 = tmp6 + tmp7
+    z5 = (tmp10 - tmp12) * _C6
+    z2 = _C2_MINUS_C6 * tmp10 + z5
+    z4 = _C2_PLUS_C6 * tmp12 + z5
+    z3 = tmp11 * _C4
+    z11, z13 = tmp7 + z3, tmp7 - z3
+    out[5] = z13 + z2
+    out[3] = z13 - z2
+    out[1] = z11 + z4
+    out[7] = z11 - z4
+    return out
+
+
+class AANDCT:
+    def __init__(self, quantization=None, dtype=np.float32, skip_flat=True):
+        """Create a fast DCT engine.
+
+        Args:
+            quantization : A `JPEGQuantization` whose table is folded into
+                           the AAN output scale, or a qt_choice (1 or 2).
+                           Defaults to the luminance table.
+            dtype        : Floating point type used for the transform.
+            skip_flat    : Let `quantize` skip the transform of blocks whose
+                           AC terms provably quantize to zero.
+        """
+        if quantization is None:
+            quantization = JPEGQuantization(qt_choice=1)
+        elif not isinstance(quantization, JPEGQuantization):
+            quantization = JPEGQuantization(qt_choice=quantization)
+        self.quantization = quantization
+        self.dtype = dtype
+        # round(coefficient / Q) == round(aan_output * multipliers)
+        self.multipliers = quantization.reciprocal_table(
+            AAN_SCALE_2D).astype(dtype)
+        self._descale = (1.0 / AAN_SCALE_2D).astype(dtype)
+        self.skip_flat = skip_flat
+        self._limits, self._l1_limits = flat_bounds(quantization.quant_table)
+        # Hit counts of the flat-block fast path
+        self.blocks_seen = 0
+        self.flat_hits = 0
+
+    def transform(self, blocks):
+        """Run the 2-D AAN DCT on level-shifted blocks.
+
+        Args:
+            blocks : (N, 8, 8) stack of level-shifted samples, as produced by
+                     `extract_blocks`.
+
+        Returns:
+            (N, 8, 8) coefficients scaled by `AAN_SCALE_2D`.
+        """
+        data = np.asarray(blocks, dtype=self.dtype).reshape(-1, 8, 8)
+        # Keep the block index last so every butterfly operand is a
+        # contiguous slab: (i, j, N) -> columns -> (u, j, N) -> rows.
+        data = np.ascontiguousarray(data.reshape(-1, 64).T).reshape(8, 8, -1)
+        cols = _aan_pass(data)
+        coefficients = _aan_pass(cols.transpose(1, 0, 2))
+        return coefficients.transpose(2, 1, 0)
+
+    def dct(self, blocks):
+        """Orthonormal DCT coefficients of `blocks` (descaled AAN output)."""
+        return self.transform(blocks) * self._descale
+
+    def flat_mask(self, blocks):
+        """(N,) bool mask of the blocks whose AC terms all quantize to zero.
+
+        A block qualifies when, for every AC term, the Parseval or the L1
+        bound of its deviation from the block mean is below the term's
+        limit: terms whose limit exceeds the Parseval bound are covered by
+        it, the remaining ones must satisfy the L1 bound.
+        """
+        # Deviations are multiples of 1 / 64 and their L1 sum is exact in
+        # float32; the sums run as matrix products, which is far cheaper
+        # than axis reductions over 64 values.
+        data = np.asarray(blocks, dtype=np.float32).reshape(-1, 64)
+        deviation = data - (data @ _MEAN_WEIGHTS)[:, None]
+        l2 = np.sqrt(np.einsum('ij,ij->i', deviation, deviation))
+        l1 = np.abs(deviation, out=deviation) @ _SUM_WEIGHTS
+        uncovered = np.searchsorted(self._limits, l2, side='right')
+        return l1 < self._l1_limits[uncovered]
+
+    def quantize(self, blocks):
+        """Fused DCT and quantization.
+
+        With `skip_flat`, blocks selected by `flat_mask` get their DC term
+        only (computed exactly as the transform would); the rest go through
+        the full transform. The result is the same either way.
+
+        Returns:
+            (N, 8, 8) int32 quantized coefficients, equal to
+            `np.round(dct(blocks) / quant_table)` up to the documented bound.
+        """
+        if not self.skip_flat:
+            return self.quantize_coefficients(self.transform(blocks))
+        blocks = np.asarray(blocks).reshape(-1, 8, 8)
+        flat = self.flat_mask(blocks)
+        hits = int(np.count_nonzero(flat))
+        self.blocks_seen += len(blocks)
+        self.flat_hits += hits
+        profiler.count("flat_blocks", hits)
+        if hits < len(blocks) * FLAT_SPLIT_FRACTION:
+            # Too few to pay for the gather and scatter; flat blocks give
+            # the same result through the full transform.
+            return self.quantize_coefficients(self.transform(blocks))
+        out = np.zeros((len(blocks), 8, 8), dtype=np.int32)
+        # The AAN DC output is the plain block sum.
+        sums = blocks[flat].sum(axis=(1, 2), dtype=np.int64)
+        out[flat, 0, 0] = np.rint(sums.astype(self.dtype)
+                                  * self.multipliers[0, 0])
+        if hits < len(blocks):
+            busy = ~flat
+            out[busy] = self.quantize_coefficients(
+                self.transform(blocks[busy]))
+        return out
+
+    def quantize_coefficients(self, coefficients):
+        """Quantize AAN-scaled coefficients returned by `transform`."""
+        return np.rint(coefficients * self.multipliers).astype(np.int32)
@@ -0,0 +1,137 @@
+"""ctypes binding of csrc/huffman.c as a bulk Huffman backend.
+
+The C source is compiled on first use into csrc/libhuffman.so (rebuilt when
+huffman.c is newer) with the system C compiler:
+
+    cc -O2 -shared -fPIC -DHUFFMAN_LIB csrc/huffman.c -o csrc/libhuffman.so
+
+`huffman_encode` takes (run_length, value) pairs and returns the packed
+bytes together with the code table; `huffman_decode` reverses it.
+"""
+import ctypes
+import os
+import subprocess
+import threading
+
+import numpy as np
+
+CSRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'csrc')
+SOURCE_PATH = os.path.join(CSRC_DIR, 'huffman.c')
+LIBRARY_PATH = os.path.join(CSRC_DIR, 'libhuffman.so')
+
+# Must match csrc/huffman.c
+MAX_CODE_LEN = 32
+TABLE_COLUMNS = 4
+_ERRORS = {
+    -1: 'out of memory',
+    -2: f'a Huffman code is longer than {MAX_CODE_LEN} bits',
+    -3: 'output buffer too small',
+    -4: 'invalid code in the bit stream',
+}
+
+_int_p = np.ctypeslib.ndpointer(dtype=np.int32, flags='C_CONTIGUOUS')
+_byte_p = np.ctypeslib.ndpointer(dtype=np.uint8, flags='C_CONTIGUOUS')
+_library = None
+_lock = threading.Lock()
+
+
+def build_library(force=False, compiler=None):
+    """Compile csrc/huffman.c into csrc/libhuffman.so if it is out of date."""
+    if (not force and os.path.exists(LIBRARY_PATH)
+            and os.path.getmtime(LIBRARY_PATH)
+            >= os.path.getmtime(SOURCE_PATH)):
+        return LIBRARY_PATH
+    compiler = compiler or os.environ.get('CC', 'cc')
+    # Build next to the target and rename, so concurrent builds never load
+    # a half-written library.
+    temporary = f"{LIBRARY_PATH}.{os.getpid()}.tmp"
+    try:
+        subprocess.run([compiler, '-O2', '-shared', '-fPIC', '-DHUFFMAN_LIB',
+                        SOURCE_PATH, '-o', temporary],
+                       check=True, stdout=subprocess.PIPE,
+                       stderr=subprocess.PIPE, text=True)
+    except FileNotFoundError as e:
+        raise OSError(f"C compiler {compiler!r} not found; cannot build "
+                      f"{LIBRARY_PATH}") from e
+    except subprocess.CalledProcessError as e:
+        raise OSError(f"Building {LIBRARY_PATH} failed:\n{e.stderr}") from e
+    os.replace(temporary, LIBRARY_PATH)
+    return LIBRARY_PATH
+
+
+def load_library():
+    """Load (building if needed) the shared library once per process."""
+    global _library
+    with _lock:
+        if _library is None:
+            library = ctypes.CDLL(build_library())
+            library.huffman_encode.argtypes = [
+                _int_p, ctypes.c_int,
+                _int_p, ctypes.c_int, ctypes.POINTER(ctypes.c_int),
+                _byte_p, ctypes.c_long,
+                ctypes.POINTER(ctypes.c_long), ctypes.POINTER(ctypes.c_long),
+            ]
+            library.huffman_encode.restype = ctypes.c_int
+            library.huffman_decode.argtypes = [
+                _byte_p, ctypes.c_long, _int_p, ctypes.c_int,
+                _int_p, ctypes.c_long,
+            ]
+            library.huffman_decode.restype = ctypes.c_long
+            _library = library
+    return _library
+
+
+def _check(status):
+    if status < 0:
+        raise RuntimeError(f"huffman.c: {_ERRORS.get(status, status)}")
+    return status
+
+
+def huffman_encode(pairs):
+    """Build a Huffman code for RLE pairs and pack the coded pairs.
+
+    Args:
+        pairs: (M, 2) array-like of (run_length, value) pairs
+
+    Returns:
+        (data, bit_length, table): the packed bytes (MSB first, zero padded),
+        the number of coded bits and an (K, 4) int32 table of
+        (run_length, value, code_len, code bits)
+    """
+    library = load_library()
+    pairs = np.ascontiguousarray(np.asarray(pairs, dtype=np.int32)
+                                 .reshape(-1, 2))
+    count = len(pairs)
+    table = np.empty((max(count, 1), TABLE_COLUMNS), dtype=np.int32)
+    out = np.empty(count * MAX_CODE_LEN // 8 + 1, dtype=np.uint8)
+    table_count = ctypes.c_int()
+    out_bytes = ctypes.c_long()
+    out_bits = ctypes.c_long()
+    _check(library.huffman_encode(
+        pairs.ravel(), count, table.ravel(), len(table),
+        ctypes.byref(table_count), out, len(out),
+        ctypes.byref(out_bytes), ctypes.byref(out_bits)))
+    return (out[:out_bytes.value].tobytes(), out_bits.value,
+            table[:table_count.value])
+
+
+def huffman_decode(data, bit_length, table):
+    """Decode `bit_length` bits of `huffman_encode` output to (M, 2) pairs."""
+    library = load_library()
+    data = np.frombuffer(bytes(data), dtype=np.uint8)
+    data = np.ascontiguousarray(data) if data.size else np.zeros(1, np.uint8)
+    table = np.ascontiguousarray(np.asarray(table, dtype=np.int32)
+                                 .reshape(-1, TABLE_COLUMNS))
+    pairs = np.empty((max(bit_length, 1), 2), dtype=np.int32)
+    count = _check(library.huffman_decode(
+        data, bit_length, table.ravel() if table.size
+        else np.zeros(TABLE_COLUMNS, np.int32), len(table),
+        pairs.ravel(), len(pairs)))
+    return pairs[:count]
+
+
+def code_strings(table):
+    """{(run_length, value): '0101'} of a `huffman_encode` table."""
+    return {(int(run), int(value)): format(int(bits) & 0xFFFFFFFF,
+                                           f'0{length}b')
+            for run, value, length, bits in table}
@@ -0,0 +1,150 @@
+"""In-memory image ingest.
+
+`load_rgb` returns one (H, W, 3) uint8 RGB array for any source, so the
+pipeline no longer writes a BMP to disk only to decode it again:
+
+    * uncompressed 24/32-bit BMP and binary PPM (P6) files with maxval
+      255 are mapped with np.memmap and returned as a strided view of the pixel data, with
+      no PIL involvement and no copy;
+    * everything else PIL can open (JPEG, PNG, TIFF, ...) is decoded once
+      into memory.
+"""
+import io
+import struct
+
+import numpy as np
+from PIL import Image
+
+import profiler
+
+_BMP_FILE_HEADER = struct.Struct('<2sIHHI')
+_BMP_INFO_HEADER = struct.Struct('<IiiHHI')
+_BI_RGB = 0
+# Enough bytes for any BMP/PPM header this module parses.
+_HEADER_BYTES = 512
+
+
+def _read_header(source):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source[:_HEADER_BYTES])
+    with open(source, 'rb') as f:
+        return f.read(_HEADER_BYTES)
+
+
+def _map(source, offset, shape):
+    """Map `shape` uint8 values starting at `offset` of a file or buffer."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        count = int(np.prod(shape))
+        return np.frombuffer(source, dtype=np.uint8, count=count,
+                             offset=offset).reshape(shape)
+    return np.memmap(source, dtype=np.uint8, mode='r', offset=offset,
+                     shape=shape)
+
+
+def _parse_bmp(header):
+    """(offset, width, height, bits, top_down) of a plain BMP, else None."""
+    if len(header) < _BMP_FILE_HEADER.size + _BMP_INFO_HEADER.size:
+        return None
+    magic, _, _, _, offset = _BMP_FILE_HEADER.unpack_from(header)
+    if magic != b'BM':
+        return None
+    info_size, width, height, planes, bits, compression = \
+        _BMP_INFO_HEADER.unpack_from(header, _BMP_FILE_HEADER.size)
+    if (info_size < 40 or planes != 1 or bits not in (24, 32)
+            or compression != _BI_RGB or width <= 0 or height == 0):
+        return None
+    return offset, width, abs(height), bits, height < 0
+
+
+def _parse_ppm(header):
+    """(offset, width, height) of a binary PPM with maxval 255, else None.
+
+    Other maxvals need their samples rescaled, so they are left to PIL.
+    """
+    if not header.startswith(b'P6'):
+        return None
+    tokens = []
+    position = 2
+    while len(tokens) < 3:
+        while position < len(header) and header[position:position + 1] \
+                .isspace():
+            position += 1
+        if position >= len(header):
+            return None
+        if header[position:position + 1] == b'#':
+            end = header.find(b'\n', position)
+            if end < 0:
+                return None
+            position = end + 1
+            continue
+        end = position
+        while end < len(header) and header[end:end + 1].isdigit():
+            end += 1
+        if end == position:
+            return None
+        tokens.append(int(header[position:end]))
+        position = end
+    width, height, maxval = tokens
+    if maxval != 255 or position >= len(header):
+        return None
+    # Exactly one whitespace byte separates the header from the samples.
+    return position + 1, width, height
+
+
+def map_bmp(source):
+    """Memory-mapped RGB view of an uncompressed BMP, or None.
+
+    BMP rows are stored bottom-up (unless the height is negative) in BGR(X)
+    order and padded to 4 bytes; the returned view undoes all of this with
+    strides only.
+    """
+    parsed = _parse_bmp(_read_header(source))
+    if parsed is None:
+        return None
+    offset, width, height, bits, top_down = parsed
+    channels = bits // 8
+    stride = (width * bits + 31) // 32 * 4
+    rows = _map(source, offset, (height, stride))
+    pixels = rows[:, :width * channels].reshape(height, width, channels)
+    pixels = pixels[:, :, 2::-1]
+    return pixels if top_down else pixels[::-1]
+
+
+def map_ppm(source):
+    """Memory-mapped RGB view of a binary PPM with maxval 255, or None."""
+    parsed = _parse_ppm(_read_header(source))
+    if parsed is None:
+        return None
+    offset, width, height = parsed
+    return _map(source, offset, (height, width, 3))
+
+
+@profiler.traced()
+def load_rgb(source):
+    """Load an image as an (H, W, 3) uint8 RGB array.
+
+    Args:
+        source : A file path, the encoded bytes of an image, a PIL Image or
+                 an (H, W, 3) array.
+
+    Returns:
+        np.ndarray : RGB samples. BMP and PPM inputs are read-only views of
+                     a memory map; copy them before writing.
+    """
+    if isinstance(source, np.ndarray):
+        if source.ndim != 3 or source.shape[2] != 3:
+            raise ValueError(f"Expected an (H, W, 3) array, got {source.shape}")
+        return source.astype(np.uint8, copy=False)
+    if isinstance(source, Image.Image):
+        img = source
+    else:
+        for mapper in (map_bmp, map_ppm):
+            pixels = mapper(source)
+            if pixels is not None:
+                return pixels
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            source = io.BytesIO(source)
+        img = Image.open(source)
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    return np.asarray(img)
@@ -0,0 +1,139 @@
+"""Lossless (jpegtran-style) rotate, flip and transpose of coded images.
+
+The transforms work on quantized coefficients, so nothing is rounded again:
+
+    * mirroring the image left to right reverses the block columns and
+      mirrors every block; a mirrored basis function (u, v) equals
+      (-1) ** v times itself, so only coefficient signs change;
+    * mirroring top to bottom likewise reverses the rows and multiplies by
+      (-1) ** u;
+    * transposing transposes the block grid and every coefficient block.
+
+Rotations are compositions of these. A transposing transform also moves
+each coefficient to where the quantization table holds its transposed
+entry, so its result must be dequantized with the transposed tables
+(returned by `transform_image`); the quantized values themselves are exact.
+
+    payloads, width, height, tables = transform_image(
+        payloads, width, height, ORIENTATIONS[exif_orientation])
+"""
+import numpy as np
+
+import srcpath  # noqa: F401
+import profiler
+from entropy_coding import HUFFMAN, decode_blocks, encode_blocks
+from huffman_table import COMPONENT_TABLES
+from unittest import JPEGQuantization
+
+FLIP_HORIZONTAL = 'flip_horizontal'
+FLIP_VERTICAL = 'flip_vertical'
+TRANSPOSE = 'transpose'
+TRANSVERSE = 'transverse'
+ROTATE_90 = 'rotate90'      # Clockwise
+ROTATE_180 = 'rotate180'
+ROTATE_270 = 'rotate270'
+
+# Every transform as a sequence of the three primitives.
+TRANSFORMS = {
+    FLIP_HORIZONTAL: (FLIP_HORIZONTAL, ),
+    FLIP_VERTICAL: (FLIP_VERTICAL, ),
+    TRANSPOSE: (TRANSPOSE, ),
+    TRANSVERSE: (TRANSPOSE, FLIP_HORIZONTAL, FLIP_VERTICAL),
+    ROTATE_90: (TRANSPOSE, FLIP_HORIZONTAL),
+    ROTATE_180: (FLIP_HORIZONTAL, FLIP_VERTICAL),
+    ROTATE_270: (TRANSPOSE, FLIP_VERTICAL),
+}
+
+# Transform that brings an image with EXIF orientation n upright.
+ORIENTATIONS = {1: None, 2: FLIP_HORIZONTAL, 3: ROTATE_180, 4: FLIP_VERTICAL,
+                5: TRANSPOSE, 6: ROTATE_90, 7: TRANSVERSE, 8: ROTATE_270}
+
+# (-1) ** v and (-1) ** u of coefficient (u, v).
+_SIGNS = 1 - 2 * (np.arange(8) % 2)
+HORIZONTAL_SIGNS = np.tile(_SIGNS, (8, 1))
+VERTICAL_SIGNS = HORIZONTAL_SIGNS.T
+
+
+def _steps(transform):
+    if transform not in TRANSFORMS:
+        raise ValueError(f'Unknown transform {transform!r}, expected one of '
+                         f'{sorted(TRANSFORMS)}.')
+    return TRANSFORMS[transform]
+
+
+def transposes(transform):
+    """Whether `transform` swaps the image axes (and the table)."""
+    return _steps(transform).count(TRANSPOSE) % 2 == 1
+
+
+def transform_blocks(blocks, columns, transform):
+    """Apply a lossless transform to a quantized coefficient stack.
+
+    Args:
+        blocks    : (N, 8, 8) quantized coefficients in raster block order,
+                    e.g. from `H_Decoder.decode`.
+        columns   : Width of the image in blocks.
+        transform : A key of `TRANSFORMS`.
+
+    Returns:
+        (blocks, columns): the transformed (N, 8, 8) stack in raster order
+        of the transformed image, and its width in blocks.
+    """
+    grid = np.asarray(blocks).reshape(-1, columns, 8, 8)
+    # Sign of every coefficient, tracked in the current orientation.
+    signs = np.ones((8, 8), dtype=np.int64)
+    for step in _steps(transform):
+        if step == TRANSPOSE:
+            grid = grid.transpose(1, 0, 3, 2)
+            signs = signs.T
+        elif step == FLIP_HORIZONTAL:
+            grid = grid[:, ::-1]
+            signs = signs * HORIZONTAL_SIGNS
+        else:
+            grid = grid[::-1]
+            signs = signs * VERTICAL_SIGNS
+    out = (grid * signs.astype(grid.dtype)).reshape(-1, 8, 8)
+    return out, grid.shape[1]
+
+
+def transform_table(quant_table, transform):
+    """Quantization table matching the output of `transform_blocks`."""
+    quant_table = np.asarray(quant_table)
+    return quant_table.T.copy() if transposes(transform) else quant_table
+
+
+@profiler.traced()
+def transform_image(payloads, width, height, transform, quality=None,
+                    coder=HUFFMAN):
+    """Losslessly transform the Y, Cb and Cr payloads of an image.
+
+    Args:
+        payloads  : {'Y': bytes, 'Cb': bytes, 'Cr': bytes} from
+                    `entropy_coding.encode_blocks`.
+        width     : Image width in pixels, a multiple of 8.
+        height    : Image height in pixels, a multiple of 8.
+        transform : A key of `TRANSFORMS`, or None to return the input.
+        quality   : Quality the payloads were coded at (None: fixed tables).
+        coder     : Entropy coder of the payloads and the result.
+
+    Returns:
+        (payloads, width, height, tables): the transformed payloads, the new
+        size and the {'Y', 'Cb', 'Cr'} quantization tables to decode them
+        with.
+    """
+    if width % 8 or height % 8:
+        raise ValueError(f"Image dimensions must be multiples of 8! "
+                         f"Current size: {width}x{height}")
+    tables = {name: JPEGQuantization(qt_choice, quality).quant_table
+              for name, (qt_choice, _) in COMPONENT_TABLES.items()}
+    if transform is None:
+        return dict(payloads), width, height, tables
+    result = {}
+    for name, (_, layer_type) in COMPONENT_TABLES.items():
+        blocks = decode_blocks(payloads[name], layer_type, coder)
+        blocks, _ = transform_blocks(blocks, width // 8, transform)
+        result[name] = encode_blocks(blocks, layer_type, coder)
+        tables[name] = transform_table(tables[name], transform)
+    if transposes(transform):
+        width, height = height, width
+    return result, width, height, tables
@@ -0,0 +1,425 @@
+import collections
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:     # Not available on Windows
+    resource = None
+
+# Instrumentation is off unless `enable()` is called; every public entry point
+# checks this flag first so the disabled cost is a global lookup and a branch.
+_enabled = False
+_lock = threading.Lock()
+_events = []
+_counters = collections.Counter()
+_counter_events = []
+_origin_ns = time.perf_counter_ns()
+
+# Memory instrumentation (`enable(memory=True)`): every span also records
+# (name, peak bytes, retained bytes, RSS bytes at exit, child peak RSS bytes).
+_memory = False
+_started_tracemalloc = False
+_memory_events = []
+_frames = threading.local()
+_MB = 1 << 20
+
+
+class MemoryBudgetExceeded(AssertionError):
+    """A stage allocated more than its memory budget."""
+
+
+def _max_rss(who):
+    """ru_maxrss in bytes of `who` ('RUSAGE_SELF' or 'RUSAGE_CHILDREN')."""
+    if resource is None:
+        return 0
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    peak = resource.getrusage(getattr(resource, who)).ru_maxrss
+    return peak if os.uname().sysname == 'Darwin' else peak * 1024
+
+
+def rss_bytes():
+    """Resident set size of this process (peak RSS where /proc is missing)."""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return _max_rss('RUSAGE_SELF')
+
+
+def child_rss_bytes():
+    """Peak RSS of the largest child process waited for so far.
+
+    The OS keeps one maximum over all children, not a figure per child;
+    0 where it is not available.
+    """
+    return _max_rss('RUSAGE_CHILDREN')
+
+
+def _memory_enter():
+    """Open a memory frame: traced bytes at entry, high water mark, RSS.
+
+    tracemalloc keeps one global peak, so it is reset at every frame entry
+    and the enclosing frame keeps the peak reached before the reset. The
+    figures are exact for stages running on one thread at a time.
+    """
+    stack = _frames.__dict__.setdefault('stack', [])
+    current, peak = tracemalloc.get_traced_memory()
+    if stack:
+        stack[-1][1] = max(stack[-1][1], peak)
+    tracemalloc.reset_peak()
+    frame = [current, current, rss_bytes(), child_rss_bytes()]
+    stack.append(frame)
+    return frame
+
+
+def _memory_exit(frame):
+    """Close a memory frame.
+
+    Returns:
+        (peak, retained, rss, child_rss): bytes allocated at the peak of the
+        frame and still allocated at its end (both relative to its entry),
+        the RSS at exit, and the peak RSS of a child process waited for
+        inside the frame (0 if no child exceeded the earlier children).
+    """
+    stack = _frames.stack
+    current, peak = tracemalloc.get_traced_memory()
+    high = max(frame[1], peak)
+    del stack[max(i for i, open_frame in enumerate(stack)
+                  if open_frame is frame)]
+    if stack:
+        stack[-1][1] = max(stack[-1][1], high)
+    child = child_rss_bytes()
+    return (high - frame[0], current - frame[0], rss_bytes(),
+            child if child > frame[3] else 0)
+
+
+class _NullSpan:
+    """Span returned while instrumentation is disabled; does nothing."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+        self.start_ns = 0
+        self.frame = None
+
+    def __enter__(self):
+        if _memory:
+            self.frame = _memory_enter()
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end_ns = time.perf_counter_ns()
+        if self.frame is not None:
+            peak, retained, rss, child = _memory_exit(self.frame)
+            self.args = dict(self.args, peak_mb=round(peak / _MB, 3),
+                             retained_mb=round(retained / _MB, 3))
+            if child:
+                self.args['child_rss_mb'] = round(child / _MB, 3)
+            with _lock:
+                _memory_events.append((self.name, peak, retained, rss,
+                                       child))
+        event = (self.name, self.start_ns, end_ns - self.start_ns,
+                 threading.get_ident(), self.args)
+        with _lock:
+            _events.append(event)
+        return False
+
+
+def enable(memory=False):
+    """Start recording spans and counters.
+
+    Args:
+        memory : Also record the tracemalloc peak and retained memory and
+                 the RSS of every span (starts tracemalloc, which slows
+                 allocation-heavy code down noticeably). A child process
+                 waited for inside a span (e.g. subprocess.run) adds its
+                 peak RSS as child_rss_mb.
+    """
+    global _enabled, _memory, _started_tracemalloc
+    _enabled = True
+    if memory and not _memory:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _started_tracemalloc = True
+        _memory = True
+
+
+def disable():
+    """Stop recording; already recorded data is kept until `reset()`."""
+    global _enabled, _memory, _started_tracemalloc
+    _enabled = False
+    _memory = False
+    if _started_tracemalloc:
+        tracemalloc.stop()
+        _started_tracemalloc = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    """Drop every recorded span and counter."""
+    global _origin_ns
+    with _lock:
+        _events.clear()
+        _counters.clear()
+        _counter_events.clear()
+        _memory_events.clear()
+        _origin_ns = time.perf_counter_ns()
+
+
+def span(name, **args):
+    """Time a block of code.
+
+    Usage:
+        with span("huffman", component="Y"):
+            ...
+
+    Args:
+        name : Name of the stage shown in summaries and traces.
+        args : Extra key/value pairs attached to the trace event.
+
+    Returns:
+        A context manager. It is a shared no-op object when instrumentation
+        is disabled.
+    """
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, args)
+
+
+def traced(name=None):
+    """Decorator that wraps every call of a function in a `span`.
+
+    Args:
+        name : Span name, defaults to the function name.
+    """
+    def decorator(func):
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _Span(span_name, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name, value=1):
+    """Add `value` to the counter `name`.
+
+    Shared counters and their units:
+        blocks           : 8x8 blocks of one component (an image with N
+                           blocks per plane adds 3N), counted once where
+                           the blocks are cut from the image.
+        quantized_blocks : Component blocks transformed and (re)quantized.
+        flat_blocks      : Quantized blocks that took the DC-only path.
+        symbols          : Huffman symbols coded.
+        bytes            : Bitstream bytes written.
+    """
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] += value
+        _counter_events.append(
+            (name, time.perf_counter_ns(), _counters[name])
+        )
+
+
+def counters():
+    """Return a copy of the current counter values."""
+    with _lock:
+        return dict(_counters)
+
+
+def summary():
+    """Aggregate recorded spans by name.
+
+    Returns:
+        dict : {name: {'calls': int, 'total_s': float, 'mean_s': float,
+                       'max_s': float}} ordered by first occurrence.
+    """
+    stats = {}
+    with _lock:
+        events = list(_events)
+    for name, _, dur_ns, _, _ in events:
+        entry = stats.setdefault(name, {'calls': 0, 'total_s': 0.0,
+                                        'max_s': 0.0})
+        entry['calls'] += 1
+        entry['total_s'] += dur_ns / 1e9
+        entry['max_s'] = max(entry['max_s'], dur_ns / 1e9)
+    for entry in stats.values():
+        entry['mean_s'] = entry['total_s'] / entry['calls']
+    return stats
+
+
+def memory_summary():
+    """Aggregate recorded span memory by name (needs `enable(memory=True)`).
+
+    Returns:
+        dict : {name: {'calls': int, 'peak_mb': float, 'retained_mb': float,
+                       'rss_mb': float, 'child_rss_mb': float}} with the
+               largest peak, retained, exit RSS and child peak RSS figures
+               of all calls, ordered by first occurrence.
+    """
+    stats = {}
+    with _lock:
+        events = list(_memory_events)
+    for name, peak, retained, rss, child in events:
+        entry = stats.setdefault(name, {'calls': 0, 'peak_mb': 0.0,
+                                        'retained_mb': float('-inf'),
+                                        'rss_mb': 0.0, 'child_rss_mb': 0.0})
+        entry['calls'] += 1
+        entry['peak_mb'] = max(entry['peak_mb'], peak / _MB)
+        entry['retained_mb'] = max(entry['retained_mb'], retained / _MB)
+        entry['rss_mb'] = max(entry['rss_mb'], rss / _MB)
+        entry['child_rss_mb'] = max(entry['child_rss_mb'], child / _MB)
+    return stats
+
+
+def check_budgets(budgets):
+    """Assert recorded span peaks against per-stage budgets.
+
+    Usage:
+        profiler.enable(memory=True)
+        ...run the pipeline...
+        profiler.check_budgets({'ingest': 64, 'transform': 256})
+
+    Args:
+        budgets : {span name: budget in MB}. Names without recorded spans
+                  are ignored.
+
+    Raises:
+        MemoryBudgetExceeded : Listing every stage over its budget.
+
+    Returns:
+        dict : `memory_summary()`.
+    """
+    stats = memory_summary()
+    over = [f"{name} peaked at {stats[name]['peak_mb']:.1f} MB "
+            f"(budget {budget} MB)"
+            for name, budget in budgets.items()
+            if name in stats and stats[name]['peak_mb'] > budget]
+    if over:
+        raise MemoryBudgetExceeded('; '.join(over))
+    return stats
+
+
+@contextlib.contextmanager
+def memory_budget(limit_mb, name='block'):
+    """Fail a block of code that allocates more than `limit_mb` at its peak.
+
+    Works whether or not instrumentation is enabled.
+
+    Usage:
+        with memory_budget(512, 'encode 4096x4096') as usage:
+            encode(...)
+        print(usage['peak_mb'])
+
+    Yields:
+        dict : Filled with 'peak_mb', 'retained_mb', 'rss_mb' and
+               'child_rss_mb' on exit. The budget applies to 'peak_mb'.
+
+    Raises:
+        MemoryBudgetExceeded : When the peak exceeds `limit_mb`.
+    """
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    usage = {}
+    frame = _memory_enter()
+    try:
+        yield usage
+    finally:
+        peak, retained, rss, child = _memory_exit(frame)
+        if started:
+            tracemalloc.stop()
+        usage.update(peak_mb=peak / _MB, retained_mb=retained / _MB,
+                     rss_mb=rss / _MB, child_rss_mb=child / _MB)
+    if usage['peak_mb'] > limit_mb:
+        raise MemoryBudgetExceeded(f"{name} peaked at "
+                                   f"{usage['peak_mb']:.1f} MB "
+                                   f"(budget {limit_mb} MB)")
+
+
+def print_summary():
+    """Print per-stage timings and memory followed by the counters."""
+    stats = summary()
+    if stats:
+        width = max(len(name) for name in stats)
+        print(f"\n{'Stage':<{width}}  {'Calls':>6}  {'Total(s)':>9}  "
+              f"{'Mean(ms)':>9}")
+        for name, entry in stats.items():
+            print(f"{name:<{width}}  {entry['calls']:>6}  "
+                  f"{entry['total_s']:>9.3f}  {entry['mean_s'] * 1e3:>9.3f}")
+    memory = memory_summary()
+    if memory:
+        width = max(len(name) for name in memory)
+        print(f"\n{'Stage':<{width}}  {'Peak(MB)':>9}  {'Retained(MB)':>12}  "
+              f"{'RSS(MB)':>8}  {'Child RSS(MB)':>13}")
+        for name, entry in memory.items():
+            print(f"{name:<{width}}  {entry['peak_mb']:>9.2f}  "
+                  f"{entry['retained_mb']:>12.2f}  {entry['rss_mb']:>8.1f}  "
+                  f"{entry['child_rss_mb']:>13.1f}")
+    for name, value in counters().items():
+        print(f"{name}: {value}")
+
+
+def export_chrome_trace(path):
+    """Write recorded spans and counters as Chrome trace-event JSON.
+
+    The file can be opened with chrome://tracing or https://ui.perfetto.dev.
+
+    Args:
+        path : Output JSON file path.
+    """
+    pid = os.getpid()
+    trace_events = []
+    with _lock:
+        events = list(_events)
+        counter_events = list(_counter_events)
+    for name, start_ns, dur_ns, tid, args in events:
+        trace_events.append({
+            'name': name,
+            'ph': 'X',
+            'ts': (start_ns - _origin_ns) / 1e3,
+            'dur': dur_ns / 1e3,
+            'pid': pid,
+            'tid': tid,
+            'args': {k: str(v) for k, v in args.items()},
+        })
+    for name, ts_ns, value in counter_events:
+        trace_events.append({
+            'name': name,
+            'ph': 'C',
+            'ts': (ts_ns - _origin_ns) / 1e3,
+            'pid': pid,
+            'args': {name: value},
+        })
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({'traceEvents': trace_events,
+                   'displayTimeUnit': 'ms'}, f)
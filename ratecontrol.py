@@ -0,0 +1,102 @@
+"""Target-size rate control.
+
+Finds the highest quality factor whose entropy-coded size fits a byte
+budget. The AAN transform runs once per image; every quality probed only
+re-quantizes the cached coefficients (one multiply each) and prices them
+with the histogram bit-cost estimator in src/bitcost.py, so no Huffman
+codes are generated during the search.
+"""
+import numpy as np
+
+import srcpath  # noqa: F401
+from bitcost import code_length_tables, estimate_bits
+from fastdct import AAN_SCALE_2D, AANDCT
+from huffman_table import COMPONENT_TABLES, COMPONENTS
+from unittest import JPEGQuantization
+
+
+class RateController:
+    def __init__(self, y_blocks, cb_blocks, cr_blocks):
+        """Transform an image once for repeated size estimates.
+
+        Args:
+            y_blocks, cb_blocks, cr_blocks : (N, 8, 8) level-shifted blocks,
+                                             as produced by `extract_blocks`.
+        """
+        transform = AANDCT(dtype=np.float32)
+        self.coefficients = [transform.transform(blocks)
+                             for blocks in (y_blocks, cb_blocks, cr_blocks)]
+        # (qt_choice, layer_type) of the Y, Cb and Cr stacks.
+        self.tables = [COMPONENT_TABLES[name] for name in COMPONENTS]
+        self.code_lengths = [code_length_tables(layer)
+                             for _, layer in self.tables]
+        self._cache = {}
+
+    def quantize(self, quality):
+        """Quantized Y, Cb and Cr stacks at `quality`."""
+        quantized = []
+        for coefficients, (qt_choice, _) in zip(self.coefficients,
+                                                self.tables):
+            multipliers = JPEGQuantization(qt_choice, quality) \
+                .reciprocal_table(AAN_SCALE_2D).astype(np.float32)
+            quantized.append(np.rint(coefficients * multipliers)
+                             .astype(np.int32))
+        return quantized
+
+    def estimate_bytes(self, quality):
+        """Estimated entropy-coded bytes of the image at `quality`."""
+        if quality not in self._cache:
+            bits = sum(estimate_bits(blocks, layer, code_lengths)
+                       for blocks, (_, layer), code_lengths
+                       in zip(self.quantize(quality), self.tables,
+                              self.code_lengths))
+            self._cache[quality] = (bits + 7) // 8
+        return self._cache[quality]
+
+    def search(self, target_bytes, min_quality=1, max_quality=100):
+        """Bisect for the highest quality whose estimate fits the budget.
+
+        Args:
+            target_bytes : Byte budget of the entropy-coded data.
+            min_quality  : Lowest quality factor to consider.
+            max_quality  : Highest quality factor to consider.
+
+        Returns:
+            dict : {'quality', 'estimated_bytes', 'fits', 'probes'}. When
+                   even `min_quality` is too large, it is returned with
+                   fits=False.
+        """
+        probes = []
+
+        def probe(quality):
+            size = self.estimate_bytes(quality)
+            probes.append((quality, size))
+            return size
+
+        low, high = min_quality, max_quality
+        if probe(high) <= target_bytes:
+            low = high
+        elif probe(low) > target_bytes:
+            high = low
+        # Invariant: low fits (or is min_quality), high does not fit.
+        while high - low > 1:
+            middle = (low + high) // 2
+            if probe(middle) <= target_bytes:
+                low = middle
+            else:
+                high = middle
+        size = self.estimate_bytes(low)
+        return {'quality': low, 'estimated_bytes': size,
+                'fits': size <= target_bytes, 'probes': probes}
+
+
+def encode_to_size(y_blocks, cb_blocks, cr_blocks, target_bytes):
+    """Quantize an image at the highest quality that fits `target_bytes`.
+
+    Returns:
+        (result, quantized) : the `RateController.search` result and the
+                              quantized Y, Cb and Cr stacks at that quality.
+    """
+    controller = RateController(y_blocks, cb_blocks, cr_blocks)
+    result = controller.search(target_bytes)
+    return result, controller.quantize(result['quality'])
@@ -0,0 +1,157 @@
+"""Asyncio batch encoding service.
+
+Small images spend most of their time in per-call overhead, so requests are
+queued and the blocks of every pending image are coalesced into one large
+stack per quantization table before the vectorized AAN DCT/quantization
+runs. The quantized stack is then split back by block offsets and every
+image gets its own entropy-coded Y, Cb and Cr payloads.
+
+Backpressure: `encode` waits while `max_pending` requests are queued.
+Latency: a batch is closed once it holds `max_batch_blocks` blocks or
+`max_latency` seconds after its first request arrived, whichever is first.
+
+    async with BatchEncoder() as encoder:
+        payloads = await encoder.encode(y_blocks, cb_blocks, cr_blocks)
+"""
+import asyncio
+
+import numpy as np
+
+import srcpath  # noqa: F401
+import profiler
+from entropy_coding import HUFFMAN, encode_blocks
+from fastdct import AANDCT
+from huffman_table import COMPONENT_TABLES, COMPONENTS
+
+
+class BatchEncoder:
+    def __init__(self, max_batch_blocks=65536, max_latency=0.005,
+                 max_pending=256, coder=HUFFMAN, executor=None):
+        """Create a batching encoder; use it with `async with` or `start`.
+
+        Args:
+            max_batch_blocks : Blocks (all components) that close a batch.
+            max_latency      : Seconds a batch waits for more requests.
+            max_pending      : Queued requests before `encode` blocks.
+            coder            : Entropy coder of `entropy_coding`.
+            executor         : concurrent.futures executor running the
+                               batches; the loop's default one if None.
+        """
+        self.max_batch_blocks = max_batch_blocks
+        self.max_latency = max_latency
+        self.max_pending = max_pending
+        self.coder = coder
+        self.executor = executor
+        self.engines = {qt_choice: AANDCT(qt_choice)
+                        for qt_choice, _ in COMPONENT_TABLES.values()}
+        self.stats = {'requests': 0, 'batches': 0, 'blocks': 0,
+                      'flat_blocks': 0}
+        self._queue = None
+        self._worker = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, traceback):
+        await self.stop()
+
+    async def start(self):
+        if self._worker is None:
+            self._queue = asyncio.Queue(maxsize=self.max_pending)
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Finish every queued request, then stop the batching task."""
+        if self._worker is not None:
+            await self._queue.put(None)
+            await self._worker
+            self._worker = None
+
+    async def encode(self, y_blocks, cb_blocks, cr_blocks):
+        """Encode one image's level-shifted blocks.
+
+        Args:
+            y_blocks, cb_blocks, cr_blocks : (N, 8, 8) blocks, as produced
+                                             by `extract_blocks`.
+
+        Returns:
+            dict : {'Y': bytes, 'Cb': bytes, 'Cr': bytes}, each decodable
+                   with `entropy_coding.decode_blocks`.
+        """
+        if self._worker is None:
+            raise RuntimeError('BatchEncoder is not started.')
+        blocks = {name: np.asarray(data, dtype=np.int16).reshape(-1, 8, 8)
+                  for name, data in zip(COMPONENTS,
+                                        (y_blocks, cb_blocks, cr_blocks))}
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((blocks, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            size = sum(len(b) for b in item[0].values())
+            deadline = loop.time() + self.max_latency
+            while size < self.max_batch_blocks:
+                timeout = deadline - loop.time()
+                try:
+                    if timeout > 0:
+                        item = await asyncio.wait_for(self._queue.get(),
+                                                      timeout)
+                    else:
+                        item = self._queue.get_nowait()
+                except (asyncio.TimeoutError, asyncio.QueueEmpty):
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+                size += sum(len(b) for b in item[0].values())
+
+            requests = [blocks for blocks, _ in batch]
+            try:
+                results = await loop.run_in_executor(
+                    self.executor, self._encode_batch, requests)
+            except Exception as error:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+            self.stats['requests'] += len(batch)
+            self.stats['batches'] += 1
+            self.stats['blocks'] += size
+            self.stats['flat_blocks'] = sum(engine.flat_hits for engine
+                                            in self.engines.values())
+
+    def _encode_batch(self, requests):
+        """Quantize coalesced requests per table and entropy code each."""
+        quantized = [{} for _ in requests]
+        with profiler.span("service_batch", requests=len(requests)):
+            for qt_choice, engine in self.engines.items():
+                names = [name for name in COMPONENTS
+                         if COMPONENT_TABLES[name][0] == qt_choice]
+                parts = [request[name] for request in requests
+                         for name in names]
+                offsets = np.cumsum([0] + [len(part) for part in parts])
+                coefficients = engine.quantize(np.concatenate(parts))
+                profiler.count("quantized_blocks", len(coefficients))
+                slot = 0
+                for index in range(len(requests)):
+                    for name in names:
+                        quantized[index][name] = \
+                            coefficients[offsets[slot]:offsets[slot + 1]]
+                        slot += 1
+            return [{name: encode_blocks(blocks[name],
+                                         COMPONENT_TABLES[name][1],
+                                         self.coder)
+                     for name in COMPONENTS}
+                    for blocks in quantized]
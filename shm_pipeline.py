@@ -0,0 +1,232 @@
+"""Shared-memory multi-process DCT/quantization of block stacks.
+
+A process pool normally pickles every (N, 8, 8) stack to the workers and the
+results back, which costs about as much as the transform itself. Here the
+input planes or block stacks and the coefficient outputs live in named
+`multiprocessing.shared_memory` segments owned by the parent; a task is only
+a `BlockRange` descriptor (segment names, shapes, dtypes and a block range)
+and a worker writes its quantized blocks straight into the output segment.
+
+    with SharedBlockPipeline(workers=32) as pipeline:
+        y = pipeline.quantize(y_plane, qt_choice=1)     # (H, W) plane
+        cb = pipeline.quantize(cb_blocks, qt_choice=2)  # (N, 8, 8) stack
+
+Cleanup: every segment is closed and unlinked when the pipeline is closed,
+on leaving the `with` block (also on errors), when the pipeline is garbage
+collected and at interpreter exit (`weakref.finalize`), so no /dev/shm
+entry outlives the parent.
+"""
+import collections
+import multiprocessing
+import weakref
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+import profiler
+from fastdct import AANDCT
+
+# A shared array: segment name, shape and dtype string.
+SharedArray = collections.namedtuple('SharedArray', 'name shape dtype')
+
+# One task: quantize blocks [start, stop) of `source` into `target`. A 2-D
+# source is a sample plane whose blocks are taken in raster order; ranges
+# over a plane cover whole block rows.
+BlockRange = collections.namedtuple('BlockRange',
+                                    'source target start stop qt_choice')
+
+# Attached segments and engines kept by every worker between tasks.
+_WORKER_SEGMENTS = collections.OrderedDict()
+_WORKER_ENGINES = {}
+_WORKER_CACHE_SIZE = 8
+
+
+def _view(segment, shared):
+    return np.ndarray(shared.shape, dtype=np.dtype(shared.dtype),
+                      buffer=segment.buf)
+
+
+def _attach(shared):
+    """Worker-side view of a shared array, attaching on first use."""
+    segment = _WORKER_SEGMENTS.get(shared.name)
+    if segment is None:
+        segment = shared_memory.SharedMemory(name=shared.name)
+        _WORKER_SEGMENTS[shared.name] = segment
+        if len(_WORKER_SEGMENTS) > _WORKER_CACHE_SIZE:
+            _, oldest = _WORKER_SEGMENTS.popitem(last=False)
+            oldest.close()
+    else:
+        _WORKER_SEGMENTS.move_to_end(shared.name)
+    return _view(segment, shared)
+
+
+def _plane_blocks(plane, start, stop):
+    """Blocks [start, stop) of a plane; the range covers whole block rows."""
+    columns = plane.shape[1] // 8
+    rows = plane[start // columns * 8:stop // columns * 8]
+    return rows.reshape(-1, 8, columns, 8).swapaxes(1, 2).reshape(-1, 8, 8)
+
+
+def _run_range(task):
+    """Worker entry point: quantize one block range in place."""
+    source = _attach(task.source)
+    target = _attach(task.target)
+    if source.ndim == 2:
+        blocks = _plane_blocks(source, task.start, task.stop)
+    else:
+        blocks = source[task.start:task.stop]
+    engine = _WORKER_ENGINES.get(task.qt_choice)
+    if engine is None:
+        engine = _WORKER_ENGINES[task.qt_choice] = AANDCT(task.qt_choice)
+    target[task.start:task.stop] = engine.quantize(blocks)
+    return task.stop - task.start
+
+
+def _release(pool, segments):
+    """Stop the pool, then close and unlink every owned segment."""
+    pool.terminate()
+    pool.join()
+    while segments:
+        _, segment = segments.popitem()
+        segment.close()
+        try:
+            segment.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class SharedBlockPipeline:
+    def __init__(self, workers=None, chunk_blocks=8192):
+        """Create a shared-memory pipeline and start its workers.
+
+        Args:
+            workers      : Worker processes (default: CPU count).
+            chunk_blocks : Blocks per task; plane tasks are rounded to
+                           whole block rows.
+        """
+        self.chunk_blocks = chunk_blocks
+        self._segments = {}
+        # Workers must share the parent's resource tracker; one started
+        # inside a worker would report the parent's segments as leaked.
+        resource_tracker.ensure_running()
+        self._pool = multiprocessing.Pool(workers)
+        self._finalizer = weakref.finalize(self, _release, self._pool,
+                                           self._segments)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def close(self):
+        """Stop the workers and free every shared segment."""
+        self._finalizer()
+
+    @property
+    def closed(self):
+        return not self._finalizer.alive
+
+    def allocate(self, shape, dtype):
+        """Create an owned shared array.
+
+        Returns:
+            (SharedArray, np.ndarray): its descriptor and a parent-side view,
+            valid until `free` or `close`.
+        """
+        if self.closed:
+            raise ValueError('SharedBlockPipeline is closed.')
+        shape = tuple(int(n) for n in shape)
+        dtype = np.dtype(dtype)
+        size = max(int(np.prod(shape)) * dtype.itemsize, 1)
+        segment = shared_memory.SharedMemory(create=True, size=size)
+        self._segments[segment.name] = segment
+        shared = SharedArray(segment.name, shape, dtype.str)
+        return shared, _view(segment, shared)
+
+    def share(self, array):
+        """Copy an array into a new owned shared array."""
+        array = np.asarray(array)
+        shared, view = self.allocate(array.shape, array.dtype)
+        view[...] = array
+        return shared, view
+
+    def free(self, shared):
+        """Close and unlink one owned shared array."""
+        segment = self._segments.pop(shared.name, None)
+        if segment is not None:
+            segment.close()
+            segment.unlink()
+
+    def view(self, shared):
+        """Parent-side array of an owned SharedArray."""
+        return _view(self._segments[shared.name], shared)
+
+    def ranges(self, source, target, qt_choice):
+        """Split a shared plane or block stack into `BlockRange` tasks."""
+        if len(source.shape) == 2:
+            height, width = source.shape
+            if height % 8 or width % 8:
+                raise ValueError(f"Image dimensions must be multiples of 8! "
+                                 f"Current size: {width}x{height}")
+            step = max(self.chunk_blocks // (width // 8), 1) * (width // 8)
+            count = height // 8 * (width // 8)
+        else:
+            step = self.chunk_blocks
+            count = source.shape[0]
+        return [BlockRange(source, target, start, min(start + step, count),
+                           qt_choice)
+                for start in range(0, count, step)]
+
+    @profiler.traced()
+    def run(self, source, qt_choice=1, target=None):
+        """Quantize a shared plane or block stack on the workers.
+
+        Args:
+            source    : SharedArray of an (H, W) level-shifted plane or an
+                        (N, 8, 8) block stack.
+            qt_choice : Quantization table (1 or 2).
+            target    : (N, 8, 8) int32 SharedArray receiving the result;
+                        allocated if None (and freed again on errors).
+
+        Returns:
+            SharedArray : The target.
+        """
+        if len(source.shape) == 2:
+            count = source.shape[0] // 8 * (source.shape[1] // 8)
+        else:
+            count = source.shape[0]
+        allocated = target is None
+        if allocated:
+            target, _ = self.allocate((count, 8, 8), np.int32)
+        try:
+            done = sum(self._pool.imap_unordered(
+                _run_range, self.ranges(source, target, qt_choice)))
+        except BaseException:
+            # The caller never sees a target allocated here.
+            if allocated:
+                self.free(target)
+            raise
+        profiler.count("quantized_blocks", done)
+        return target
+
+    def quantize(self, data, qt_choice=1):
+        """Quantize an (H, W) plane or (N, 8, 8) stack in parallel.
+
+        The input is copied into shared memory once and the result copied
+        out once; nothing is pickled but the task descriptors. Use
+        `allocate`/`share` and `run` to keep both sides shared.
+
+        Returns:
+            (N, 8, 8) int32 quantized coefficients, as `AANDCT.quantize`.
+        """
+        source, _ = self.share(data)
+        target = None
+        try:
+            target = self.run(source, qt_choice)
+            return self.view(target).copy()
+        finally:
+            self.free(source)
+            if target is not None:
+                self.free(target)
@@ -0,0 +1,270 @@
+import struct
+
+import numpy as np
+
+from huffman_table import ZIG_ZAG_INDEX, to_zig_zag
+
+# Adaptive binary range coder in the style of the LZMA coder: 11-bit
+# probabilities of a zero bit that move 1/32 of the way toward each coded
+# bit. The block model below follows the JPEG arithmetic coding decisions
+# (ITU T.81 Annex F): DC difference zero/sign/magnitude-category/magnitude
+# bits conditioned on the previous difference, and per-position AC
+# end-of-block and zero decisions.
+PROB_BITS = 11
+PROB_INIT = 1 << (PROB_BITS - 1)
+MOVE_BITS = 5
+TOP = 1 << 24
+MASK32 = 0xFFFFFFFF
+
+# AC positions up to this zig-zag index use the low-frequency magnitude
+# contexts (the Kx conditioning parameter of T.81, default 5).
+AC_LOW_BAND = 5
+MAX_SIZE = 16
+
+HEADER = struct.Struct('>I')
+
+
+class _RangeEncoder:
+    def __init__(self):
+        self.low = 0
+        self.range = MASK32
+        self.cache = 0
+        self.cache_size = 1
+        self.out = bytearray()
+
+    def encode(self, probs, idx, bit):
+        prob = probs[idx]
+        bound = (self.range >> PROB_BITS) * prob
+        if bit:
+            self.low += bound
+            self.range -= bound
+            probs[idx] = prob - (prob >> MOVE_BITS)
+        else:
+            self.range = bound
+            probs[idx] = prob + (((1 << PROB_BITS) - prob) >> MOVE_BITS)
+        while self.range < TOP:
+            self.range = (self.range << 8) & MASK32
+            self._shift_low()
+
+    def encode_direct(self, value, length):
+        """Code `length` equiprobable bits of `value`, MSB first."""
+        for shift in range(length - 1, -1, -1):
+            self.range >>= 1
+            if (value >> shift) & 1:
+                self.low += self.range
+            while self.range < TOP:
+                self.range = (self.range << 8) & MASK32
+                self._shift_low()
+
+    def _shift_low(self):
+        if self.low < 0xFF000000 or self.low > MASK32:
+            carry = self.low >> 32
+            temp = self.cache
+            while True:
+                self.out.append((temp + carry) & 0xFF)
+                temp = 0xFF
+                self.cache_size -= 1
+                if not self.cache_size:
+                    break
+            self.cache = (self.low >> 24) & 0xFF
+        self.cache_size += 1
+        self.low = (self.low & 0x00FFFFFF) << 8
+
+    def finish(self):
+        for _ in range(5):
+            self._shift_low()
+        return bytes(self.out)
+
+
+class _RangeDecoder:
+    def __init__(self, data, offset=0):
+        self.data = data
+        self.pos = offset + 5
+        self.range = MASK32
+        self.code = int.from_bytes(data[offset:offset + 5], 'big') & MASK32
+
+    def _next_byte(self):
+        byte = self.data[self.pos] if self.pos < len(self.data) else 0
+        self.pos += 1
+        return byte
+
+    def decode(self, probs, idx):
+        prob = probs[idx]
+        bound = (self.range >> PROB_BITS) * prob
+        if self.code < bound:
+            self.range = bound
+            probs[idx] = prob + (((1 << PROB_BITS) - prob) >> MOVE_BITS)
+            bit = 0
+        else:
+            self.code -= bound
+            self.range -= bound
+            probs[idx] = prob - (prob >> MOVE_BITS)
+            bit = 1
+        while self.range < TOP:
+            self.range = (self.range << 8) & MASK32
+            self.code = ((self.code << 8) | self._next_byte()) & MASK32
+        return bit
+
+    def decode_direct(self, length):
+        value = 0
+        for _ in range(length):
+            self.range >>= 1
+            bit = 0
+            if self.code >= self.range:
+                self.code -= self.range
+                bit = 1
+            value = (value << 1) | bit
+            while self.range < TOP:
+                self.range = (self.range << 8) & MASK32
+                self.code = ((self.code << 8) | self._next_byte()) & MASK32
+        return value
+
+
+class _BlockModel:
+    """Adaptive probabilities of every binary decision."""
+
+    def __init__(self):
+        def table(size):
+            return [PROB_INIT] * size
+        # DC decisions are conditioned on the class of the previous DC
+        # difference: zero, small +/-, large +/-.
+        self.dc_zero = table(5)
+        self.dc_sign = table(5)
+        self.dc_size = table(5 * MAX_SIZE)
+        self.dc_bits = table(MAX_SIZE)
+        self.ac_eob = table(64)
+        self.ac_zero = table(64)
+        self.ac_size = table(2 * MAX_SIZE)
+        self.ac_bits = table(2 * MAX_SIZE)
+
+
+def _dc_context(diff):
+    if diff == 0:
+        return 0
+    if -2 <= diff <= 2:
+        return 1 if diff > 0 else 2
+    return 3 if diff > 0 else 4
+
+
+def _encode_magnitude(coder, size_probs, size_base, bit_probs, bit_base,
+                      magnitude):
+    """Code magnitude >= 1 as a unary bit length then the bits below MSB."""
+    size = magnitude.bit_length()
+    for i in range(size - 1):
+        coder.encode(size_probs, size_base + i, 1)
+    if size < MAX_SIZE:
+        coder.encode(size_probs, size_base + size - 1, 0)
+    for shift in range(size - 2, -1, -1):
+        coder.encode(bit_probs, bit_base + size - 1, (magnitude >> shift) & 1)
+
+
+def _decode_magnitude(coder, size_probs, size_base, bit_probs, bit_base):
+    size = 1
+    while size < MAX_SIZE and coder.decode(size_probs, size_base + size - 1):
+        size += 1
+    magnitude = 1
+    for _ in range(size - 1):
+        magnitude = (magnitude << 1) | coder.decode(bit_probs,
+                                                    bit_base + size - 1)
+    return magnitude
+
+
+class A_Encoder:
+    def __init__(self, data):
+        """Create an adaptive binary arithmetic encoder.
+
+        Args:
+            data : (N, 8, 8) quantized coefficient blocks, the same input as
+                   `H_Encoder`.
+        """
+        self.data = np.asarray(data)
+
+    def encode(self):
+        """Encode every block.
+
+        Returns:
+            bytes : A 4-byte block count followed by the arithmetic-coded
+                    data.
+        """
+        zig_zag = to_zig_zag(self.data)
+        model = _BlockModel()
+        coder = _RangeEncoder()
+        prev_diff = 0
+        prev_dc = 0
+        for row in zig_zag.tolist():
+            # DC
+            dc = row[0]
+            diff = dc - prev_dc
+            prev_dc = dc
+            ctx = _dc_context(prev_diff)
+            prev_diff = diff
+            coder.encode(model.dc_zero, ctx, diff != 0)
+            if diff:
+                coder.encode(model.dc_sign, ctx, diff < 0)
+                _encode_magnitude(coder, model.dc_size, ctx * MAX_SIZE,
+                                  model.dc_bits, 0, abs(diff))
+            # AC
+            last = 63
+            while last > 0 and row[last] == 0:
+                last -= 1
+            k = 1
+            while k < 64:
+                eob = k > last
+                coder.encode(model.ac_eob, k, eob)
+                if eob:
+                    break
+                while row[k] == 0:
+                    coder.encode(model.ac_zero, k, 0)
+                    k += 1
+                coder.encode(model.ac_zero, k, 1)
+                value = row[k]
+                coder.encode_direct(value < 0, 1)
+                band = MAX_SIZE if k > AC_LOW_BAND else 0
+                _encode_magnitude(coder, model.ac_size, band,
+                                  model.ac_bits, band, abs(value))
+                k += 1
+        return HEADER.pack(len(zig_zag)) + coder.finish()
+
+
+class A_Decoder:
+    def __init__(self, data):
+        """Create a decoder for the output of `A_Encoder.encode`."""
+        self.data = data
+
+    def decode(self):
+        """Decode the blocks.
+
+        Returns:
+            (N, 8, 8) array of quantized coefficients.
+        """
+        (count, ) = HEADER.unpack_from(self.data)
+        model = _BlockModel()
+        coder = _RangeDecoder(self.data, HEADER.size)
+        zig_zag = np.zeros((count, 64), dtype=np.int32)
+        prev_diff = 0
+        prev_dc = 0
+        for row in zig_zag:
+            ctx = _dc_context(prev_diff)
+            diff = 0
+            if coder.decode(model.dc_zero, ctx):
+                negative = coder.decode(model.dc_sign, ctx)
+                diff = _decode_magnitude(coder, model.dc_size, ctx * MAX_SIZE,
+                                         model.dc_bits, 0)
+                if negative:
+                    diff = -diff
+            prev_diff = diff
+            prev_dc += diff
+            row[0] = prev_dc
+            k = 1
+            while k < 64:
+                if coder.decode(model.ac_eob, k):
+                    break
+                while not coder.decode(model.ac_zero, k):
+                    k += 1
+                negative = coder.decode_direct(1)
+                band = MAX_SIZE if k > AC_LOW_BAND else 0
+                value = _decode_magnitude(coder, model.ac_size, band,
+                                          model.ac_bits, band)
+                row[k] = -value if negative else value
+                k += 1
+        return zig_zag[:, ZIG_ZAG_INDEX]
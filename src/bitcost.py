@@ -0,0 +1,238 @@
+import numpy as np
+
+from huffman_table import (AC, DC, EOB, HUFFMAN_CATEGORY_CODEWORD, ZRL,
+                           ac_symbols, bit_length, to_zig_zag)
+
+MAX_DC_SIZE = 16
+MAX_AC_SIZE = 16
+# Marks a (run, size) pair that has no codeword in the table.
+NO_CODE = -1
+
+
+def code_length_tables(layer_type, codewords=None):
+    """Codeword lengths of a Huffman table as arrays.
+
+    Args:
+        layer_type : {LUMINANCE or CHROMINANCE}, selects the baseline table.
+        codewords  : Optional {DC: {size: code}, AC: {(run, size): code}}
+                     table overriding the baseline one.
+
+    Returns:
+        (dc_lengths, ac_lengths) : int arrays of shape (16, ) indexed by
+        size and (16, 16) indexed by (run, size). Missing codewords are
+        `NO_CODE`; ac_lengths[0, 0] is EOB and ac_lengths[15, 0] is ZRL.
+    """
+    if codewords is None:
+        codewords = {DC: HUFFMAN_CATEGORY_CODEWORD[DC][layer_type],
+                     AC: HUFFMAN_CATEGORY_CODEWORD[AC][layer_type]}
+    dc_lengths = np.full(MAX_DC_SIZE, NO_CODE, dtype=np.int64)
+    for size, code in codewords[DC].items():
+        dc_lengths[size] = len(code)
+    ac_lengths = np.full((16, MAX_AC_SIZE), NO_CODE, dtype=np.int64)
+    for (run, size), code in codewords[AC].items():
+        ac_lengths[run, size] = len(code)
+    return dc_lengths, ac_lengths
+
+
+def symbol_histograms(blocks):
+    """Category and run/size histograms of a quantized block stack.
+
+    DC differences are taken along the stack as in `H_Encoder`. Every block
+    ends with an EOB, as `encode_run_length` always appends one.
+
+    Returns:
+        dict : {'dc': (16, ) counts of DC difference sizes,
+                'ac': (16, 16) counts of (run, size) AC symbols with
+                ac[0, 0] the EOB count and ac[15, 0] the ZRL count}
+    """
+    zig_zag = to_zig_zag(blocks)
+    dc_sizes = bit_length(np.diff(zig_zag[:, 0], prepend=0))
+    dc_hist = np.bincount(dc_sizes, minlength=MAX_DC_SIZE)
+    if dc_hist.size > MAX_DC_SIZE:
+        raise ValueError(f'Differential DC of size {dc_hist.size - 1} '
+                         'cannot be coded.')
+
+    _, runs, values = ac_symbols(zig_zag)
+    sizes = bit_length(values)
+    if sizes.size and sizes.max() >= MAX_AC_SIZE:
+        raise ValueError(f'AC coefficient of size {sizes.max()} cannot be '
+                         'coded.')
+    ac_hist = np.bincount((runs % 16) * MAX_AC_SIZE + sizes,
+                          minlength=16 * MAX_AC_SIZE).reshape(16, MAX_AC_SIZE)
+    ac_hist[ZRL] += int((runs // 16).sum())
+    ac_hist[EOB] += len(zig_zag)
+    return {DC: dc_hist, AC: ac_hist}
+
+
+def histogram_bits(histograms, code_lengths):
+    """Entropy-coded bit length implied by symbol histograms.
+
+    Codeword bits come from `code_lengths` and every symbol of size s adds s
+    amplitude bits. No codeword is generated.
+
+    Args:
+        histograms   : Output of `symbol_histograms`.
+        code_lengths : (dc_lengths, ac_lengths) of `code_length_tables`.
+
+    Raises:
+        ValueError : When a used symbol has no codeword.
+
+    Returns:
+        dict : {DC: bits, AC: bits}
+    """
+    dc_lengths, ac_lengths = code_lengths
+    dc_hist, ac_hist = histograms[DC], histograms[AC]
+    for name, hist, lengths in ((DC, dc_hist, dc_lengths),
+                                (AC, ac_hist, ac_lengths)):
+        missing = np.argwhere((hist > 0) & (lengths == NO_CODE))
+        if missing.size:
+            raise ValueError(f'No {name} codeword for symbol '
+                             f'{tuple(missing[0].tolist())}.')
+    sizes = np.arange(MAX_AC_SIZE)
+    dc_bits = int((dc_hist * (np.maximum(dc_lengths, 0) + sizes)).sum())
+    ac_bits = int((ac_hist * (np.maximum(ac_lengths, 0)
+                              + sizes[None, :])).sum())
+    return {DC: dc_bits, AC: ac_bits}
+
+
+def estimate_bits(blocks, layer_type, code_lengths=None):
+    """Total entropy-coded bits `H_Encoder(blocks, layer_type)` produces.
+
+    Args:
+        blocks       : (N, 8, 8) quantized coefficients.
+        layer_type   : {LUMINANCE or CHROMINANCE}
+        code_lengths : Optional tables of `code_length_tables`, defaults to
+                       the baseline table of `layer_type`.
+    """
+    if code_lengths is None:
+        code_lengths = code_length_tables(layer_type)
+    bits = histogram_bits(symbol_histograms(blocks), code_lengths)
+    return bits[DC] + bits[AC]
+
+
+def block_bits(blocks, layer_type, code_lengths=None):
+    """Entropy-coded bits of every block, without generating codes.
+
+    Args:
+        blocks       : (N, 8, 8) quantized coefficients.
+        layer_type   : {LUMINANCE or CHROMINANCE}
+        code_lengths : Optional tables of `code_length_tables`.
+
+    Returns:
+        (N, ) int64 array; entry i is the DC and AC bits block i adds to the
+        `H_Encoder` output (codewords, amplitude bits, ZRL and EOB).
+    """
+    if code_lengths is None:
+        code_lengths = code_length_tables(layer_type)
+    dc_lengths, ac_lengths = code_lengths
+    zig_zag = to_zig_zag(blocks)
+    count = len(zig_zag)
+
+    dc_sizes = bit_length(np.diff(zig_zag[:, 0], prepend=0))
+    if dc_sizes.size and dc_sizes.max() >= MAX_DC_SIZE:
+        raise ValueError(f'Differential DC of size {dc_sizes.max()} cannot '
+                         'be coded.')
+    bits = dc_lengths[dc_sizes] + dc_sizes
+
+    rows, runs, values = ac_symbols(zig_zag)
+    sizes = bit_length(values)
+    if sizes.size and sizes.max() >= MAX_AC_SIZE:
+        raise ValueError(f'AC coefficient of size {sizes.max()} cannot be '
+                         'coded.')
+    symbol_bits = (ac_lengths[runs % 16, sizes] + sizes
+                   + (runs // 16) * ac_lengths[ZRL])
+    bits = bits + np.bincount(rows, weights=symbol_bits,
+                              minlength=count).astype(np.int64)
+    bits += ac_lengths[EOB]
+    if (dc_lengths[dc_sizes] == NO_CODE).any() or (
+            ac_lengths[runs % 16, sizes] == NO_CODE).any():
+        raise ValueError('A symbol of the blocks has no codeword.')
+    return bits
+
+
+def dht_bytes(code_lengths):
+    """Size of the DHT segments carrying a (dc_lengths, ac_lengths) pair."""
+    return sum(2 + 2 + 1 + 16 + int((lengths != NO_CODE).sum())
+               for lengths in code_lengths)
+
+
+class SizeEstimate:
+    def __init__(self, components, code_lengths=None):
+        """Exact entropy-coded sizes of several components.
+
+        Args:
+            components   : A dictionary of name: (blocks, layer_type), e.g.
+                           {'Y': (y, LUMINANCE), 'Cb': (cb, CHROMINANCE)}.
+            code_lengths : Optional dictionary of layer_type: tables of
+                           `code_length_tables`; baseline tables otherwise.
+        """
+        code_lengths = dict(code_lengths or {})
+        self.layers = {}
+        self.block_bits = {}
+        self._cumulative = {}
+        for name, (blocks, layer_type) in components.items():
+            if layer_type not in code_lengths:
+                code_lengths[layer_type] = code_length_tables(layer_type)
+            bits = block_bits(blocks, layer_type, code_lengths[layer_type])
+            self.layers[name] = layer_type
+            self.block_bits[name] = bits
+            self._cumulative[name] = np.concatenate(([0], np.cumsum(bits)))
+        self.code_lengths = code_lengths
+
+    def bits(self, component, start=0, stop=None):
+        """Entropy-coded bits of blocks [start, stop) of `component`.
+
+        DC prediction is taken from the full stream, so the bits of a
+        range are what those blocks cost inside the whole image.
+        """
+        cumulative = self._cumulative[component]
+        stop = len(cumulative) - 1 if stop is None else stop
+        return int(cumulative[stop] - cumulative[start])
+
+    def scan_bytes(self, component):
+        """Bytes of the component's entropy-coded segment.
+
+        Includes the final byte padding and the expected number of 0xFF
+        stuffing bytes (one per 255 coded bytes on average). Stuffing
+        depends on the actual bit pattern, so it is the only estimated
+        term.
+        """
+        data_bytes = (self.bits(component) + 7) // 8
+        return data_bytes + self.stuffing_bytes(component)
+
+    def stuffing_bytes(self, component):
+        """Expected 0x00 stuffing bytes after 0xFF in the segment."""
+        return int(round(((self.bits(component) + 7) // 8) / 255))
+
+    def header_bytes(self):
+        """Marker overhead of a baseline JFIF with one scan per component.
+
+        SOI, APP0, one DQT per quantization table (one per layer type),
+        SOF0, DHT for every table in use, SOS per component and EOI.
+        """
+        layers = set(self.layers.values())
+        components = len(self.layers)
+        soi_eoi = 2 + 2
+        app0 = 2 + 16
+        dqt = len(layers) * (2 + 2 + 1 + 64)
+        sof = 2 + 2 + 6 + 3 * components
+        dht = sum(dht_bytes(self.code_lengths[layer]) for layer in layers)
+        sos = components * (2 + 2 + 1 + 2 + 3)
+        return soi_eoi + app0 + dqt + sof + dht + sos
+
+    def total_bytes(self, include_headers=True):
+        """File size: every segment plus (optionally) the marker overhead."""
+        total = sum(self.scan_bytes(name) for name in self.layers)
+        if include_headers:
+            total += self.header_bytes()
+        return total
+
+    def summary(self):
+        """Per-component bits and bytes plus the file total."""
+        report = {name: {'blocks': len(self.block_bits[name]),
+                         'bits': self.bits(name),
+                         'bytes': self.scan_bytes(name)}
+                  for name in self.layers}
+        report['headers'] = self.header_bytes()
+        report['total'] = self.total_bytes()
+        return report
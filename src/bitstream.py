@@ -0,0 +1,82 @@
+import struct
+
+import numpy as np
+
+from huffman_table import ZIG_ZAG_INDEX
+
+
+class BitWriter:
+    def __init__(self, stuffing=True):
+        """Pack a sequence of bit fields MSB first into bytes.
+
+        Args:
+            stuffing : Insert a 0x00 after every 0xFF byte, as required
+                       inside JPEG entropy-coded segments.
+        """
+        self.stuffing = stuffing
+        self._bytes = bytearray()
+        self._acc = 0
+        self._acc_len = 0
+        self.bit_length = 0
+
+    def write(self, value, length):
+        """Append the low `length` bits of `value`."""
+        if length <= 0:
+            return
+        self._acc = (self._acc << length) | (value & ((1 << length) - 1))
+        self._acc_len += length
+        self.bit_length += length
+        while self._acc_len >= 8:
+            self._acc_len -= 8
+            byte = (self._acc >> self._acc_len) & 0xFF
+            self._bytes.append(byte)
+            if byte == 0xFF and self.stuffing:
+                self._bytes.append(0x00)
+        self._acc &= (1 << self._acc_len) - 1
+
+    def write_code(self, code):
+        """Append a codeword given as a bit string such as '1010'."""
+        self.write(int(code, 2), len(code))
+
+    def flush(self, pad_bit=1):
+        """Pad the last partial byte with `pad_bit` and return all bytes."""
+        if self._acc_len:
+            padding = 8 - self._acc_len
+            self.write((1 << padding) - 1 if pad_bit else 0, padding)
+        return bytes(self._bytes)
+
+    def getvalue(self):
+        """Return the complete bytes written so far (without the partial
+        last byte)."""
+        return bytes(self._bytes)
+
+
+def pack_bits(bit_seq, stuffing=False, pad_bit=1):
+    """Pack a bit string such as `H_Encoder.encode` output into bytes."""
+    writer = BitWriter(stuffing=stuffing)
+    for start in range(0, len(bit_seq), 32):
+        chunk = bit_seq[start:start + 32]
+        writer.write(int(chunk, 2), len(chunk))
+    return writer.flush(pad_bit)
+
+
+def segment(marker, payload):
+    """JPEG marker segment: marker, big-endian length and payload."""
+    return struct.pack('>HH', marker, len(payload) + 2) + payload
+
+
+def dqt_segment(table_id, quant_table):
+    """DQT segment of an 8-bit table, stored in zig-zag order."""
+    zig_zag = np.empty(64, dtype=np.uint8)
+    zig_zag[ZIG_ZAG_INDEX.ravel()] = np.asarray(quant_table).ravel()
+    return segment(0xFFDB, bytes([table_id]) + zig_zag.tobytes())
+
+
+def dht_segment(table_class, table_id, codewords, index):
+    """DHT segment of a canonical codeword bidict (T.81 B.2.4.2)."""
+    items = sorted(codewords.items(), key=lambda item: (len(item[1]), item[1]))
+    counts = [0] * 16
+    for _, code in items:
+        counts[len(code) - 1] += 1
+    return segment(0xFFC4, bytes([table_class << 4 | table_id] + counts
+                                 + [index(symbol) for symbol, _ in items]))
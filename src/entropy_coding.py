@@ -0,0 +1,104 @@
+import struct
+import time
+
+import numpy as np
+
+from arithmetic_coding import A_Decoder, A_Encoder
+from bitstream import pack_bits
+from huffman_table import AC, DC, H_Decoder, H_Encoder
+
+HUFFMAN = 'huffman'
+ARITHMETIC = 'arithmetic'
+
+# Bit lengths of the packed DC and AC Huffman sequences.
+_HUFFMAN_HEADER = struct.Struct('>II')
+
+
+def _unpack_bits(data, length):
+    return format(int.from_bytes(data, 'big'), f'0{len(data) * 8}b')[:length]
+
+
+def _huffman_encode(blocks, layer_type):
+    encoded = H_Encoder(blocks, layer_type).encode()
+    dc, ac = encoded[DC], encoded[AC]
+    return (_HUFFMAN_HEADER.pack(len(dc), len(ac))
+            + pack_bits(dc) + pack_bits(ac))
+
+
+def _huffman_decode(payload, layer_type):
+    dc_length, ac_length = _HUFFMAN_HEADER.unpack_from(payload)
+    offset = _HUFFMAN_HEADER.size
+    dc_bytes = (dc_length + 7) // 8
+    dc = _unpack_bits(payload[offset:offset + dc_bytes], dc_length)
+    ac = _unpack_bits(payload[offset + dc_bytes:], ac_length)
+    return H_Decoder({DC: dc, AC: ac}, layer_type).decode()
+
+
+def _arithmetic_encode(blocks, layer_type):
+    return A_Encoder(blocks).encode()
+
+
+def _arithmetic_decode(payload, layer_type):
+    return A_Decoder(payload).decode()
+
+
+# name: (encode(blocks, layer_type) -> bytes, decode(bytes, layer_type))
+ENTROPY_CODERS = {
+    HUFFMAN: (_huffman_encode, _huffman_decode),
+    ARITHMETIC: (_arithmetic_encode, _arithmetic_decode),
+}
+
+
+def encode_blocks(blocks, layer_type, coder=HUFFMAN):
+    """Entropy code a quantized coefficient stack with the selected backend.
+
+    Args:
+        blocks     : (N, 8, 8) quantized coefficients.
+        layer_type : {LUMINANCE or CHROMINANCE}
+        coder      : A key of `ENTROPY_CODERS`.
+
+    Returns:
+        bytes : The coded payload, decodable by `decode_blocks`.
+    """
+    if coder not in ENTROPY_CODERS:
+        raise ValueError(f'Unknown entropy coder {coder!r}, expected one of '
+                         f'{sorted(ENTROPY_CODERS)}.')
+    return ENTROPY_CODERS[coder][0](blocks, layer_type)
+
+
+def decode_blocks(payload, layer_type, coder=HUFFMAN):
+    """Decode a payload of `encode_blocks` back to (N, 8, 8) coefficients."""
+    if coder not in ENTROPY_CODERS:
+        raise ValueError(f'Unknown entropy coder {coder!r}, expected one of '
+                         f'{sorted(ENTROPY_CODERS)}.')
+    return ENTROPY_CODERS[coder][1](payload, layer_type)
+
+
+def compare_coders(components, coders=tuple(ENTROPY_CODERS)):
+    """Measure size and speed of every backend on the same blocks.
+
+    Args:
+        components : A list of ((N, 8, 8) blocks, layer_type) pairs, e.g. the
+                     Y, Cb and Cr stacks of one image.
+        coders     : Backend names to measure.
+
+    Returns:
+        dict : {coder: {'bytes', 'encode_s', 'decode_s', 'lossless'}}
+    """
+    results = {}
+    for coder in coders:
+        size = 0
+        encode_s = decode_s = 0.0
+        lossless = True
+        for blocks, layer_type in components:
+            start = time.perf_counter()
+            payload = encode_blocks(blocks, layer_type, coder)
+            encode_s += time.perf_counter() - start
+            start = time.perf_counter()
+            decoded = decode_blocks(payload, layer_type, coder)
+            decode_s += time.perf_counter() - start
+            size += len(payload)
+            lossless &= bool(np.array_equal(decoded, blocks))
+        results[coder] = {'bytes': size, 'encode_s': encode_s,
+                          'decode_s': decode_s, 'lossless': lossless}
+    return results
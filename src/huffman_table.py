@@ -1,4 +1,6 @@
-import collections
+import collections.abc
+import functools
+import heapq
 import itertools
 
 from bidict import bidict
@@ -13,8 +15,23 @@ AC = 'AC'
 LUMINANCE = frozenset({Y})
 CHROMINANCE = frozenset({CB, CR})
 
+# Image components in stream order, and the (qt_choice, layer_type) each one
+# is quantized and entropy coded with.
+COMPONENTS = ('Y', 'Cb', 'Cr')
+COMPONENT_TABLES = {'Y': (1, LUMINANCE), 'Cb': (2, CHROMINANCE),
+                    'Cr': (2, CHROMINANCE)}
+
+
+# Columnar run-length AC symbols: one record per Huffman symbol (ZRL and EOB
+# included, both with value 0). Columns are views, e.g. symbols['run'].
+RUN_LENGTH_DTYPE = np.dtype([('run', np.uint8), ('size', np.uint8),
+                             ('value', np.int16)])
+
 
 class H_Encoder:
+    __slots__ = ('data', 'layer_type', '_diff_dc', '_run_length_ac',
+                 '_ac_offsets')
+
     def __init__(self, data, layer_type):
         """Create a encoder based on baseline JPEG Huffman table.
 
@@ -28,11 +45,13 @@ class H_Encoder:
         self.data       = data
         self.layer_type = layer_type
 
-        # List containing differential DCs for multiple blocks.
+        # int16 array containing differential DCs for multiple blocks.
         self._diff_dc       = None
 
-        # List containing run-length-encoding AC pairs for multiple blocks.
+        # RUN_LENGTH_DTYPE array of run-length-encoded AC symbols for
+        # multiple blocks, and the (N + 1, ) symbol offset of every block.
         self._run_length_ac = None
+        self._ac_offsets    = None
 
     @property
     def diff_dc(self):
@@ -42,7 +61,7 @@ class H_Encoder:
 
     @diff_dc.setter
     def diff_dc(self, value):
-        self._diff_dc = value
+        self._diff_dc = _check_dc(np.asarray(value, dtype=np.int64))
 
     @property
     def run_length_ac(self):
@@ -52,7 +71,25 @@ class H_Encoder:
 
     @run_length_ac.setter
     def run_length_ac(self, value):
+        """Accept a RUN_LENGTH_DTYPE array or (run, nonzero) pairs."""
+        if not (isinstance(value, np.ndarray)
+                and value.dtype == RUN_LENGTH_DTYPE):
+            pairs = np.array([tuple(pair) for pair in value],
+                             dtype=np.int64).reshape(-1, 2)
+            value = np.empty(len(pairs), dtype=RUN_LENGTH_DTYPE)
+            value['run'] = pairs[:, 0]
+            value['size'] = bit_length(_check_ac(pairs[:, 1]))
+            value['value'] = pairs[:, 1]
+        eob = np.flatnonzero((value['run'] == 0) & (value['size'] == 0))
         self._run_length_ac = value
+        self._ac_offsets = np.concatenate(([0], eob + 1))
+
+    @property
+    def ac_offsets(self):
+        """(N + 1, ) offsets of every block's symbols in `run_length_ac`."""
+        if self._ac_offsets is None:
+            self._get_run_length_ac()
+        return self._ac_offsets
 
     def encode(self):
         """Encode differential DC and run-length-encoded AC with baseline JPEG
@@ -63,27 +100,62 @@ class H_Encoder:
                    ret = {DC: '01...', AC: '01...'}
 
         """
+        dc_codes = HUFFMAN_CATEGORY_CODEWORD[DC][self.layer_type]
+        ac_codes = HUFFMAN_CATEGORY_CODEWORD[AC][self.layer_type]
+        diff_dc = self.diff_dc
+        symbols = self.run_length_ac
+
         ret = {}
-        ret[DC] = ''.join(encode_huffman(v, self.layer_type)
-                          for v in self.diff_dc)
-        ret[AC] = ''.join(encode_huffman(v, self.layer_type)
-                          for v in self.run_length_ac)
+        ret[DC] = ''.join(
+            _append_amplitude(dc_codes[size], value, size)
+            for value, size in zip(diff_dc.tolist(),
+                                   bit_length(diff_dc).tolist())
+        )
+        ret[AC] = ''.join(
+            _append_amplitude(ac_codes[(run, size)], value, size)
+            for run, size, value in zip(symbols['run'].tolist(),
+                                        symbols['size'].tolist(),
+                                        symbols['value'].tolist())
+        )
         return ret
 
     def _get_diff_dc(self):
         """Calculate the differential DC of given data."""
-        self._diff_dc = tuple(encode_differential(self.data[:, 0, 0]))
+        dc = np.asarray(self.data)[:, 0, 0].astype(np.int64)
+        self._diff_dc = _check_dc(np.diff(dc, prepend=0))
 
     def _get_run_length_ac(self):
-        """Calculate the run-length-encoded AC of given data."""
-        self._run_length_ac = []
-        for block in self.data:
-            self._run_length_ac.extend(
-                encode_run_length(tuple(iter_zig_zag(block))[1:])
-            )
+        """Calculate the run-length-encoded AC of given data.
+
+        Vectorized `encode_run_length` over every block: a nonzero
+        coefficient after `run` zeros emits run // 16 ZRL symbols and then
+        (run % 16, size, value); every block ends with EOB.
+        """
+        zig_zag = to_zig_zag(self.data, dtype=np.int64)
+        count = len(zig_zag)
+        rows, runs, values = ac_symbols(zig_zag)
+        values = _check_ac(values)
+        # Each nonzero coefficient takes its ZRLs plus one symbol.
+        widths = runs // 16 + 1
+        per_block = np.bincount(rows, weights=widths,
+                                minlength=count).astype(np.int64) + 1
+        offsets = np.concatenate(([0], np.cumsum(per_block)))
+
+        symbols = np.zeros(offsets[-1], dtype=RUN_LENGTH_DTYPE)
+        symbols['run'] = ZRL[0]
+        positions = np.cumsum(widths) - 1 + rows
+        symbols['run'][positions] = runs % 16
+        symbols['size'][positions] = bit_length(values)
+        symbols['value'][positions] = values
+        symbols['run'][offsets[1:] - 1] = EOB[0]
+
+        self._run_length_ac = symbols
+        self._ac_offsets = offsets
 
 
 class H_Decoder:
+    __slots__ = ('data', 'layer_type', '_dc', '_ac')
+
     def __init__(self, data, layer_type):
         """Create a decoder based on baseline JPEG Huffman table.
 
@@ -97,29 +169,72 @@ class H_Decoder:
         self.data       = data
         self.layer_type = layer_type
 
-        # A list containing all DC of blocks.
+        # int16 array containing all DC of blocks.
         self._dc = None
 
-        # A nested 2D list containing all AC of blocks without zig-zag
-        # iteration.
+        # (N, 63) int16 array containing all AC of blocks in zig-zag order.
         self._ac = None
 
-    def decode(self):
-        if (self.layer_type == CHROMINANCE
-                and (len(self.dc) % 2 or len(self.ac) % 2)):
-            raise ValueError(f'The length of DC chrominance {len(self.dc)} '
-                             f'or AC chrominance {len(self.ac)} cannot be '
-                             'divided by 2 evenly to seperate into Cb and Cr.')
+    def decode(self, out=None, split=False):
+        """Decode every block into quantized coefficients in natural order.
 
-        shaped = {}
-        if len(self.dc) != len(self.ac):
-            raise ValueError(f'DC size {len(self.dc)} is not equal to AC size '
-                             f'{len(self.ac)}.')
+        Coefficients are written straight into their (row, column) place
+        of the output; no zig-zag ordered copy is made.
 
-        shaped = np.array(tuple(inverse_iter_zig_zag((dc, ) + ac, size=8)
-                                for dc, ac in zip(self.dc, self.ac)))
+        Args:
+            out   : Optional C-contiguous int16 array to decode into, of
+                    shape (N, 8, 8), or (2, N / 2, 8, 8) with `split`.
+                    Allocated if None.
+            split : Demultiplex interleaved chrominance (Cb, Cr, Cb, Cr, ...)
+                    into separate Cb and Cr stacks in the same pass.
 
-        return shaped
+        Returns:
+            (N, 8, 8) int16 array, or a (cb, cr) pair of (N / 2, 8, 8)
+            arrays with `split`; views of `out` when it is given.
+        """
+        count = len(self.dc)
+        if split and count % 2:
+            raise ValueError(f'The length of DC chrominance {count} cannot '
+                             'be divided by 2 evenly to seperate into Cb and '
+                             'Cr.')
+        shape = (2, count // 2, 8, 8) if split else (count, 8, 8)
+        if out is None:
+            out = np.zeros(shape, dtype=np.int16)
+        elif (out.shape != shape or out.dtype != np.int16
+                or not out.flags.c_contiguous):
+            raise ValueError(f'out should be a C-contiguous int16 array of '
+                             f'shape {shape}, got {out.dtype} {out.shape}.')
+        else:
+            out.fill(0)
+
+        flat = out.reshape(count, 64)
+        # Block i of an interleaved stream goes to Cb (even) or Cr (odd).
+        rows = None
+        if split:
+            rows = np.arange(count)
+            rows = (rows % 2) * (count // 2) + rows // 2
+            flat[rows, 0] = self.dc
+        else:
+            flat[:, 0] = self.dc
+
+        if self._ac is not None:
+            if len(self._ac) != count:
+                raise ValueError(f'DC size {count} is not equal to AC size '
+                                 f'{len(self._ac)}.')
+            index = np.arange(count) if rows is None else rows
+            flat[index[:, None], NATURAL_ORDER[1:]] = self._ac
+        else:
+            # Blocks past the last DC have the out of range row `count`,
+            # so leftover AC data raises instead of being ignored.
+            decoded = decode_ac_prefix(
+                self.data[AC], self.layer_type, 64, flat,
+                None if rows is None
+                else itertools.chain(rows.tolist(), itertools.repeat(count)),
+                NATURAL_ORDER)
+            if decoded != count:
+                raise ValueError(f'DC size {count} is not equal to AC size '
+                                 f'{decoded}.')
+        return (out[0], out[1]) if split else out
 
     @property
     def dc(self):
@@ -133,26 +248,152 @@ class H_Decoder:
             self._get_ac()
         return self._ac
 
+    def decode_lowpass(self, size):
+        """Decode only the low-frequency corner of every block.
+
+        Used for reduced-resolution decoding: `size` 1 reads only the DC
+        sequence, 2 and 4 decode AC amplitudes only for coefficients inside
+        the `size` x `size` corner and skip the others.
+
+        Args:
+            size : Corner size, one of {1, 2, 4, 8}.
+
+        Returns:
+            (N, size, size) int32 array of quantized coefficients.
+        """
+        if size not in LOWPASS_LIMIT:
+            raise ValueError(f'Corner size {size} should be one of '
+                             f'{sorted(LOWPASS_LIMIT)}.')
+        count = len(self.dc)
+        zig_zag = np.zeros((count, 64), dtype=np.int32)
+        zig_zag[:, 0] = self.dc
+        if size > 1:
+            decoded = decode_ac_prefix(self.data[AC], self.layer_type,
+                                       LOWPASS_LIMIT[size], zig_zag)
+            if decoded != count:
+                raise ValueError(f'DC size {count} is not equal to AC size '
+                                 f'{decoded}.')
+        return zig_zag[:, ZIG_ZAG_INDEX[:size, :size]]
+
+    def decode_region(self, columns, box):
+        """Decode only the blocks inside a rectangle of the block grid.
+
+        DC values are decoded for every block up to the last one of the
+        rectangle to keep the predictor running; AC codewords of blocks
+        outside the rectangle are parsed for their lengths only, their
+        amplitude bits skipped. Neither sequence is read past the last block
+        of the rectangle.
+
+        Args:
+            columns : Width of the image in blocks.
+            box     : (left, top, right, bottom) block coordinates, right
+                      and bottom exclusive.
+
+        Returns:
+            (rows * cols, 8, 8) int32 array of quantized coefficients of the
+            rectangle in raster order.
+        """
+        left, top, right, bottom = box
+        if not (0 <= left < right <= columns and 0 <= top < bottom):
+            raise ValueError(f'Region {box} is outside the {columns} blocks '
+                             'wide image.')
+        width = right - left
+        first, last = top * columns + left, (bottom - 1) * columns + right
+        # Blocks up to the last one of the rectangle; later ones are never
+        # read.
+        grid = np.arange(last)
+        inside = ((grid >= first) & (grid % columns >= left)
+                  & (grid % columns < right))
+        targets = np.cumsum(inside) - 1
+
+        if self._dc is not None:
+            dc = self._dc[:last]
+        else:
+            dc = np.cumsum(decode_dc_prefix(self.data[DC], self.layer_type,
+                                            last))
+        zig_zag = np.zeros(((bottom - top) * width, 64), dtype=np.int32)
+        if len(dc) < last:
+            raise ValueError(f'Region {box} is outside the {columns} blocks '
+                             f'wide image of {len(dc)} blocks.')
+        zig_zag[:, 0] = dc[inside]
+        decoded = decode_ac_prefix(self.data[AC], self.layer_type,
+                                   np.where(inside, 64, 1).tolist(), zig_zag,
+                                   targets.tolist())
+        if decoded != last:
+            raise ValueError(f'Region {box} needs {last} AC blocks, the AC '
+                             f'sequence holds {decoded}.')
+        return zig_zag[:, ZIG_ZAG_INDEX]
+
     def _get_dc(self):
-        self._dc = tuple(decode_differential(decode_huffman(
-            self.data[DC],
-            DC,
-            self.layer_type
-        )))
+        diffs = np.fromiter(decode_huffman(self.data[DC], DC,
+                                           self.layer_type),
+                            dtype=np.int64)
+        self._dc = np.cumsum(diffs).astype(np.int16)
 
     def _get_ac(self):
-        def isplit(iterable, splitter):
-            ret = []
-            for item in iterable:
-                ret.append(item)
-                if item == splitter:
-                    yield ret
-                    ret = []
+        # One row per DC; an AC sequence holding more blocks raises
+        # ValueError in decode_ac_prefix.
+        zig_zag = np.zeros((len(self.dc), 64), dtype=np.int16)
+        count = decode_ac_prefix(self.data[AC], self.layer_type, 64, zig_zag)
+        self._ac = zig_zag[:count, 1:]
+
+
+def bit_length(values):
+    """Vectorized int.bit_length of |values|, the JPEG size category."""
+    return np.frexp(np.abs(np.asarray(values, dtype=np.float64)))[1]
+
+
+def to_zig_zag(blocks, dtype=None):
+    """Reorder (N, 8, 8) blocks into (N, 64) zig-zag rows."""
+    blocks = np.asarray(blocks, dtype=dtype).reshape(-1, 64)
+    ordered = np.empty_like(blocks)
+    ordered[:, ZIG_ZAG_INDEX.ravel()] = blocks
+    return ordered
+
+
+def ac_symbols(zig_zag):
+    """Locate every nonzero AC coefficient and the zero run before it.
+
+    Args:
+        zig_zag : (N, 64) quantized coefficients in zig-zag order.
+
+    Returns:
+        (rows, runs, values) : block index, zero run before the coefficient
+        (including runs of 16 or more, which need ZRL codes) and value of
+        every nonzero AC coefficient, in stream order.
+    """
+    ac = zig_zag[:, 1:]
+    rows, cols = np.nonzero(ac)
+    previous = np.empty_like(cols)
+    if cols.size:
+        previous[0] = -1
+        previous[1:] = np.where(rows[1:] == rows[:-1], cols[:-1], -1)
+    return rows, cols - previous - 1, ac[rows, cols]
+
+
+def _check_dc(diff_dc):
+    out_of_range = np.flatnonzero((diff_dc <= -2048) | (diff_dc >= 2048))
+    if out_of_range.size:
+        raise ValueError(f'Differential DC {diff_dc[out_of_range[0]]} should '
+                         'be within [-2047, 2047].')
+    return diff_dc.astype(np.int16)
 
-        self._ac = tuple(decode_run_length(pairs) for pairs in isplit(
-            decode_huffman(self.data[AC], AC, self.layer_type),
-            EOB
-        ))
+
+def _check_ac(values):
+    out_of_range = np.flatnonzero((values <= -1024) | (values >= 1024))
+    if out_of_range.size:
+        raise ValueError(f'AC coefficient nonzero {values[out_of_range[0]]} '
+                         'should be within [-1023, 0) or (0, 1023].')
+    return values.astype(np.int16)
+
+
+def _append_amplitude(code, value, size):
+    """Codeword followed by the `size` amplitude bits of value."""
+    if size == 0:
+        return code
+    if value < 0:
+        value += (1 << size) - 1
+    return code + '{:0{padding}b}'.format(value, padding=size)
 
 
 def encode_huffman(value, layer_type):
@@ -177,7 +418,7 @@ def encode_huffman(value, layer_type):
                     return (i, j)
         raise ValueError('Cannot find the target value in the table.')
 
-    if not isinstance(value, collections.Iterable):  # DC
+    if not isinstance(value, collections.abc.Iterable):  # DC
         if value <= -2048 or value >= 2048:
             raise ValueError(
                 f'Differential DC {value} should be within [-2047, 2047].'
@@ -281,6 +522,225 @@ def decode_huffman(bit_seq, dc_ac, layer_type):
             )
 
 
+@functools.lru_cache(maxsize=None)
+def _prefix_table(dc_ac, layer_type):
+    """Map every 16-bit window to the key and length of its codeword prefix.
+
+    Returns:
+        A pair of lists indexed by the integer value of the next 16 bits:
+        the Huffman key (None if no codeword matches) and the codeword length.
+    """
+    keys = [None] * (1 << 16)
+    lengths = [0] * (1 << 16)
+    for key, code in HUFFMAN_CATEGORY_CODEWORD[dc_ac][layer_type].items():
+        start = int(code, 2) << (16 - len(code))
+        for window in range(start, start + (1 << (16 - len(code)))):
+            keys[window] = key
+            lengths[window] = len(code)
+    return keys, lengths
+
+
+def decode_dc_prefix(bit_seq, layer_type, count):
+    """Decode the first `count` differential DCs of a DC bit sequence.
+
+    Same result as the first `count` items of `decode_huffman(bit_seq, DC,
+    layer_type)`, using the 16-bit window table; the rest of the sequence
+    is not read.
+
+    Raises:
+        KeyError   : When no codeword matches the next bits.
+        IndexError : When the bit sequence ends inside a codeword or value.
+
+    Returns:
+        (M, ) int64 array of differential DCs, M <= count; M < count only
+        when the sequence ends between two codewords.
+    """
+    keys, lengths = _prefix_table(DC, layer_type)
+    total = len(bit_seq)
+    diffs = np.zeros(count, dtype=np.int64)
+    idx = 0
+    block = 0
+    while block < count and idx < total:
+        window = bit_seq[idx:idx + 16]
+        window_value = int(window, 2) << (16 - len(window))
+        size = keys[window_value]
+        if size is None:
+            raise KeyError(
+                f'Cannot find any prefix of {window} in Huffman table.'
+            )
+        idx += lengths[window_value]
+        if idx > total:
+            raise IndexError('There is not enough bits to decode the '
+                             'codeword.')
+        if size:
+            if idx + size > total:
+                raise IndexError('There is not enough bits to decode DIFF '
+                                 'value codeword.')
+            value = int(bit_seq[idx:idx + size], 2)
+            if value < 1 << (size - 1):
+                value -= (1 << size) - 1
+            diffs[block] = value
+            idx += size
+        block += 1
+    return diffs[:block]
+
+
+def decode_ac_prefix(bit_seq, layer_type, limits, out, rows=None,
+                     order=None):
+    """Decode AC blocks, materializing only a zig-zag prefix of each block.
+
+    Codewords are always parsed, but the amplitude bits of a coefficient
+    whose zig-zag index is at or beyond the block's limit are skipped
+    without being converted to a value. Decoding stops when `limits` is
+    exhausted.
+
+    Args:
+        bit_seq    : The AC bit sequence produced by `H_Encoder.encode`.
+        layer_type : The layer type of bit sequence: {LUMINANCE or CHROMINANCE}
+        limits     : An int, or one int per block. Coefficients with zig-zag
+                     index in [1, limit) are decoded.
+        out        : (N, 64) array in zig-zag order receiving the decoded
+                     coefficients. Entries outside [1, limit) and entries
+                     of zero coefficients are left untouched.
+        rows       : One row of `out` per block (block i goes to row i if
+                     None). Blocks with a limit of 1 never touch `out`.
+        order      : Column of `out` receiving every zig-zag index, e.g.
+                     `NATURAL_ORDER` for natural-order rows (the zig-zag
+                     index itself if None).
+
+    Raises:
+        KeyError   : When no codeword matches the next bits.
+        IndexError : When the bit sequence ends inside a codeword or value.
+        ValueError : When a block has no row in `out`.
+
+    Returns:
+        The number of decoded blocks.
+    """
+    if isinstance(limits, int):
+        limits = itertools.repeat(limits)
+    if rows is None:
+        rows = itertools.count()
+    columns = range(64) if order is None else [int(column)
+                                                 for column in order]
+    keys, lengths = _prefix_table(AC, layer_type)
+    total = len(bit_seq)
+    idx = 0
+    block = 0
+    for limit, target in zip(limits, rows):
+        if idx >= total:
+            break
+        if limit > 1:
+            if target >= len(out):
+                raise ValueError(f'The AC sequence holds more than '
+                                 f'{len(out)} blocks.')
+            row = out[target]
+        position = 1
+        while True:
+            if idx >= total:
+                raise IndexError('There is not enough bits to decode the '
+                                 'codeword.')
+            window = bit_seq[idx:idx + 16]
+            window_value = int(window, 2) << (16 - len(window))
+            key = keys[window_value]
+            if key is None:
+                raise KeyError(
+                    f'Cannot find any prefix of {window} in Huffman table.'
+                )
+            idx += lengths[window_value]
+            if idx > total:
+                raise IndexError('There is not enough bits to decode the '
+                                 'codeword.')
+            if key == EOB:
+                break
+            run, size = key
+            position += run
+            if size:
+                if idx + size > total:
+                    raise IndexError('There is not enough bits to decode '
+                                     'DIFF value codeword.')
+                if position < limit:
+                    value = int(bit_seq[idx:idx + size], 2)
+                    if value < 1 << (size - 1):
+                        value -= (1 << size) - 1
+                    row[columns[position]] = value
+                idx += size
+            position += 1
+        block += 1
+    return block
+
+
+def optimal_code_lengths(frequencies, max_length=16):
+    """Compute JPEG-style optimal Huffman code lengths (ITU T.81 Annex K.2).
+
+    A reserved symbol of frequency 1 keeps any real codeword from being all
+    ones, and code lengths are limited to `max_length` bits with the
+    Annex K.3 adjustment.
+
+    Args:
+        frequencies : A dictionary of symbol: count. Symbols must be sortable.
+        max_length  : The longest allowed codeword.
+
+    Returns:
+        A list of (symbol, length) pairs in canonical (HUFFVAL) order.
+    """
+    symbols = sorted(s for s, f in frequencies.items() if f > 0)
+    if not symbols:
+        return []
+    reserved = len(symbols)     # Index of the reserved symbol.
+    code_size = [0] * (len(symbols) + 1)
+    heap = [(frequencies[s], idx, [idx]) for idx, s in enumerate(symbols)]
+    heap.append((1, reserved, [reserved]))
+    heapq.heapify(heap)
+    while len(heap) > 1:
+        freq1, tie1, members1 = heapq.heappop(heap)
+        freq2, tie2, members2 = heapq.heappop(heap)
+        for member in members1 + members2:
+            code_size[member] += 1
+        heapq.heappush(heap, (freq1 + freq2, min(tie1, tie2),
+                              members1 + members2))
+
+    longest = max(code_size)
+    bits = [0] * (max(longest, max_length) + 1)
+    for size in code_size:
+        bits[size] += 1
+    for i in range(longest, max_length, -1):
+        while bits[i] > 0:
+            j = i - 2
+            while bits[j] == 0:
+                j -= 1
+            bits[i] -= 2
+            bits[i - 1] += 1
+            bits[j + 1] += 2
+            bits[j] -= 1
+    # Drop the reserved symbol, which always holds one of the longest codes.
+    i = max_length
+    while bits[i] == 0:
+        i -= 1
+    bits[i] -= 1
+
+    order = sorted(range(len(symbols)), key=lambda idx: (code_size[idx], idx))
+    lengths = [length for length in range(1, max_length + 1)
+               for _ in range(bits[length])]
+    return [(symbols[idx], length) for idx, length in zip(order, lengths)]
+
+
+def canonical_codewords(code_lengths):
+    """Assign canonical codewords (ITU T.81 Annex C) to (symbol, length) pairs.
+
+    Returns:
+        A dictionary of symbol: codeword bit string.
+    """
+    codes = {}
+    code = 0
+    previous_length = 0
+    for symbol, length in sorted(code_lengths, key=lambda item: item[1]):
+        code <<= length - previous_length
+        codes[symbol] = '{:0{padding}b}'.format(code, padding=length)
+        code += 1
+        previous_length = length
+    return codes
+
+
 def encode_differential(seq):
     return (
         (item - seq[idx - 1]) if idx else item
@@ -360,6 +820,16 @@ def move_zig_zag_idx(i, j, size):
     return (i + 1, j)
 
 
+# Zig-zag index of every (row, column) position of an 8x8 block.
+ZIG_ZAG_INDEX = inverse_iter_zig_zag(range(64), size=8)
+# NATURAL_ORDER[k] is the flat (row * 8 + column) index of zig-zag index k.
+NATURAL_ORDER = np.argsort(ZIG_ZAG_INDEX.ravel())
+
+# Number of leading zig-zag coefficients that cover the top-left
+# `size` x `size` corner of a block.
+LOWPASS_LIMIT = {size: int(ZIG_ZAG_INDEX[:size, :size].max()) + 1
+                 for size in (1, 2, 4, 8)}
+
 HUFFMAN_CATEGORIES = (
     (0, ),
     (-1, 1),
@@ -673,7 +1143,7 @@ HUFFMAN_CATEGORY_CODEWORD = {
             (6, 10): '1111111110101110',
 
             (7, 1):  '1111010',
-            (7, 2):  '111111110000',
+            (7, 2):  '11111111000',
             (7, 3):  '1111111110101111',
             (7, 4):  '1111111110110000',
             (7, 5):  '1111111110110001',
@@ -783,17 +1253,18 @@ def convert_keys_to_str(d):
         return {str(k): convert_keys_to_str(v) for k, v in d.items()}
     return d
 
-huffman_tables = {
-    DC: {
-        "LUMINANCE": convert_keys_to_str(dict(HUFFMAN_CATEGORY_CODEWORD[DC][LUMINANCE])),
-        "CHROMINANCE": convert_keys_to_str(dict(HUFFMAN_CATEGORY_CODEWORD[DC][CHROMINANCE])),
-    },
-    AC: {
-        "LUMINANCE": convert_keys_to_str(dict(HUFFMAN_CATEGORY_CODEWORD[AC][LUMINANCE])),
-        "CHROMINANCE": convert_keys_to_str(dict(HUFFMAN_CATEGORY_CODEWORD[AC][CHROMINANCE])),
-    },
-}
+if __name__ == '__main__':
+    huffman_tables = {
+        DC: {
+            "LUMINANCE": convert_keys_to_str(dict(HUFFMAN_CATEGORY_CODEWORD[DC][LUMINANCE])),
+            "CHROMINANCE": convert_keys_to_str(dict(HUFFMAN_CATEGORY_CODEWORD[DC][CHROMINANCE])),
+        },
+        AC: {
+            "LUMINANCE": convert_keys_to_str(dict(HUFFMAN_CATEGORY_CODEWORD[AC][LUMINANCE])),
+            "CHROMINANCE": convert_keys_to_str(dict(HUFFMAN_CATEGORY_CODEWORD[AC][CHROMINANCE])),
+        },
+    }
 
-# 將數據存為 JSON 文件
-with open("huffman_tables.json", "w") as f:
-    json.dump(huffman_tables, f, indent=4)
+    # 將數據存為 JSON 文件
+    with open("huffman_tables.json", "w") as f:
+        json.dump(huffman_tables, f, indent=4)
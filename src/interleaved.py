@@ -0,0 +1,244 @@
+"""Single-pass interleaved (4:4:4) baseline entropy encoder.
+
+`H_Encoder` codes one component at a time. A baseline JPEG scan instead
+interleaves the components MCU by MCU; with 4:4:4 sampling an MCU is one Y,
+one Cb and one Cr block:
+
+    MCU 0: Y0 Cb0 Cr0 | MCU 1: Y1 Cb1 Cr1 | ...
+
+`MCUEncoder` walks the MCUs in order a chunk at a time. Each chunk is cut
+from the three stacks, turned into symbols with `H_Encoder`'s vectorized
+run-length pass, merged into MCU order and packed into the single stuffed
+stream, so only the current chunk is live in memory and its bytes can be
+sent before the next chunk is read. Every component keeps its own DC
+predictor across chunks and uses the LUMINANCE or CHROMINANCE tables.
+
+Unlike `H_Encoder.encode`, the scan follows ITU T.81 exactly: a block whose
+last zig-zag coefficient is nonzero has no EOB. `encode_jpeg` wraps the scan
+in the markers of a baseline JFIF file with the Annex K tables of
+`HUFFMAN_CATEGORY_CODEWORD`, which any JPEG decoder reads.
+"""
+import struct
+
+import numpy as np
+
+from bitstream import dht_segment, dqt_segment, segment
+from huffman_table import (AC, CB, CHROMINANCE, CR, DC, LUMINANCE, Y,
+                           HUFFMAN_CATEGORY_CODEWORD, H_Encoder, ZIG_ZAG_INDEX,
+                           bit_length)
+
+# (component, layer_type) in MCU order.
+COMPONENTS = ((Y, LUMINANCE), (CB, CHROMINANCE), (CR, CHROMINANCE))
+# Position of zig-zag coefficient 63 in a flattened block.
+_LAST = int(np.flatnonzero(ZIG_ZAG_INDEX.ravel() == 63)[0])
+
+
+def _code_table(codewords, index):
+    """(codes, lengths) arrays of a codeword bidict, indexed by `index`."""
+    codes = np.zeros(256, dtype=np.uint64)
+    lengths = np.zeros(256, dtype=np.uint8)
+    for symbol, code in codewords.items():
+        codes[index(symbol)] = int(code, 2)
+        lengths[index(symbol)] = len(code)
+    return codes, lengths
+
+
+# Codes of DC sizes and of AC (run << 4 | size) symbols per layer type.
+DC_CODES = {layer: _code_table(HUFFMAN_CATEGORY_CODEWORD[DC][layer], int)
+            for layer in (LUMINANCE, CHROMINANCE)}
+AC_CODES = {layer: _code_table(HUFFMAN_CATEGORY_CODEWORD[AC][layer],
+                               lambda symbol: symbol[0] << 4 | symbol[1])
+            for layer in (LUMINANCE, CHROMINANCE)}
+
+
+def _fields(codes, lengths, symbols, values, sizes):
+    """Codewords followed by their amplitude bits, as (bits, length) pairs.
+
+    Negative amplitudes are sent as value - 1 in `size` bits (T.81 F.1.2.1).
+    """
+    amplitudes = values.astype(np.int64)
+    amplitudes += (amplitudes < 0) * ((1 << sizes.astype(np.int64)) - 1)
+    bits = codes[symbols] << sizes.astype(np.uint64)
+    bits |= amplitudes.astype(np.uint64)
+    return bits, lengths[symbols].astype(np.int64) + sizes
+
+
+class MCUEncoder:
+    def __init__(self, blocks, chunk_mcus=1024):
+        """Create an interleaved encoder.
+
+        Args:
+            blocks     : A dictionary of component: (N, 8, 8) quantized
+                         coefficient stack for Y, CB and CR, all with the
+                         same number of blocks in raster order.
+            chunk_mcus : MCUs coded per step.
+        """
+        for component, _ in COMPONENTS:
+            if component not in blocks:
+                raise ValueError(f'No blocks for component {component}.')
+        self.blocks = {component: np.asarray(blocks[component])
+                       .reshape(-1, 8, 8) for component, _ in COMPONENTS}
+        counts = {len(stack) for stack in self.blocks.values()}
+        if len(counts) != 1:
+            raise ValueError('4:4:4 interleaving needs the same number of '
+                             f'blocks in every component, got {counts}.')
+        self.mcu_count = counts.pop()
+        self.chunk_mcus = chunk_mcus
+
+    def chunks(self):
+        """Encode the scan chunk by chunk.
+
+        Yields:
+            bytes : Consecutive pieces of the entropy-coded segment (with
+                    0xFF stuffing); their concatenation is the whole scan,
+                    padded with 1 bits.
+        """
+        predictors = {component: 0 for component, _ in COMPONENTS}
+        carry = np.zeros(0, dtype=np.uint8)
+        for start in range(0, self.mcu_count, self.chunk_mcus):
+            stop = min(start + self.chunk_mcus, self.mcu_count)
+            bits, lengths = self._chunk_fields(start, stop, predictors)
+            data, carry = _pack(bits, lengths, carry)
+            yield data
+        if carry.size:
+            padded = np.ones(8, dtype=np.uint8)
+            padded[:carry.size] = carry
+            yield _stuff(np.packbits(padded))
+
+    def encode(self):
+        """Encode the whole scan and return its bytes."""
+        return b''.join(self.chunks())
+
+    def _chunk_fields(self, start, stop, predictors):
+        """Bit fields of MCUs [start, stop) in stream order."""
+        count = stop - start
+        parts = []
+        for component, layer_type in COMPONENTS:
+            stack = self.blocks[component][start:stop]
+            encoder = H_Encoder(stack, layer_type)
+            dc = stack[:, 0, 0].astype(np.int64)
+            encoder.diff_dc = np.diff(dc, prepend=predictors[component])
+            predictors[component] = int(dc[-1])
+
+            diff_dc = encoder.diff_dc
+            dc_sizes = bit_length(diff_dc)
+            dc_bits, dc_lengths = _fields(*DC_CODES[layer_type], dc_sizes,
+                                          diff_dc, dc_sizes)
+            symbols = encoder.run_length_ac
+            offsets = encoder.ac_offsets
+            ac_bits, ac_lengths = _fields(
+                *AC_CODES[layer_type],
+                (symbols['run'].astype(np.int64) << 4) | symbols['size'],
+                symbols['value'], symbols['size'])
+            # No EOB after a nonzero last coefficient.
+            full = stack.reshape(count, 64)[:, _LAST] != 0
+            ac_lengths[offsets[1:][full] - 1] = 0
+
+            # Per block: the DC field followed by its AC fields.
+            per_block = np.diff(offsets) + 1
+            block_starts = np.concatenate(([0], np.cumsum(per_block)))
+            bits = np.empty(block_starts[-1], dtype=np.uint64)
+            lengths = np.empty(block_starts[-1], dtype=np.int64)
+            is_dc = np.zeros(block_starts[-1], dtype=bool)
+            is_dc[block_starts[:-1]] = True
+            bits[is_dc], lengths[is_dc] = dc_bits, dc_lengths
+            bits[~is_dc], lengths[~is_dc] = ac_bits, ac_lengths
+            parts.append((bits, lengths, per_block))
+
+        # Interleave: MCU i holds the fields of block i of every component.
+        per_block = np.stack([part[2] for part in parts], axis=1)
+        targets = np.concatenate(([0], np.cumsum(per_block.ravel())))
+        bits = np.empty(targets[-1], dtype=np.uint64)
+        lengths = np.empty(targets[-1], dtype=np.int64)
+        for index, (part_bits, part_lengths, sizes) in enumerate(parts):
+            local = np.concatenate(([0], np.cumsum(sizes)))[:-1]
+            first = targets[:-1].reshape(count, len(COMPONENTS))[:, index]
+            positions = np.repeat(first - local, sizes) \
+                + np.arange(len(part_bits))
+            bits[positions] = part_bits
+            lengths[positions] = part_lengths
+        return bits, lengths
+
+
+def _pack(bits, lengths, carry):
+    """Pack bit fields after the `carry` bits left over from the last call.
+
+    Returns:
+        (bytes, carry): the stuffed complete bytes and the remaining bits.
+    """
+    total = int(lengths.sum())
+    field = np.repeat(np.arange(len(lengths)), lengths)
+    # Bit k of a field of length n is bit n - 1 - k of its value, MSB first.
+    shifts = np.repeat(np.cumsum(lengths), lengths) - 1 - np.arange(total)
+    stream = np.empty(carry.size + total, dtype=np.uint8)
+    stream[:carry.size] = carry
+    stream[carry.size:] = (bits[field] >> shifts.astype(np.uint64)) & 1
+    whole = stream.size // 8 * 8
+    return _stuff(np.packbits(stream[:whole])), stream[whole:]
+
+
+def _stuff(data):
+    """Insert 0x00 after every 0xFF byte of an entropy-coded segment."""
+    return np.insert(data, np.flatnonzero(data == 0xFF) + 1, 0).tobytes()
+
+
+def encode_interleaved(blocks, chunk_mcus=1024):
+    """Entropy code Y, Cb and Cr stacks into one interleaved baseline scan.
+
+    Args:
+        blocks     : {Y: blocks, CB: blocks, CR: blocks} quantized stacks.
+        chunk_mcus : MCUs coded per step.
+
+    Returns:
+        bytes : The entropy-coded segment of a 4:4:4 baseline JPEG scan with
+                the standard (Annex K) Huffman tables.
+    """
+    return MCUEncoder(blocks, chunk_mcus).encode()
+
+
+def encode_jpeg(blocks, width, height, quant_tables, chunk_mcus=1024):
+    """Encode quantized Y, Cb and Cr stacks as a baseline 4:4:4 JFIF file.
+
+    Args:
+        blocks       : {Y: blocks, CB: blocks, CR: blocks} quantized stacks in
+                       raster order of the (width / 8, height / 8) grid.
+        width        : Image width in pixels, a multiple of 8.
+        height       : Image height in pixels, a multiple of 8.
+        quant_tables : (luminance, chrominance) (8, 8) tables the blocks were
+                       quantized with.
+        chunk_mcus   : MCUs coded per step.
+
+    Returns:
+        bytes : The complete file, SOI to EOI.
+    """
+    if width % 8 or height % 8:
+        raise ValueError(f"Image dimensions must be multiples of 8! "
+                         f"Current size: {width}x{height}")
+    encoder = MCUEncoder(blocks, chunk_mcus)
+    if encoder.mcu_count != width // 8 * (height // 8):
+        raise ValueError(f'{encoder.mcu_count} MCUs do not tile a '
+                         f'{width}x{height} image.')
+    # DQT and DHT table id of components 1 (Y), 2 (Cb) and 3 (Cr).
+    table_ids = (0, 1, 1)
+    # SOI and a JFIF 1.01 APP0 segment without thumbnail.
+    header = [b'\xff\xd8', segment(0xFFE0, b'JFIF\x00\x01\x01\x00'
+                                     + struct.pack('>HHBB', 1, 1, 0, 0))]
+    header += [dqt_segment(table_id, table) for table_id, table
+               in enumerate(quant_tables)]
+    header.append(segment(0xFFC0, struct.pack('>BHHB', 8, height, width, 3)
+                          + b''.join(bytes([number, 0x11, table_id])
+                                     for number, table_id
+                                     in enumerate(table_ids, 1))))
+    for table_id, layer_type in enumerate((LUMINANCE, CHROMINANCE)):
+        header.append(dht_segment(0, table_id,
+                                  HUFFMAN_CATEGORY_CODEWORD[DC][layer_type],
+                                  int))
+        header.append(dht_segment(1, table_id,
+                                  HUFFMAN_CATEGORY_CODEWORD[AC][layer_type],
+                                  lambda symbol: symbol[0] << 4 | symbol[1]))
+    header.append(segment(0xFFDA, bytes([3])
+                          + b''.join(bytes([number, table_id << 4 | table_id])
+                                     for number, table_id
+                                     in enumerate(table_ids, 1))
+                          + bytes([0, 63, 0])))
+    return b''.join(header) + encoder.encode() + b'\xff\xd9'
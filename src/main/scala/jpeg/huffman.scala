@@ -359,7 +359,7 @@ object chrominanceAcTable {
     (0x69.U, "b1111111110101101".U, 16.U),           // 0/1
     (0x6A.U, "b1111111110101110".U, 16.U),           // 0/2
     (0x71.U, "b1111010".U, 7.U),           // 0/1
-    (0x72.U, "b111111110000".U, 12.U),           // 0/2
+    (0x72.U, "b11111111000".U, 11.U),            // 0/2
     (0x73.U, "b1111111110101111".U, 16.U),           // 0/1
     (0x74.U, "b1111111110110000".U, 16.U),           // 0/2
     (0x75.U, "b1111111110110001".U, 16.U),           // 0/1
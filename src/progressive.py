@@ -0,0 +1,310 @@
+import collections
+import struct
+
+import numpy as np
+
+from bitstream import BitWriter, dht_segment, dqt_segment, segment
+from huffman_table import (Y, CB, CR, canonical_codewords,
+                           optimal_code_lengths, to_zig_zag)
+
+# A scan codes one component over the zig-zag band [ss, se]. `ah` is the
+# point transform of the previous scan of the band (0 for the first scan) and
+# `al` the point transform of this one (ITU T.81 G.1.1).
+ScanSpec = collections.namedtuple('ScanSpec', 'component ss se ah al')
+
+# One encoded scan. `frequencies` are the Huffman symbol statistics of the
+# scan, `table` the optimal codewords built from them (None for DC
+# refinement, which has no Huffman coding) and `data` the entropy-coded
+# bytes with 0xFF stuffing.
+Scan = collections.namedtuple('Scan',
+                              'spec frequencies code_lengths table data')
+
+# The libjpeg `jpeg_simple_progression` script for YCbCr.
+DEFAULT_SCRIPT = (
+    ScanSpec(Y, 0, 0, 0, 1),
+    ScanSpec(CB, 0, 0, 0, 1),
+    ScanSpec(CR, 0, 0, 0, 1),
+    ScanSpec(Y, 1, 5, 0, 2),
+    ScanSpec(CR, 1, 63, 0, 1),
+    ScanSpec(CB, 1, 63, 0, 1),
+    ScanSpec(Y, 6, 63, 0, 2),
+    ScanSpec(Y, 1, 63, 2, 1),
+    ScanSpec(Y, 0, 0, 1, 0),
+    ScanSpec(CB, 0, 0, 1, 0),
+    ScanSpec(CR, 0, 0, 1, 0),
+    ScanSpec(CR, 1, 63, 1, 0),
+    ScanSpec(CB, 1, 63, 1, 0),
+    ScanSpec(Y, 1, 63, 1, 0),
+)
+
+ZRL_SYMBOL = 0xF0
+MAX_EOBRUN = 0x7FFF
+# Correction bits buffered before a pending EOB run is forced out, as in
+# libjpeg, so refinement scans need bounded memory.
+MAX_CORRECTION_BITS = 1000
+
+
+def _size(value):
+    """Magnitude category (bit length) of a non-negative int."""
+    return int(value).bit_length()
+
+
+class _ScanEvents:
+    """Symbols and raw bit fields of one scan, in stream order."""
+
+    def __init__(self):
+        self.events = []
+        self.frequencies = collections.Counter()
+
+    def symbol(self, symbol):
+        self.events.append((symbol, 0, 0))
+        self.frequencies[symbol] += 1
+
+    def bits(self, value, length):
+        if length:
+            self.events.append((None, value, length))
+
+
+class ProgressiveEncoder:
+    def __init__(self, blocks, script=DEFAULT_SCRIPT):
+        """Create a progressive (spectral selection + successive
+        approximation) encoder.
+
+        Args:
+            blocks : A dictionary of component: (N, 8, 8) quantized
+                     coefficient stack, e.g. {Y: ..., CB: ..., CR: ...}.
+            script : Sequence of `ScanSpec`; the default is the libjpeg
+                     simple progression.
+        """
+        self.script = tuple(ScanSpec(*spec) for spec in script)
+        self._validate_script(blocks)
+        # The only pass over the block stacks: reorder into zig-zag once.
+        self.zig_zag = {component: to_zig_zag(stack, dtype=np.int32)
+                        for component, stack in blocks.items()}
+
+    def scans(self):
+        """Encode the script one scan at a time.
+
+        Yields:
+            `Scan` tuples in script order, so each scan can be sent as soon
+            as it is produced.
+        """
+        for spec in self.script:
+            events = _ScanEvents()
+            coefficients = self.zig_zag[spec.component]
+            if spec.ss == 0:
+                if spec.ah == 0:
+                    self._dc_first(coefficients, spec, events)
+                else:
+                    self._dc_refine(coefficients, spec, events)
+            elif spec.ah == 0:
+                self._ac_first(coefficients, spec, events)
+            else:
+                self._ac_refine(coefficients, spec, events)
+            yield self._emit(spec, events)
+
+    def encode(self):
+        """Encode every scan and return the list of `Scan` tuples."""
+        return list(self.scans())
+
+    def _validate_script(self, blocks):
+        # Successive approximation state of every (component, k).
+        state = {component: [None] * 64 for component in blocks}
+        for spec in self.script:
+            if spec.component not in blocks:
+                raise ValueError(f'No blocks for component {spec.component}.')
+            if not 0 <= spec.ss <= spec.se <= 63:
+                raise ValueError(f'Invalid spectral band in {spec}.')
+            if (spec.ss == 0) != (spec.se == 0):
+                raise ValueError(f'DC and AC cannot share a scan: {spec}.')
+            if spec.ah and spec.ah != spec.al + 1:
+                raise ValueError(f'Refinement must lower Al by one: {spec}.')
+            for k in range(spec.ss, spec.se + 1):
+                previous = state[spec.component][k]
+                expected = None if spec.ah == 0 else spec.ah
+                if previous != expected:
+                    raise ValueError(f'Scan {spec} does not follow the '
+                                     f'previous scan of coefficient {k}.')
+                state[spec.component][k] = spec.al
+
+    @staticmethod
+    def _emit(spec, events):
+        table = None
+        code_lengths = []
+        writer = BitWriter(stuffing=True)
+        if events.frequencies:
+            code_lengths = optimal_code_lengths(events.frequencies)
+            table = canonical_codewords(code_lengths)
+        for symbol, value, length in events.events:
+            if symbol is None:
+                writer.write(value, length)
+            else:
+                writer.write_code(table[symbol])
+        return Scan(spec, dict(events.frequencies), code_lengths, table,
+                    writer.flush())
+
+    @staticmethod
+    def _dc_first(coefficients, spec, events):
+        values = coefficients[:, 0] >> spec.al
+        diffs = np.diff(values, prepend=0)
+        for diff in diffs.tolist():
+            size = _size(abs(diff))
+            events.symbol(size)
+            events.bits(diff if diff >= 0 else diff - 1, size)
+
+    @staticmethod
+    def _dc_refine(coefficients, spec, events):
+        for bit in ((coefficients[:, 0] >> spec.al) & 1).tolist():
+            events.bits(bit, 1)
+
+    @staticmethod
+    def _ac_first(coefficients, spec, events):
+        band = coefficients[:, spec.ss:spec.se + 1]
+        # Point transform of the magnitude, keeping the sign.
+        magnitudes = np.abs(band) >> spec.al
+        values = np.where(band < 0, ~magnitudes, magnitudes)
+        rows, cols = np.nonzero(magnitudes)
+        starts = np.searchsorted(rows, np.arange(len(band) + 1))
+        cols = cols.tolist()
+        values = values[rows, cols].tolist()
+        magnitudes = magnitudes[rows, cols].tolist()
+        band_length = spec.se - spec.ss + 1
+
+        eobrun = 0
+        for block in range(len(band)):
+            begin, end = starts[block], starts[block + 1]
+            previous = -1
+            for idx in range(begin, end):
+                if eobrun:
+                    _emit_eobrun(events, eobrun)
+                    eobrun = 0
+                run = cols[idx] - previous - 1
+                while run > 15:
+                    events.symbol(ZRL_SYMBOL)
+                    run -= 16
+                size = _size(magnitudes[idx])
+                events.symbol((run << 4) | size)
+                events.bits(values[idx], size)
+                previous = cols[idx]
+            if previous < band_length - 1:
+                eobrun += 1
+                if eobrun == MAX_EOBRUN:
+                    _emit_eobrun(events, eobrun)
+                    eobrun = 0
+        if eobrun:
+            _emit_eobrun(events, eobrun)
+
+    @staticmethod
+    def _ac_refine(coefficients, spec, events):
+        band = coefficients[:, spec.ss:spec.se + 1]
+        magnitudes = np.abs(band) >> spec.al
+        rows, cols = np.nonzero(magnitudes)
+        starts = np.searchsorted(rows, np.arange(len(band) + 1))
+        cols = cols.tolist()
+        signs = (band[rows, cols] > 0).tolist()
+        magnitudes = magnitudes[rows, cols].tolist()
+        band_length = spec.se - spec.ss + 1
+
+        eobrun = 0
+        pending_bits = []   # Correction bits that follow the pending EOB run.
+        for block in range(len(band)):
+            begin, end = starts[block], starts[block + 1]
+            # Position of the last coefficient that becomes nonzero here.
+            last_new = -1
+            for idx in range(begin, end):
+                if magnitudes[idx] == 1:
+                    last_new = cols[idx]
+            run = 0
+            previous = -1
+            block_bits = []
+            for idx in range(begin, end):
+                k = cols[idx]
+                run += k - previous - 1
+                previous = k
+                while run > 15 and k <= last_new:
+                    if eobrun:
+                        _emit_eobrun(events, eobrun, pending_bits)
+                        eobrun = 0
+                    events.symbol(ZRL_SYMBOL)
+                    run -= 16
+                    _emit_correction_bits(events, block_bits)
+                if magnitudes[idx] > 1:
+                    # Previously nonzero: one correction bit.
+                    block_bits.append(magnitudes[idx] & 1)
+                    continue
+                if eobrun:
+                    _emit_eobrun(events, eobrun, pending_bits)
+                    eobrun = 0
+                events.symbol((run << 4) | 1)
+                events.bits(1 if signs[idx] else 0, 1)
+                _emit_correction_bits(events, block_bits)
+                run = 0
+            run += band_length - 1 - previous
+            if run > 0 or block_bits:
+                eobrun += 1
+                pending_bits.extend(block_bits)
+                if (eobrun == MAX_EOBRUN
+                        or len(pending_bits) > MAX_CORRECTION_BITS - 63):
+                    _emit_eobrun(events, eobrun, pending_bits)
+                    eobrun = 0
+        if eobrun:
+            _emit_eobrun(events, eobrun, pending_bits)
+
+
+def _emit_eobrun(events, eobrun, pending_bits=None):
+    """Code an EOB run and flush the correction bits buffered behind it."""
+    length = eobrun.bit_length() - 1
+    events.symbol(length << 4)
+    events.bits(eobrun, length)
+    if pending_bits:
+        _emit_correction_bits(events, pending_bits)
+
+
+def _emit_correction_bits(events, bits):
+    for bit in bits:
+        events.bits(bit, 1)
+    bits.clear()
+
+
+def encode_jpeg(blocks, width, height, quant_tables, script=DEFAULT_SCRIPT):
+    """Encode quantized Y, Cb and Cr stacks as a progressive 4:4:4 JFIF file.
+
+    Every scan is preceded by a DHT segment with its optimal table, so all
+    scans reuse DC/AC table id 0.
+
+    Args:
+        blocks       : {Y: blocks, CB: blocks, CR: blocks} quantized stacks in
+                       raster order of the (width / 8, height / 8) grid.
+        width        : Image width in pixels, a multiple of 8.
+        height       : Image height in pixels, a multiple of 8.
+        quant_tables : (luminance, chrominance) (8, 8) tables the blocks were
+                       quantized with.
+        script       : Sequence of `ScanSpec`.
+
+    Returns:
+        bytes : The complete file, SOI to EOI.
+    """
+    if width % 8 or height % 8:
+        raise ValueError(f"Image dimensions must be multiples of 8! "
+                         f"Current size: {width}x{height}")
+    # Component id and DQT table id of Y, Cb and Cr.
+    components = {Y: (1, 0), CB: (2, 1), CR: (3, 1)}
+    output = [b'\xff\xd8', segment(0xFFE0, b'JFIF\x00\x01\x01\x00'
+                                     + struct.pack('>HHBB', 1, 1, 0, 0))]
+    output += [dqt_segment(table_id, table) for table_id, table
+               in enumerate(quant_tables)]
+    output.append(segment(0xFFC2, struct.pack('>BHHB', 8, height, width, 3)
+                          + b''.join(bytes([number, 0x11, table_id])
+                                     for number, table_id
+                                     in components.values())))
+    for scan in ProgressiveEncoder(blocks, script).scans():
+        spec = scan.spec
+        if scan.table is not None:
+            output.append(dht_segment(0 if spec.ss == 0 else 1, 0,
+                                      scan.table, int))
+        output.append(segment(0xFFDA, bytes([1, components[spec.component][0],
+                                             0x00, spec.ss, spec.se,
+                                             spec.ah << 4 | spec.al])))
+        output.append(scan.data)
+    output.append(b'\xff\xd9')
+    return b''.join(output)
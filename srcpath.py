@@ -0,0 +1,15 @@
+"""Make the Python modules in src/ importable from the top-level scripts.
+
+src/ holds the entropy coding modules next to the Chisel sources and is not
+a package. Importing this module puts it on sys.path once:
+
+    import srcpath  # noqa: F401
+    from huffman_table import H_Encoder
+"""
+import os
+import sys
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src')
+
+if SRC_DIR not in sys.path:
+    sys.path.append(SRC_DIR)
@@ -0,0 +1,192 @@
+"""Quality-vs-size sweep over an image corpus.
+
+    python3 sweep.py photos/ --qualities 10:95:5 --output sweep.csv
+
+Every image is transformed once (`ratecontrol.RateController`); each quality
+only requantizes the cached coefficients, entropy codes them, decodes them
+back to RGB (decoder.py) and scores the result against the source with
+PSNR and SSIM. One record per (image, quality) is written as JSON or CSV
+(chosen by the output extension) and an averaged rate-distortion curve is
+printed.
+"""
+import argparse
+import csv
+import json
+import time
+
+import numpy as np
+
+import srcpath  # noqa: F401
+import profiler
+from batch import find_images
+from colorspace import YCBCR_COEFFICIENTS
+from decoder import JPEGBlockDecoder, blocks_to_plane, ycbcr_to_rgb
+from entropy_coding import HUFFMAN, decode_blocks, encode_blocks
+from ingest import load_rgb
+from ratecontrol import RateController
+from test import read_blocks
+from unittest import JPEGQuantization
+
+DEFAULT_QUALITIES = tuple(range(10, 100, 5))
+FIELDS = ('image', 'quality', 'bytes', 'bpp', 'psnr', 'ssim', 'encode_s',
+          'decode_s')
+
+# SSIM constants of Wang et al. (2004) for 8-bit samples.
+SSIM_WINDOW = 11
+SSIM_SIGMA = 1.5
+SSIM_C1 = (0.01 * 255) ** 2
+SSIM_C2 = (0.03 * 255) ** 2
+
+
+def psnr(reference, image):
+    """Peak signal-to-noise ratio in dB of two uint8 images (inf if equal)."""
+    error = np.asarray(reference, dtype=np.float64) - image
+    mse = np.mean(error * error)
+    return float('inf') if mse == 0 else float(10 * np.log10(255 ** 2 / mse))
+
+
+def _gaussian_window(size=SSIM_WINDOW, sigma=SSIM_SIGMA):
+    offsets = np.arange(size) - (size - 1) / 2
+    window = np.exp(-offsets ** 2 / (2 * sigma ** 2))
+    return window / window.sum()
+
+
+def _filter(plane, window):
+    """Separable 'valid' filtering of a 2-D plane with a 1-D window."""
+    size = len(window)
+    rows = plane.shape[0] - size + 1
+    columns = plane.shape[1] - size + 1
+    vertical = sum(weight * plane[k:k + rows] for k, weight in
+                   enumerate(window))
+    return sum(weight * vertical[:, k:k + columns] for k, weight in
+               enumerate(window))
+
+
+def luma(rgb):
+    """BT.601 luma (the Y of colorspace.py, unshifted) as float64."""
+    return np.asarray(rgb, dtype=np.float64) @ YCBCR_COEFFICIENTS[0]
+
+
+def ssim(reference, image):
+    """Mean SSIM of the luma of two RGB images (11x11 Gaussian window)."""
+    x, y = luma(reference), luma(image)
+    window = _gaussian_window()
+    mu_x, mu_y = _filter(x, window), _filter(y, window)
+    sigma_xx = _filter(x * x, window) - mu_x * mu_x
+    sigma_yy = _filter(y * y, window) - mu_y * mu_y
+    sigma_xy = _filter(x * y, window) - mu_x * mu_y
+    index = ((2 * mu_x * mu_y + SSIM_C1) * (2 * sigma_xy + SSIM_C2)
+             / ((mu_x * mu_x + mu_y * mu_y + SSIM_C1)
+                * (sigma_xx + sigma_yy + SSIM_C2)))
+    return float(index.mean())
+
+
+@profiler.traced()
+def sweep_image(source, qualities=DEFAULT_QUALITIES, coder=HUFFMAN):
+    """Encode, decode and score one image at every quality.
+
+    Returns:
+        list : One dict per quality with the fields of `FIELDS`.
+    """
+    reference = load_rgb(source)
+    height, width, _ = reference.shape
+    controller = RateController(*read_blocks(reference))
+    records = []
+    for quality in qualities:
+        start = time.perf_counter()
+        payloads = [encode_blocks(blocks, layer_type, coder)
+                    for blocks, (_, layer_type)
+                    in zip(controller.quantize(quality), controller.tables)]
+        encode_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        planes = [
+            blocks_to_plane(
+                JPEGBlockDecoder(JPEGQuantization(qt_choice, quality))
+                .decode_blocks(decode_blocks(payload, layer_type, coder)),
+                height, width)
+            for payload, (qt_choice, layer_type)
+            in zip(payloads, controller.tables)
+        ]
+        decoded = ycbcr_to_rgb(*planes)
+        decode_s = time.perf_counter() - start
+
+        size = sum(len(payload) for payload in payloads)
+        records.append({
+            'image': str(source), 'quality': quality, 'bytes': size,
+            'bpp': 8 * size / (height * width),
+            'psnr': psnr(reference, decoded), 'ssim': ssim(reference, decoded),
+            'encode_s': encode_s, 'decode_s': decode_s,
+        })
+    return records
+
+
+def run_sweep(sources, qualities=DEFAULT_QUALITIES, coder=HUFFMAN):
+    """`sweep_image` over a corpus; failing images are reported and skipped."""
+    records = []
+    for source in sources:
+        try:
+            records.extend(sweep_image(source, qualities, coder))
+        except Exception as e:
+            print(f"Failed {source}: {type(e).__name__}: {e}")
+    return records
+
+
+def rate_distortion(records):
+    """Corpus average of every field per quality, in quality order."""
+    curve = []
+    for quality in sorted({record['quality'] for record in records}):
+        rows = [record for record in records if record['quality'] == quality]
+        point = {'quality': quality, 'images': len(rows)}
+        for field in FIELDS[2:]:
+            point[field] = float(np.mean([row[field] for row in rows]))
+        curve.append(point)
+    return curve
+
+
+def write_records(records, path):
+    """Write records as CSV (a .csv path) or JSON (anything else)."""
+    if path.lower().endswith('.csv'):
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=FIELDS)
+            writer.writeheader()
+            writer.writerows(records)
+    else:
+        with open(path, 'w') as f:
+            json.dump({'records': records,
+                       'rate_distortion': rate_distortion(records)},
+                      f, indent=2)
+
+
+def parse_qualities(text):
+    """'10:95:5' (start:stop:step, stop included) or '50,75,90'."""
+    if ':' in text:
+        start, stop, step = (int(part) for part in text.split(':'))
+        return tuple(range(start, stop + 1, step))
+    return tuple(int(part) for part in text.split(','))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Measure size, PSNR and SSIM over quality settings')
+    parser.add_argument('inputs', nargs='+',
+                        help='Image files, directories or glob patterns')
+    parser.add_argument('--qualities', type=parse_qualities,
+                        default=DEFAULT_QUALITIES,
+                        help="Quality list '50,75,90' or range '10:95:5'")
+    parser.add_argument('--output', default='sweep.json',
+                        help='Output file, .csv or .json')
+    args = parser.parse_args()
+
+    sources = find_images(args.inputs)
+    print(f"Found {len(sources)} images")
+    records = run_sweep(sources, args.qualities)
+    write_records(records, args.output)
+    print(f"\n{'Quality':>7} {'bpp':>7} {'PSNR':>7} {'SSIM':>7} "
+          f"{'enc ms':>8} {'dec ms':>8}")
+    for point in rate_distortion(records):
+        print(f"{point['quality']:>7} {point['bpp']:>7.3f} "
+              f"{point['psnr']:>7.2f} {point['ssim']:>7.4f} "
+              f"{point['encode_s'] * 1e3:>8.1f} "
+              f"{point['decode_s'] * 1e3:>8.1f}")
+    print(f"\nWrote {len(records)} records to {args.output}")
@@ -1,8 +1,14 @@
+import argparse
 import os
 import subprocess
 import numpy as np
 import heapq
 from PIL import Image
+
+import profiler
+from colorspace import rgb_to_ycbcr_blocks
+from huffman_backend import code_strings, huffman_encode
+from ingest import load_rgb
 class HuffmanNode:
     def __init__(self, char, freq):
         self.char = char
@@ -13,6 +19,7 @@ class HuffmanNode:
     def __lt__(self, other):
         return self.freq < other.freq
     
+@profiler.traced()
 def convert_jpg2bmp(file_path, bmp_path):
     """
     Convert jpg to bmp
@@ -23,6 +30,7 @@ def convert_jpg2bmp(file_path, bmp_path):
     img.save(bmp_path, format="BMP")
     print(f"Converted {file_path} to {bmp_path}")
     
+@profiler.traced()
 def read_bmp(filepath):
     """
     Read BMP and convert it to YCbCr
@@ -40,6 +48,18 @@ def read_bmp(filepath):
     
     return np.array(y), np.array(cb), np.array(cr)
 
+@profiler.traced()
+def read_blocks(source):
+    """
+    Load any image and return its level-shifted Y, Cb, Cr blocks
+
+    Fused equivalent of convert_jpg2bmp, read_bmp and extract_blocks on
+    each component, without writing the intermediate BMP (see
+    ingest.load_rgb): (N, 8, 8) int16 stacks in a single pass over the RGB data
+    """
+    return rgb_to_ycbcr_blocks(load_rgb(source))
+
+@profiler.traced()
 def extract_blocks(channel_data):
     h, w = channel_data.shape
     blocks = []
@@ -48,8 +68,10 @@ def extract_blocks(channel_data):
             block = channel_data[i:i+8, j:j+8]
             block = block.astype(np.int16) - 128
             blocks.append(block)
+    profiler.count("blocks", len(blocks))
     return blocks
 
+@profiler.traced()
 def save_blocks_for_chisel(blocks, component_name, output_dir="hw_output"):
     os.makedirs(output_dir, exist_ok=True)
     for idx, block in enumerate(blocks):
@@ -59,19 +81,22 @@ def save_blocks_for_chisel(blocks, component_name, output_dir="hw_output"):
                 for val in row:
                     f.write(f"{val}\n")
 
-def run_chisel_test(sbt_project_path, blocks_y, blocks_cb, blocks_cr):
-    save_blocks_for_chisel(blocks_y, "y")
-    save_blocks_for_chisel(blocks_cb, "cb")
-    save_blocks_for_chisel(blocks_cr, "cr")
+@profiler.traced()
+def run_chisel_test(sbt_project_path, blocks_y, blocks_cb, blocks_cr,
+                    output_dir="hw_output"):
+    save_blocks_for_chisel(blocks_y, "y", output_dir)
+    save_blocks_for_chisel(blocks_cb, "cb", output_dir)
+    save_blocks_for_chisel(blocks_cr, "cr", output_dir)
     
     print("Running Chisel tests...")
-    process = subprocess.run(
-        ["sbt", "testOnly jpeg.JPEGEncodeChiselTests"],
-        cwd=sbt_project_path,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        text=True
-    )
+    with profiler.span("sbt"):
+        process = subprocess.run(
+            ["sbt", "testOnly jpeg.JPEGEncodeChiselTests"],
+            cwd=sbt_project_path,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True
+        )
     
     if process.returncode != 0:
         print("Chisel test failed!")
@@ -80,11 +105,11 @@ def run_chisel_test(sbt_project_path, blocks_y, blocks_cb, blocks_cr):
     
     return True
 
-def read_encoded_output(encoding_type="rle"):
+@profiler.traced()
+def read_encoded_output(encoding_type="rle", output_dir="hw_output"):
     """
     Read Chisel encoded output (RLE/DPCM)
     """
-    output_dir = "hw_output"
     y_output = []
     cb_output = []
     cr_output = []
@@ -102,6 +127,7 @@ def read_encoded_output(encoding_type="rle"):
                     cr_output = values
     
     return y_output, cb_output, cr_output
+@profiler.traced()
 def read_encoded_blocks(output_dir="hw_output", encoding_type="RLE"):
     """
     Read encoded blocks from RLE or Delta output files
@@ -140,6 +166,7 @@ def read_encoded_blocks(output_dir="hw_output", encoding_type="RLE"):
         encoded_data[component].append(values)
     
     return encoded_data
+@profiler.traced()
 def generate_huffman_codes(frequencies):
     """
     Generate Huffman codes for given frequencies
@@ -186,29 +213,48 @@ def generate_huffman_codes(frequencies):
         generate_codes_recursive(heap[0])
     
     return codes
-def perform_huffman_coding(encoded_data):
+@profiler.traced()
+def perform_huffman_coding(encoded_data, output_dir="hw_output", backend="python"):
     """
     Perform Huffman coding on RLE and Delta encoded data
     
     Args:
-        encoded_data: Dictionary containing encoded data for each component
+        encoded_data: Dictionary containing encoded data for each component,
+                      keyed by "RLE" and "Delta". Missing encodings are read
+                      from output_dir
+        output_dir: Directory of the encoded files; codes are written to
+                    its huffman/ subdirectory
+        backend: "python" (generate_huffman_codes) or "c" (csrc/huffman.c
+                 through huffman_backend, which also writes the packed
+                 <component>_<encoding>_data.bin)
     """
+    if backend not in ("python", "c"):
+        raise ValueError(f"Unknown Huffman backend {backend!r}, expected 'python' or 'c'")
     for encoding_type in ['RLE', 'Delta']:
-        data = read_encoded_blocks(encoding_type=encoding_type)
+        data = encoded_data.get(encoding_type)
+        if data is None:
+            data = read_encoded_blocks(output_dir, encoding_type)
         
         for component in ['Y', 'Cb', 'Cr']:
             # Collect all values for frequency calculation
             all_values = []
             for block in data[component]:
                 all_values.extend(block)
-                
-            # Create Huffman tree
-            frequencies = {}
-            for value in all_values:
-                frequencies[value] = frequencies.get(value, 0) + 1
-                
-            # Generate Huffman codes
-            huffman_codes = generate_huffman_codes(frequencies)
+            profiler.count("symbols", len(all_values))
+
+            if backend == "c":
+                huffman_codes = c_huffman_coding(
+                    all_values,
+                    f"{output_dir}/huffman/{component}_{encoding_type.lower()}_data.bin"
+                )
+            else:
+                # Create Huffman tree
+                frequencies = {}
+                for value in all_values:
+                    frequencies[value] = frequencies.get(value, 0) + 1
+
+                # Generate Huffman codes
+                huffman_codes = generate_huffman_codes(frequencies)
             
             # Save Huffman codes and encoded data
             save_huffman_output(
@@ -216,9 +262,31 @@ def perform_huffman_coding(encoded_data):
                 encoding_type, 
                 huffman_codes, 
                 data[component],
-                output_dir="hw_output/huffman"
+                output_dir=f"{output_dir}/huffman"
             )
             
+@profiler.traced()
+def c_huffman_coding(values, bin_path):
+    """
+    Huffman code a symbol sequence with csrc/huffman.c
+
+    Every value is passed as the pair (0, value), so the code table has one
+    entry per distinct value like generate_huffman_codes. The packed bit
+    stream is written to bin_path as a 4-byte big-endian bit length followed
+    by the bytes.
+
+    Returns:
+        Dictionary of value:huffman_code pairs
+    """
+    pairs = np.zeros((len(values), 2), dtype=np.int32)
+    pairs[:, 1] = values
+    packed, bit_length, table = huffman_encode(pairs)
+    os.makedirs(os.path.dirname(bin_path), exist_ok=True)
+    with open(bin_path, 'wb') as f:
+        f.write(bit_length.to_bytes(4, byteorder='big'))
+        f.write(packed)
+    return {value: code for (_, value), code in code_strings(table).items()}
+@profiler.traced()
 def save_huffman_output(component, encoding_type, huffman_codes, data, output_dir):
     """Save Huffman coding results"""
     os.makedirs(output_dir, exist_ok=True)
@@ -235,6 +303,7 @@ def save_huffman_output(component, encoding_type, huffman_codes, data, output_di
         for block in data:
             encoded = ' '.join(huffman_codes[val] for val in block)
             f.write(f"{encoded}\n")
+@profiler.traced()
 def create_bitstream(rle_data, delta_data, output_dir="hw_output/bitstream"):
     """
     Create bitstream from RLE and Delta encoded data
@@ -266,6 +335,7 @@ def create_bitstream(rle_data, delta_data, output_dir="hw_output/bitstream"):
         output_file = f"{output_dir}/{component.lower()}_encoded.bin"
         with open(output_file, 'wb') as f:
             f.write(bitstream)
+        profiler.count("bytes", len(bitstream))
         
         print(f"Created bitstream for {component}: {output_file}")
 
@@ -285,9 +355,10 @@ def encode_huffman_table(huffman_codes, is_dc=True):
     # (具體實現依照 JPEG 規範)
     
     return table_data
-def analyze_huffman_table_statistics():
+@profiler.traced()
+def analyze_huffman_table_statistics(output_dir="hw_output"):
     """Analyze Huffman table statistics for each component and encoding type"""
-    huffman_dir = "hw_output/huffman"
+    huffman_dir = f"{output_dir}/huffman"
     
     for component in ['Y', 'Cb', 'Cr']:
         for encoding in ['rle', 'delta']:
@@ -323,22 +394,39 @@ def calculate_compression_ratio(original_size, compressed_size):
     print(f"Compressed size: {compressed_size} bytes")
     print(f"Compression ratio: {ratio:.2f}:1")
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Run the JPEG encode pipeline')
+    parser.add_argument('--trace', type=str, default=None,
+                        help='Record per-stage timings and write a Chrome '
+                             'trace-event JSON file to this path')
+    parser.add_argument('--huffman-backend', choices=['python', 'c'],
+                        default='python',
+                        help='Huffman coder: pure Python or csrc/huffman.c '
+                             'loaded through ctypes')
+    parser.add_argument('--memory', action='store_true',
+                        help='Also record peak and retained memory per stage '
+                             '(tracemalloc and RSS of this process, plus the '
+                             'peak RSS of the sbt subprocess running the '
+                             'transform) and print them')
+    args = parser.parse_args()
+    if args.trace or args.memory:
+        profiler.enable(memory=args.memory)
+
     jpg_path = "8.jpg"
-    bmp_path = "output.bmp"
     sbt_project_path = "."  # 假設在項目根目錄運行
-    # 1. Convert jpg to bmp
-    print("Converting JPG to BMP...")
-    convert_jpg2bmp(jpg_path, bmp_path)
-    # 2. Read .bmp
-    print("Reading and processing BMP file...")
-    y, cb, cr = read_bmp(bmp_path)
-    y_blocks = extract_blocks(y)
-    cb_blocks = extract_blocks(cb)
-    cr_blocks = extract_blocks(cr)
+    # 1-2. Decode the image in memory and convert it to YCbCr
+    print("Reading and processing image...")
+    with profiler.span("ingest"):
+        rgb = load_rgb(jpg_path)
+    with profiler.span("blocking"):
+        y_blocks, cb_blocks, cr_blocks = rgb_to_ycbcr_blocks(rgb)
     
     # 3. Run Chisel Test
     print("Running Chisel implementation...")
-    success = run_chisel_test(sbt_project_path, y_blocks, cb_blocks, cr_blocks)
+    # The transform runs in the sbt subprocess: this span's peak covers the
+    # parent (writing the input blocks and waiting), the simulator's peak RSS
+    # is recorded separately as child_rss_mb of the "sbt" span.
+    with profiler.span("transform"):
+        success = run_chisel_test(sbt_project_path, y_blocks, cb_blocks, cr_blocks)
     
     if success:
         print("Reading encoded data...")
@@ -346,7 +434,9 @@ if __name__ == "__main__":
         delta_data = read_encoded_blocks(encoding_type="Delta")
         
         print("Performing Huffman coding...")
-        perform_huffman_coding({"RLE": rle_data, "Delta": delta_data})
+        with profiler.span("entropy"):
+            perform_huffman_coding({"RLE": rle_data, "Delta": delta_data},
+                                   backend=args.huffman_backend)
         
         print("\nHuffman Coding Results:")
         huffman_dir = "hw_output/huffman"
@@ -360,13 +450,20 @@ if __name__ == "__main__":
                         num_codes = len(f.readlines())
                     print(f"{component} {encoding.upper()}: {num_codes} unique codes")
         print("Creating bitstreams...")
-        create_bitstream(rle_data, delta_data)
+        with profiler.span("output"):
+            create_bitstream(rle_data, delta_data)
         print("\nAnalyzing Huffman table statistics...")
         analyze_huffman_table_statistics()
         
         # Calculate compression ratio
-        original_size = y.size + cb.size + cr.size
+        original_size = y_blocks.size + cb_blocks.size + cr_blocks.size
         # Get compressed size from bitstream files
         compressed_size = sum(os.path.getsize(f"hw_output/bitstream/{c.lower()}_encoded.bin") 
                             for c in ['Y', 'Cb', 'Cr'])
-        calculate_compression_ratio(original_size, compressed_size)
\ No newline at end of file
+        calculate_compression_ratio(original_size, compressed_size)
+
+    if args.trace or args.memory:
+        profiler.print_summary()
+    if args.trace:
+        profiler.export_chrome_trace(args.trace)
+        print(f"Trace written to {args.trace}")
\ No newline at end of file
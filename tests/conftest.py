@@ -0,0 +1,63 @@
+"""Shared setup of the Python model tests.
+
+unittest.py, the software reference model, shadows the standard library
+module of the same name, which pytest and numpy.testing import while tests
+run (pytest looks up `unittest.SkipTest` on every failure). The standard
+library module is loaded first, the reference model is registered as
+`unittest` only while the test modules are imported, and the standard
+library module is put back before the tests run.
+"""
+import importlib
+import os
+import sys
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _import_standard_unittest():
+    module = sys.modules.get('unittest')
+    if hasattr(module, 'SkipTest'):
+        return module
+    sys.modules.pop('unittest', None)
+    path = sys.path[:]
+    sys.path[:] = [entry for entry in path
+                   if os.path.abspath(entry or os.curdir) != ROOT]
+    try:
+        return importlib.import_module('unittest')
+    finally:
+        sys.path[:] = path
+
+
+_standard_unittest = _import_standard_unittest()
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'src')]
+del sys.modules['unittest']
+importlib.import_module('unittest')
+
+from colorspace import rgb_to_ycbcr_blocks
+from fastdct import AANDCT
+
+
+def pytest_collection_finish(session):
+    sys.modules['unittest'] = _standard_unittest
+
+
+@pytest.fixture(scope='session')
+def rgb():
+    """A 64x96 test image: smooth color ramps with some texture."""
+    rows, columns = np.mgrid[0:64, 0:96]
+    noise = np.random.default_rng(0).integers(-12, 13, (64, 96, 3))
+    image = np.stack([columns * 2.5, rows * 3.5 + columns,
+                      128 + 80 * np.sin(rows / 6) * np.cos(columns / 9)],
+                     axis=-1)
+    return np.clip(image + noise, 0, 255).astype(np.uint8)
+
+
+@pytest.fixture(scope='session')
+def quantized(rgb):
+    """{'Y', 'Cb', 'Cr'}: quantized (N, 8, 8) stacks of `rgb`."""
+    y, cb, cr = rgb_to_ycbcr_blocks(rgb)
+    return {'Y': AANDCT(1).quantize(y), 'Cb': AANDCT(2).quantize(cb),
+            'Cr': AANDCT(2).quantize(cr)}
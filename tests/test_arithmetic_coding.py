@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from arithmetic_coding import A_Decoder, A_Encoder
+from entropy_coding import ARITHMETIC, HUFFMAN, decode_blocks, encode_blocks
+from huffman_table import CHROMINANCE, LUMINANCE
+
+
+def sparse_blocks(seed, count=200, density=0.08, amplitude=60):
+    """Mostly-zero blocks, plus all-zero blocks and a nonzero last
+    coefficient, the way quantized DCT blocks look."""
+    rng = np.random.default_rng(seed)
+    blocks = np.zeros((count, 8, 8), dtype=np.int32)
+    mask = rng.random(blocks.shape) < density
+    blocks[mask] = rng.integers(-amplitude, amplitude + 1, mask.sum())
+    blocks[:, 0, 0] = rng.integers(-1024, 1024, count)
+    blocks[::7] = 0
+    blocks[::11, 7, 7] = -1
+    return blocks
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_round_trip(seed):
+    blocks = sparse_blocks(seed)
+    decoded = A_Decoder(A_Encoder(blocks).encode()).decode()
+    np.testing.assert_array_equal(decoded, blocks)
+
+
+def test_round_trip_extreme_values():
+    blocks = np.zeros((3, 8, 8), dtype=np.int32)
+    blocks[0] = 1023
+    blocks[1] = -1024
+    blocks[2, 0, 0] = 2047
+    decoded = A_Decoder(A_Encoder(blocks).encode()).decode()
+    np.testing.assert_array_equal(decoded, blocks)
+
+
+@pytest.mark.parametrize('layer_type', [LUMINANCE, CHROMINANCE])
+def test_smaller_than_huffman(layer_type):
+    blocks = sparse_blocks(0, count=600)
+    arithmetic = encode_blocks(blocks, layer_type, ARITHMETIC)
+    huffman = encode_blocks(blocks, layer_type, HUFFMAN)
+    assert len(arithmetic) < len(huffman)
+    np.testing.assert_array_equal(
+        decode_blocks(arithmetic, layer_type, ARITHMETIC), blocks)
+
+
+def test_smaller_than_huffman_on_pipeline_blocks(quantized):
+    for component, layer_type in (('Y', LUMINANCE), ('Cb', CHROMINANCE),
+                                  ('Cr', CHROMINANCE)):
+        blocks = quantized[component]
+        assert (len(encode_blocks(blocks, layer_type, ARITHMETIC))
+                < len(encode_blocks(blocks, layer_type, HUFFMAN)))
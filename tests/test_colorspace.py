@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from colorspace import rgb_to_ycbcr_blocks
+from test import extract_blocks
+
+
+def pillow_blocks(rgb):
+    """The reference path: PIL's convert('YCbCr') and extract_blocks."""
+    ycbcr = Image.fromarray(np.ascontiguousarray(rgb), 'RGB').convert('YCbCr')
+    return [np.array(extract_blocks(np.array(plane)))
+            for plane in ycbcr.split()]
+
+
+def assert_matches_pillow(rgb):
+    for blocks, expected in zip(rgb_to_ycbcr_blocks(rgb), pillow_blocks(rgb)):
+        assert blocks.dtype == np.int16
+        np.testing.assert_array_equal(blocks, expected)
+
+
+def test_matches_pillow(rgb):
+    assert_matches_pillow(rgb)
+
+
+def test_matches_pillow_on_random_colors():
+    rgb = np.random.default_rng(0).integers(0, 256, (512, 512, 3),
+                                            dtype=np.uint8)
+    assert_matches_pillow(rgb)
+
+
+def test_matches_pillow_on_extreme_colors():
+    values = np.array([0, 1, 127, 128, 254, 255], dtype=np.uint8)
+    colors = np.stack(np.meshgrid(values, values, values, indexing='ij'),
+                      axis=-1).reshape(-1, 3)
+    rgb = np.resize(colors, (8 * 32, 3)).reshape(8, 32, 3)
+    assert_matches_pillow(rgb)
+
+
+def test_strided_input(rgb):
+    # A view with negative and non-contiguous strides, as ingest returns for
+    # bottom-up BMPs.
+    view = rgb[::-1, ::2]
+    assert_matches_pillow(view)
+
+
+def test_rejects_partial_blocks(rgb):
+    with pytest.raises(ValueError):
+        rgb_to_ycbcr_blocks(rgb[:12])
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from fastdct import AANDCT
+from unittest import JPEGQuantization
+
+_k = np.arange(8)
+# Orthonormal DCT-II matrix, basis[i, u].
+BASIS = np.cos(np.outer(2 * _k + 1, _k) * np.pi / 16) * np.sqrt(2 / 8)
+BASIS[:, 0] /= np.sqrt(2)
+
+
+def reference_dct(blocks):
+    return np.einsum('iu,nij,jv->nuv', BASIS, np.asarray(blocks, float),
+                     BASIS)
+
+
+@pytest.fixture(scope='module')
+def blocks():
+    return np.random.default_rng(0).integers(-128, 128, (4096, 8, 8))
+
+
+@pytest.mark.parametrize('dtype, bound', [(np.float64, 1e-10),
+                                          (np.float32, 1e-3)])
+def test_dct_error_bound(blocks, dtype, bound):
+    error = AANDCT(1, dtype=dtype).dct(blocks) - reference_dct(blocks)
+    assert np.abs(error).max() < bound
+
+
+@pytest.mark.parametrize('qt_choice', [1, 2])
+def test_quantize_matches_reference(blocks, qt_choice):
+    quantization = JPEGQuantization(qt_choice, 75)
+    exact = reference_dct(blocks)
+    result = AANDCT(quantization, dtype=np.float64).quantize(blocks)
+    differs = result != quantization.quantize(exact)
+    # Only exact x.5 ties may round the other way.
+    ratio = exact / quantization.quant_table
+    assert np.all(np.abs(np.abs(ratio[differs] % 1) - 0.5) < 1e-6)
+
+
+def flat_and_busy_blocks(seed, flat_fraction):
+    """Constant blocks with small noise mixed with random busy blocks."""
+    rng = np.random.default_rng(seed)
+    count = 1024
+    flat = rng.random(count) < flat_fraction
+    blocks = rng.integers(-128, 128, (count, 8, 8))
+    levels = rng.integers(-128, 128, (count, 1, 1))
+    levels[:4] = [[[-128]], [[127]], [[0]], [[64]]]
+    noise = rng.choice([-1, 0, 1], (count, 8, 8), p=[0.05, 0.9, 0.05])
+    blocks[flat] = np.clip(levels + noise, -128, 127)[flat]
+    return blocks
+
+
+@pytest.mark.parametrize('qt_choice', [1, 2])
+# Below FLAT_SPLIT_FRACTION (full transform), split, and all flat.
+@pytest.mark.parametrize('flat_fraction', [0.05, 0.5, 1.0])
+def test_flat_blocks_match_full_path(qt_choice, flat_fraction):
+    blocks = flat_and_busy_blocks(qt_choice, flat_fraction)
+    fast = AANDCT(qt_choice)
+    full = AANDCT(qt_choice, skip_flat=False).quantize(blocks)
+    np.testing.assert_array_equal(fast.quantize(blocks), full)
+    assert fast.flat_hits > 0
+    assert fast.blocks_seen == len(blocks)
+    # Every block taken as flat has no nonzero AC term in the full path.
+    flat = fast.flat_mask(blocks)
+    assert not full[flat].reshape(-1, 64)[:, 1:].any()
@@ -0,0 +1,109 @@
+import collections
+import ctypes
+
+import numpy as np
+import pytest
+
+import huffman_backend
+from huffman_backend import (TABLE_COLUMNS, code_strings, huffman_decode,
+                             huffman_encode)
+from test import generate_huffman_codes
+
+HUFFMAN_ERR_CAPACITY = -3
+
+
+@pytest.fixture(scope='module')
+def library():
+    try:
+        return huffman_backend.load_library()
+    except OSError as error:
+        pytest.skip(f'csrc/huffman.c cannot be built: {error}')
+
+
+def random_pairs(seed, count=5000):
+    """Skewed (run_length, value) pairs like the RLE stage produces."""
+    rng = np.random.default_rng(seed)
+    runs = np.minimum(rng.geometric(0.4, count) - 1, 15)
+    values = np.round(rng.laplace(0, 6, count)).astype(np.int32)
+    return np.stack((runs, values), axis=1).astype(np.int32)
+
+
+def unpack(data, bit_length):
+    bits = ''.join(format(byte, '08b') for byte in data)
+    return bits[:bit_length]
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_round_trip(library, seed):
+    pairs = random_pairs(seed)
+    data, bit_length, table = huffman_encode(pairs)
+    np.testing.assert_array_equal(huffman_decode(data, bit_length, table),
+                                  pairs)
+    # The stream is the concatenation of the table's codes.
+    codes = code_strings(table)
+    assert unpack(data, bit_length) == ''.join(
+        codes[tuple(pair)] for pair in pairs.tolist())
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_optimal_like_python_coder(library, seed):
+    pairs = random_pairs(seed)
+    frequencies = collections.Counter(map(tuple, pairs.tolist()))
+    python_codes = generate_huffman_codes(dict(frequencies))
+    _, bit_length, table = huffman_encode(pairs)
+    c_codes = code_strings(table)
+    assert set(c_codes) == set(python_codes)
+    # Both are Huffman codes of the same statistics, so they may differ in
+    # the codewords but not in the coded size.
+    assert bit_length == sum(count * len(python_codes[symbol])
+                             for symbol, count in frequencies.items())
+
+
+def test_single_and_no_symbol(library):
+    pairs = np.array([[0, 7]] * 5, dtype=np.int32)
+    data, bit_length, table = huffman_encode(pairs)
+    np.testing.assert_array_equal(huffman_decode(data, bit_length, table),
+                                  pairs)
+    data, bit_length, table = huffman_encode(np.empty((0, 2)))
+    assert bit_length == 0
+    assert len(huffman_decode(data, bit_length, table)) == 0
+
+
+def test_capacity_errors(library):
+    pairs = random_pairs(0, count=200)
+    count = len(pairs)
+    symbols = len(set(map(tuple, pairs.tolist())))
+    table_count = ctypes.c_int()
+    out_bytes = ctypes.c_long()
+    out_bits = ctypes.c_long()
+
+    def encode(table_rows, out_size):
+        table = np.empty((table_rows, TABLE_COLUMNS), dtype=np.int32)
+        out = np.empty(out_size, dtype=np.uint8)
+        return library.huffman_encode(
+            pairs.ravel(), count, table.ravel(), table_rows,
+            ctypes.byref(table_count), out, out_size,
+            ctypes.byref(out_bytes), ctypes.byref(out_bits))
+
+    assert encode(symbols - 1, count * 4 + 1) == HUFFMAN_ERR_CAPACITY
+    # A short output buffer reports the size it needs.
+    assert encode(symbols, 1) == HUFFMAN_ERR_CAPACITY
+    needed = out_bytes.value
+    assert needed > 1
+    assert encode(symbols, needed) == 0
+
+    data, bit_length, table = huffman_encode(pairs)
+    data = np.frombuffer(data, dtype=np.uint8).copy()
+    short = np.empty((count - 1, 2), dtype=np.int32)
+    assert library.huffman_decode(
+        data, bit_length, np.ascontiguousarray(table).ravel(), len(table),
+        short.ravel(), len(short)) == HUFFMAN_ERR_CAPACITY
+
+
+def test_invalid_code(library):
+    pairs = random_pairs(1, count=100)
+    data, bit_length, table = huffman_encode(pairs)
+    # Drop the longest code from the table: its bits no longer decode.
+    longest = int(np.argmax(table[:, 2]))
+    with pytest.raises(RuntimeError, match='invalid code'):
+        huffman_decode(data, bit_length, np.delete(table, longest, axis=0))
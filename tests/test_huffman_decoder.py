@@ -0,0 +1,132 @@
+import numpy as np
+import pytest
+
+from decoder import decode_crop, decode_image, decode_thumbnail
+from huffman_table import (AC, CHROMINANCE, DC, LUMINANCE, H_Decoder,
+                           H_Encoder, decode_ac_prefix)
+
+LAYERS = {'Y': LUMINANCE, 'Cb': CHROMINANCE, 'Cr': CHROMINANCE}
+
+
+@pytest.fixture(scope='module')
+def coded(quantized):
+    return {name: H_Encoder(blocks, LAYERS[name]).encode()
+            for name, blocks in quantized.items()}
+
+
+def decoders(coded):
+    return [H_Decoder(coded[name], LAYERS[name]) for name in ('Y', 'Cb', 'Cr')]
+
+
+@pytest.mark.parametrize('name', ['Y', 'Cb'])
+def test_decode_round_trip(quantized, coded, name):
+    decoder = H_Decoder(coded[name], LAYERS[name])
+    blocks = decoder.decode()
+    assert blocks.dtype == np.int16
+    np.testing.assert_array_equal(blocks, quantized[name])
+    # Second path: AC symbols already decoded through the `ac` property.
+    decoder = H_Decoder(coded[name], LAYERS[name])
+    decoder.ac
+    np.testing.assert_array_equal(decoder.decode(), quantized[name])
+
+
+def test_decode_split_interleaved_chrominance(quantized):
+    stack = np.empty((2 * len(quantized['Cb']), 8, 8), dtype=np.int32)
+    stack[0::2], stack[1::2] = quantized['Cb'], quantized['Cr']
+    coded = H_Encoder(stack, CHROMINANCE).encode()
+    cb, cr = H_Decoder(coded, CHROMINANCE).decode(split=True)
+    np.testing.assert_array_equal(cb, stack[0::2])
+    np.testing.assert_array_equal(cr, stack[1::2])
+
+
+def test_decode_into_buffer(quantized, coded):
+    out = np.full(quantized['Y'].shape, 7, dtype=np.int16)
+    assert H_Decoder(coded['Y'], LUMINANCE).decode(out=out) is out
+    np.testing.assert_array_equal(out, quantized['Y'])
+    with pytest.raises(ValueError):
+        H_Decoder(coded['Y'], LUMINANCE).decode(out=out.astype(np.int32))
+
+
+def test_split_needs_even_block_count(quantized):
+    coded = H_Encoder(quantized['Cb'][:3], CHROMINANCE).encode()
+    with pytest.raises(ValueError):
+        H_Decoder(coded, CHROMINANCE).decode(split=True)
+
+
+def test_truncated_ac_sequence_raises_index_error():
+    with pytest.raises(IndexError):
+        H_Decoder({DC: '00', AC: '000'}, LUMINANCE).ac
+    with pytest.raises(IndexError):
+        decode_ac_prefix('000', LUMINANCE, 64, np.zeros((4, 64)))
+
+
+@pytest.mark.parametrize('split', [False, True])
+def test_mismatched_dc_and_ac_counts(quantized, split):
+    short = H_Encoder(quantized['Cb'][:4], CHROMINANCE).encode()
+    long = H_Encoder(quantized['Cb'][:6], CHROMINANCE).encode()
+    # Leftover AC blocks after the last DC.
+    with pytest.raises(ValueError):
+        H_Decoder({DC: short[DC], AC: long[AC]},
+                  CHROMINANCE).decode(split=split)
+    with pytest.raises(ValueError):
+        H_Decoder({DC: long[DC], AC: short[AC]},
+                  CHROMINANCE).decode(split=split)
+    with pytest.raises(ValueError):
+        H_Decoder({DC: short[DC], AC: long[AC]},
+                  CHROMINANCE).decode_lowpass(4)
+
+
+def test_decode_region(quantized, coded):
+    columns = 96 // 8
+    grid = quantized['Y'].reshape(-1, columns, 8, 8)
+    region = H_Decoder(coded['Y'], LUMINANCE).decode_region(columns,
+                                                             (3, 2, 7, 5))
+    np.testing.assert_array_equal(region,
+                                  grid[2:5, 3:7].reshape(-1, 8, 8))
+
+
+def test_decode_region_rejects_short_ac_sequence(quantized):
+    columns = 96 // 8
+    full = H_Encoder(quantized['Y'], LUMINANCE).encode()
+    # The AC sequence ends cleanly after the first three block rows.
+    short = H_Encoder(quantized['Y'][:3 * columns], LUMINANCE).encode()
+    decoder = H_Decoder({DC: full[DC], AC: short[AC]}, LUMINANCE)
+    assert decoder.decode_region(columns, (3, 1, 7, 3)).shape == (8, 8, 8)
+    with pytest.raises(ValueError):
+        decoder.decode_region(columns, (3, 2, 7, 5))
+
+
+@pytest.mark.parametrize('box', [(0, 0, 96, 64), (8, 16, 40, 48),
+                                 (88, 56, 96, 64)])
+def test_decode_crop(quantized, coded, box):
+    full = decode_image(quantized['Y'], quantized['Cb'], quantized['Cr'],
+                        64, 96)
+    left, top, right, bottom = box
+    crop = decode_crop(*decoders(coded), 96, box)
+    np.testing.assert_array_equal(crop, full[top:bottom, left:right])
+
+
+@pytest.mark.parametrize('scale_denom, max_error', [(2, 6), (8, 2)])
+def test_decode_thumbnail_matches_downscaled_decode(quantized, coded,
+                                                    scale_denom, max_error):
+    full = decode_image(quantized['Y'], quantized['Cb'], quantized['Cr'],
+                        64, 96)
+    thumbnail = decode_thumbnail(*decoders(coded), 64, 96, scale_denom)
+    size = 64 // scale_denom, 96 // scale_denom
+    assert thumbnail.shape == size + (3, )
+    # Box-filtered full decode; the reduced IDCT drops the high
+    # frequencies a box filter keeps, the 1/8 DC-only path does not.
+    expected = full.reshape(size[0], scale_denom, size[1], scale_denom,
+                            3).mean(axis=(1, 3))
+    error = np.abs(thumbnail - expected)
+    assert error.max() <= max_error
+    assert error.mean() < 1
+
+
+def test_decode_lowpass_rejects_short_ac_sequence(quantized):
+    full = H_Encoder(quantized['Y'][:6], LUMINANCE).encode()
+    short = H_Encoder(quantized['Y'][:4], LUMINANCE).encode()
+    decoder = H_Decoder({DC: full[DC], AC: short[AC]}, LUMINANCE)
+    assert decoder.decode_lowpass(1).shape == (6, 1, 1)
+    with pytest.raises(ValueError):
+        decoder.decode_lowpass(2)
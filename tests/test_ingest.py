@@ -0,0 +1,79 @@
+import io
+import struct
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from ingest import load_rgb, map_bmp, map_ppm
+
+
+@pytest.fixture(scope='module')
+def odd(rgb):
+    """A crop whose 24-bit BMP rows need padding."""
+    return np.ascontiguousarray(rgb[:13, :21])
+
+
+def save(image, path, mode='RGB', **params):
+    Image.fromarray(image).convert(mode).save(path, **params)
+    return path
+
+
+def reference(path):
+    return np.asarray(Image.open(path).convert('RGB'))
+
+
+def is_mapped(pixels):
+    while pixels is not None and not isinstance(pixels, np.memmap):
+        pixels = pixels.base
+    return pixels is not None
+
+
+@pytest.mark.parametrize('mode', ['RGB', 'RGBA'])
+def test_bmp_map_matches_pillow(odd, tmp_path, mode):
+    path = save(odd, tmp_path / 'image.bmp', mode)
+    pixels = map_bmp(str(path))
+    assert is_mapped(pixels)
+    np.testing.assert_array_equal(pixels, reference(path))
+    np.testing.assert_array_equal(load_rgb(path.read_bytes()), odd)
+
+
+def test_top_down_bmp(odd, tmp_path):
+    data = bytearray(save(odd, tmp_path / 'image.bmp').read_bytes())
+    # Negate the height and reverse the padded rows.
+    offset = struct.unpack_from('<I', data, 10)[0]
+    struct.pack_into('<i', data, 22, -odd.shape[0])
+    rows = np.frombuffer(bytes(data[offset:]), dtype=np.uint8)
+    data[offset:] = rows.reshape(odd.shape[0], -1)[::-1].tobytes()
+    np.testing.assert_array_equal(map_bmp(bytes(data)), odd)
+
+
+def test_ppm_map_matches_pillow(odd, tmp_path):
+    path = save(odd, tmp_path / 'image.ppm')
+    pixels = map_ppm(str(path))
+    assert is_mapped(pixels)
+    np.testing.assert_array_equal(pixels, reference(path))
+    np.testing.assert_array_equal(load_rgb(str(path)), odd)
+
+
+def test_ppm_header_comments(odd):
+    height, width, _ = odd.shape
+    data = (f'P6\n# comment\n{width} {height}\n# another\n255\n'.encode()
+            + odd.tobytes())
+    np.testing.assert_array_equal(map_ppm(data), odd)
+
+
+def test_ppm_maxval_is_rescaled(odd):
+    height, width, _ = odd.shape
+    samples = (odd // 17).astype(np.uint8)
+    data = f'P6 {width} {height} 15\n'.encode() + samples.tobytes()
+    assert map_ppm(data) is None
+    np.testing.assert_array_equal(load_rgb(data), samples * 17)
+    np.testing.assert_array_equal(
+        load_rgb(data), np.asarray(Image.open(io.BytesIO(data))))
+
+
+def test_other_formats_use_pillow(odd, tmp_path):
+    path = save(odd, tmp_path / 'image.png')
+    assert map_bmp(str(path)) is None and map_ppm(str(path)) is None
+    np.testing.assert_array_equal(load_rgb(str(path)), odd)
@@ -0,0 +1,65 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from decoder import decode_image
+from huffman_table import (AC, CB, CHROMINANCE, CR, HUFFMAN_CATEGORY_CODEWORD,
+                           Y)
+from interleaved import MCUEncoder, encode_jpeg
+from unittest import JPEGQuantization
+
+HEIGHT, WIDTH = 64, 96
+TABLES = (JPEGQuantization(1).quant_table, JPEGQuantization(2).quant_table)
+
+
+def sparse_blocks(seed, density=0.06, amplitude=10):
+    """Mostly-zero blocks: long zero runs, ZRLs and some full blocks."""
+    rng = np.random.default_rng(seed)
+    count = HEIGHT * WIDTH // 64
+    blocks = {}
+    for component in (Y, CB, CR):
+        stack = np.zeros((count, 8, 8), dtype=np.int64)
+        mask = rng.random(stack.shape) < density
+        stack[mask] = rng.integers(-amplitude, amplitude + 1, mask.sum())
+        stack[:, 0, 0] = rng.integers(-5, 5, count)
+        stack[::5, 7, 7] = 1
+        blocks[component] = stack
+    return blocks
+
+
+def test_chrominance_ac_table_is_canonical():
+    codes = sorted(HUFFMAN_CATEGORY_CODEWORD[AC][CHROMINANCE].values(),
+                   key=lambda code: (len(code), code))
+    assert int(codes[0], 2) == 0
+    code = 0
+    for previous, current in zip(codes, codes[1:]):
+        code = (code + 1) << (len(current) - len(previous))
+        assert int(current, 2) == code
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_pillow_decodes_interleaved_scan(seed):
+    blocks = sparse_blocks(seed)
+    data = encode_jpeg(blocks, WIDTH, HEIGHT, TABLES, chunk_mcus=7)
+    decoded = np.asarray(Image.open(io.BytesIO(data)).convert('RGB'),
+                         dtype=np.float64)
+    reference = decode_image(blocks[Y], blocks[CB], blocks[CR], HEIGHT, WIDTH)
+    error = np.abs(decoded - reference)
+    # Only IDCT and color conversion rounding differ from libjpeg.
+    assert error.max() <= 4
+    assert error.mean() < 0.5
+
+
+def test_chunk_size_does_not_change_scan():
+    blocks = sparse_blocks(0)
+    assert (MCUEncoder(blocks, 1).encode() == MCUEncoder(blocks, 5).encode()
+            == MCUEncoder(blocks, 1024).encode())
+
+
+def test_mismatched_block_counts():
+    blocks = sparse_blocks(0)
+    blocks[CR] = blocks[CR][:-1]
+    with pytest.raises(ValueError):
+        MCUEncoder(blocks)
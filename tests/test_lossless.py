@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from decoder import JPEGBlockDecoder, blocks_to_plane, ycbcr_to_rgb
+from entropy_coding import decode_blocks, encode_blocks
+from huffman_table import COMPONENT_TABLES
+from lossless import (FLIP_HORIZONTAL, FLIP_VERTICAL, ROTATE_90, ROTATE_180,
+                      ROTATE_270, TRANSPOSE, TRANSVERSE, transform_image)
+from unittest import JPEGQuantization
+
+HEIGHT, WIDTH = 64, 96
+
+# Pillow transpose of the pixels matching every transform.
+PIXEL_TRANSFORMS = {
+    FLIP_HORIZONTAL: Image.Transpose.FLIP_LEFT_RIGHT,
+    FLIP_VERTICAL: Image.Transpose.FLIP_TOP_BOTTOM,
+    TRANSPOSE: Image.Transpose.TRANSPOSE,
+    TRANSVERSE: Image.Transpose.TRANSVERSE,
+    ROTATE_90: Image.Transpose.ROTATE_270,      # Pillow turns clockwise
+    ROTATE_180: Image.Transpose.ROTATE_180,
+    ROTATE_270: Image.Transpose.ROTATE_90,
+}
+
+
+def decode(payloads, width, height, tables):
+    planes = []
+    for name, (qt_choice, layer_type) in COMPONENT_TABLES.items():
+        quantization = JPEGQuantization(qt_choice)
+        quantization.quant_table = tables[name]
+        blocks = decode_blocks(payloads[name], layer_type)
+        planes.append(blocks_to_plane(
+            JPEGBlockDecoder(quantization).decode_blocks(blocks),
+            height, width))
+    return ycbcr_to_rgb(*planes)
+
+
+@pytest.fixture(scope='module')
+def coded(quantized):
+    return {name: encode_blocks(blocks, COMPONENT_TABLES[name][1])
+            for name, blocks in quantized.items()}
+
+
+@pytest.mark.parametrize('transform', sorted(PIXEL_TRANSFORMS))
+def test_matches_pixel_domain_transform(coded, transform):
+    _, _, _, tables = transform_image(coded, WIDTH, HEIGHT, None)
+    reference = Image.fromarray(decode(coded, WIDTH, HEIGHT, tables))
+    payloads, width, height, tables = transform_image(coded, WIDTH, HEIGHT,
+                                                      transform)
+    expected = np.asarray(reference.transpose(PIXEL_TRANSFORMS[transform]))
+    assert (height, width) == expected.shape[:2]
+    # Only the IDCT rounding of the transposed table may differ.
+    result = decode(payloads, width, height, tables).astype(np.int64)
+    assert np.abs(result - expected).max() <= 1
+
+
+def test_four_quarter_turns_are_identity(coded):
+    payloads, width, height = coded, WIDTH, HEIGHT
+    for _ in range(4):
+        payloads, width, height, _ = transform_image(payloads, width, height,
+                                                     ROTATE_90)
+    assert payloads == coded
+    assert (width, height) == (WIDTH, HEIGHT)
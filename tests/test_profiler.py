@@ -0,0 +1,100 @@
+import io
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import profiler
+from colorspace import rgb_to_ycbcr_blocks
+from fastdct import AANDCT
+from huffman_table import COMPONENT_TABLES, COMPONENTS, H_Encoder
+from ingest import load_rgb
+
+# One float64 array of this many elements is 8 MB.
+EIGHT_MB = 1 << 20
+
+
+@pytest.fixture
+def memory_profiler():
+    profiler.reset()
+    profiler.enable(memory=True)
+    yield
+    profiler.disable()
+    profiler.reset()
+
+
+def test_memory_budget_reports_usage():
+    with profiler.memory_budget(64) as usage:
+        data = np.ones(EIGHT_MB)
+    assert 7.5 < usage['peak_mb'] < 64
+    assert usage['retained_mb'] > 7.5
+    del data
+
+
+def test_memory_budget_raises_over_limit():
+    with pytest.raises(profiler.MemoryBudgetExceeded, match='big'):
+        with profiler.memory_budget(4, 'big'):
+            np.ones(EIGHT_MB).sum()
+
+
+def test_nested_span_peaks(memory_profiler):
+    with profiler.span('outer'):
+        with profiler.span('inner'):
+            np.ones(EIGHT_MB).sum()
+        np.ones(EIGHT_MB // 4).sum()
+    stats = profiler.memory_summary()
+    assert stats['inner']['peak_mb'] > 7.5
+    # The outer span's peak includes the inner one's.
+    assert stats['outer']['peak_mb'] >= stats['inner']['peak_mb']
+    assert abs(stats['inner']['retained_mb']) < 1
+
+
+def test_check_budgets(memory_profiler):
+    with profiler.span('stage'):
+        np.ones(EIGHT_MB).sum()
+    stats = profiler.check_budgets({'stage': 64, 'missing': 0})
+    assert stats['stage']['calls'] == 1
+    with pytest.raises(profiler.MemoryBudgetExceeded, match='stage'):
+        profiler.check_budgets({'stage': 4})
+
+
+@pytest.fixture(scope='module')
+def png_512():
+    """PNG bytes of a fixed 512x512 test image."""
+    rows, columns = np.mgrid[0:512, 0:512]
+    noise = np.random.default_rng(0).integers(-20, 21, (512, 512, 3))
+    image = np.stack([columns * 0.5, rows * 0.4 + columns * 0.1,
+                      128 + 60 * np.sin(rows / 20)], axis=-1)
+    buffer = io.BytesIO()
+    Image.fromarray(np.clip(image + noise, 0, 255).astype(np.uint8)) \
+        .save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def test_encode_stays_within_budget(png_512):
+    # ingest -> color conversion -> AAN DCT/quantization -> Huffman coding
+    # of a 512x512 image; about 8 MB at the peak.
+    with profiler.memory_budget(32, 'encode 512x512') as usage:
+        planes = rgb_to_ycbcr_blocks(load_rgb(png_512))
+        for name, blocks in zip(COMPONENTS, planes):
+            qt_choice, layer_type = COMPONENT_TABLES[name]
+            H_Encoder(AANDCT(qt_choice).quantize(blocks),
+                      layer_type).encode()
+    # At least the 768 KB RGB buffer was traced.
+    assert 0.75 < usage['peak_mb'] < 32
+
+
+def test_span_records_child_process_peak(memory_profiler):
+    # The OS keeps only the largest child peak, so the child must exceed
+    # every child reaped earlier in this process.
+    size = profiler.child_rss_bytes() + (64 << 20)
+    with profiler.span('sbt'):
+        subprocess.run([sys.executable, '-c',
+                        f'data = b"x" * {size}'], check=True)
+    with profiler.span('after'):
+        pass
+    stats = profiler.memory_summary()
+    assert stats['sbt']['child_rss_mb'] >= size / (1 << 20)
+    assert stats['after']['child_rss_mb'] == 0
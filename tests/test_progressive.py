@@ -0,0 +1,64 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from decoder import decode_image
+from huffman_table import CB, CR, Y
+from progressive import DEFAULT_SCRIPT, ScanSpec, encode_jpeg
+from unittest import JPEGQuantization
+
+HEIGHT, WIDTH = 64, 96
+TABLES = (JPEGQuantization(1).quant_table, JPEGQuantization(2).quant_table)
+
+
+def sparse_blocks(seed, density=0.1, amplitude=20):
+    """Mostly-zero blocks with large enough values for every refinement."""
+    rng = np.random.default_rng(seed)
+    count = HEIGHT * WIDTH // 64
+    blocks = {}
+    for component in (Y, CB, CR):
+        stack = np.zeros((count, 8, 8), dtype=np.int64)
+        mask = rng.random(stack.shape) < density
+        stack[mask] = rng.integers(-amplitude, amplitude + 1, mask.sum())
+        stack[:, 0, 0] = rng.integers(-40, 40, count)
+        stack[::5, 7, 7] = 1
+        blocks[component] = stack
+    return blocks
+
+
+def decode_with_pillow(data):
+    image = Image.open(io.BytesIO(data))
+    assert image.info.get('progressive') or image.info.get('progression')
+    return np.asarray(image.convert('RGB'), dtype=np.float64)
+
+
+# Spectral selection only, no successive approximation.
+SPECTRAL_SCRIPT = tuple(ScanSpec(component, ss, se, 0, 0)
+                        for component in (Y, CB, CR)
+                        for ss, se in ((0, 0), (1, 5), (6, 63)))
+
+
+@pytest.mark.parametrize('script', [DEFAULT_SCRIPT, SPECTRAL_SCRIPT])
+@pytest.mark.parametrize('seed', range(2))
+def test_pillow_decodes_progressive_scans(script, seed):
+    blocks = sparse_blocks(seed)
+    data = encode_jpeg(blocks, WIDTH, HEIGHT, TABLES, script)
+    decoded = decode_with_pillow(data)
+    reference = decode_image(blocks[Y], blocks[CB], blocks[CR], HEIGHT, WIDTH)
+    error = np.abs(decoded - reference)
+    # Only IDCT and color conversion rounding differ from libjpeg.
+    assert error.max() <= 4
+    assert error.mean() < 0.5
+
+
+def test_pillow_decodes_progressive_pipeline_output(quantized):
+    blocks = {Y: quantized['Y'], CB: quantized['Cb'], CR: quantized['Cr']}
+    height, width = 64, 96
+    data = encode_jpeg(blocks, width, height, TABLES)
+    decoded = decode_with_pillow(data)
+    reference = decode_image(blocks[Y], blocks[CB], blocks[CR], height, width)
+    error = np.abs(decoded - reference)
+    assert error.max() <= 4
+    assert error.mean() < 0.5
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from unittest import JPEGDCT, compare_results
+
+
+@pytest.fixture(scope='module')
+def blocks():
+    return np.random.default_rng(0).integers(0, 256, (21, 8, 8))
+
+
+@pytest.mark.parametrize('chunk_blocks', [1, 8, 64])
+def test_process_blocks_matches_process_block(blocks, chunk_blocks):
+    dct = JPEGDCT()
+    expected = np.stack([dct.process_block(block) for block in blocks])
+    np.testing.assert_array_equal(
+        dct.process_blocks(blocks, chunk_blocks=chunk_blocks), expected)
+
+
+def test_compare_results_uses_dumped_blocks(tmp_path, capsys):
+    software = np.arange(5 * 64).reshape(5, 8, 8)
+    dump = tmp_path / 'chisel_quant_Y.txt'
+    np.savetxt(dump, software[:1].ravel(), fmt='%d')
+    assert compare_results(dump, software, 'Y_Quantization')
+    assert 'hardware dumped 1 of 5 blocks' in capsys.readouterr().out
+
+    # Quantization results are compared in units of 10000.
+    software[0, 3, 3] += 10 ** 8
+    assert not compare_results(dump, software, 'Y_Quantization')
+
+
+def test_compare_results_fails_on_extra_hardware_blocks(tmp_path):
+    software = np.arange(2 * 64).reshape(2, 8, 8)
+    dump = tmp_path / 'chisel_quant_Y.txt'
+    np.savetxt(dump, np.tile(software.ravel(), 2), fmt='%d')
+    assert not compare_results(dump, software, 'Y_Quantization')
@@ -0,0 +1,103 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from colorspace import rgb_to_ycbcr_blocks
+from entropy_coding import encode_blocks
+from fastdct import AANDCT
+from huffman_table import COMPONENT_TABLES, COMPONENTS
+from service import BatchEncoder
+
+
+@pytest.fixture(scope='module')
+def images(rgb):
+    """Block stacks of crops of `rgb` with different sizes."""
+    crops = (rgb, rgb[:32, :48], rgb[8:16, 16:40], rgb[16:64, :8], rgb[:8, :8])
+    return [rgb_to_ycbcr_blocks(np.ascontiguousarray(crop)) for crop in crops]
+
+
+def encode_sync(blocks):
+    """The unbatched path: quantize and entropy code one image."""
+    return {name: encode_blocks(
+                AANDCT(COMPONENT_TABLES[name][0]).quantize(component),
+                COMPONENT_TABLES[name][1])
+            for name, component in zip(COMPONENTS, blocks)}
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_concurrent_requests_match_sync_path(images):
+    async def main():
+        async with BatchEncoder(max_latency=0.05) as encoder:
+            results = await asyncio.gather(
+                *(encoder.encode(*blocks) for blocks in images))
+        return encoder, results
+
+    encoder, results = run(main())
+    # Every result belongs to its own request, in submission order.
+    assert results == [encode_sync(blocks) for blocks in images]
+    assert encoder.stats['requests'] == len(images)
+    assert encoder.stats['batches'] < len(images)
+    assert encoder.stats['blocks'] == sum(len(component) for blocks in images
+                                          for component in blocks)
+
+
+def test_full_batches_are_closed_early(images):
+    async def main():
+        # Every request exceeds the limit, so each is a batch of its own.
+        async with BatchEncoder(max_batch_blocks=1,
+                                max_latency=1) as encoder:
+            results = await asyncio.gather(
+                *(encoder.encode(*blocks) for blocks in images))
+        return encoder, results
+
+    encoder, results = run(main())
+    assert results == [encode_sync(blocks) for blocks in images]
+    assert encoder.stats['batches'] == len(images)
+
+
+def test_backpressure_keeps_order(images):
+    async def main():
+        async with BatchEncoder(max_pending=1, max_batch_blocks=64,
+                                max_latency=0) as encoder:
+            return await asyncio.gather(
+                *(encoder.encode(*images[index % len(images)])
+                  for index in range(12)))
+
+    results = run(main())
+    expected = [encode_sync(blocks) for blocks in images]
+    assert results == [expected[index % len(images)] for index in range(12)]
+
+
+def test_stop_finishes_queued_requests(images):
+    async def main():
+        encoder = BatchEncoder(max_latency=1)
+        await encoder.start()
+        tasks = [asyncio.create_task(encoder.encode(*blocks))
+                 for blocks in images]
+        # Let every request reach the queue before stopping.
+        await asyncio.sleep(0)
+        await encoder.stop()
+        assert all(task.done() for task in tasks)
+        with pytest.raises(RuntimeError):
+            await encoder.encode(*images[0])
+        return [task.result() for task in tasks]
+
+    results = run(main())
+    assert results == [encode_sync(blocks) for blocks in images]
+
+
+def test_batch_errors_reach_every_request(images):
+    async def main():
+        async with BatchEncoder(coder='missing', max_latency=0.05) as encoder:
+            results = await asyncio.gather(
+                *(encoder.encode(*blocks) for blocks in images[:2]),
+                return_exceptions=True)
+        return encoder, results
+
+    encoder, results = run(main())
+    assert all(isinstance(result, ValueError) for result in results)
+    assert encoder.stats['requests'] == 0
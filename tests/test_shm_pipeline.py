@@ -0,0 +1,100 @@
+import os
+
+import numpy as np
+import pytest
+
+from fastdct import AANDCT
+from shm_pipeline import SharedArray, SharedBlockPipeline
+
+SHM_DIR = '/dev/shm'
+
+pytestmark = pytest.mark.skipif(not os.path.isdir(SHM_DIR),
+                                reason='no /dev/shm')
+
+
+def shm_entries():
+    return set(os.listdir(SHM_DIR))
+
+
+@pytest.fixture
+def no_leaks():
+    """Fail when a test leaves new entries in /dev/shm."""
+    before = shm_entries()
+    yield
+    assert shm_entries() - before == set()
+
+
+@pytest.fixture(scope='module')
+def plane():
+    """A level-shifted 40x64 sample plane."""
+    return np.random.default_rng(0).integers(-128, 128, (40, 64),
+                                             dtype=np.int16)
+
+
+def plane_blocks(plane):
+    height, width = plane.shape
+    return plane.reshape(height // 8, 8, width // 8, 8).swapaxes(1, 2) \
+        .reshape(-1, 8, 8)
+
+
+def test_quantize_matches_aandct(plane, no_leaks):
+    blocks = plane_blocks(plane)
+    # Small chunks so the work is split over several tasks.
+    with SharedBlockPipeline(workers=2, chunk_blocks=7) as pipeline:
+        for qt_choice in (1, 2):
+            expected = AANDCT(qt_choice).quantize(blocks)
+            np.testing.assert_array_equal(
+                pipeline.quantize(plane, qt_choice), expected)
+            np.testing.assert_array_equal(
+                pipeline.quantize(blocks, qt_choice), expected)
+        assert pipeline._segments == {}
+    assert pipeline.closed
+
+
+def test_shared_run_is_freed_on_close(plane, no_leaks):
+    with SharedBlockPipeline(workers=2, chunk_blocks=16) as pipeline:
+        source, _ = pipeline.share(plane)
+        target = pipeline.run(source, qt_choice=1)
+        np.testing.assert_array_equal(
+            pipeline.view(target),
+            AANDCT(1).quantize(plane_blocks(plane)))
+        names = {source.name, target.name}
+        assert names <= shm_entries()
+    assert not names & shm_entries()
+    with pytest.raises(ValueError):
+        pipeline.allocate((1, 8, 8), np.int32)
+
+
+def test_invalid_plane_frees_its_copy(no_leaks):
+    with SharedBlockPipeline(workers=1) as pipeline:
+        with pytest.raises(ValueError):
+            pipeline.quantize(np.zeros((12, 16), dtype=np.int16))
+        assert pipeline._segments == {}
+
+
+def test_worker_error_releases_segments(no_leaks):
+    with pytest.raises(FileNotFoundError):
+        with SharedBlockPipeline(workers=1) as pipeline:
+            # The worker cannot attach the source.
+            try:
+                pipeline.run(SharedArray('missing_block_source', (4, 8, 8),
+                                         '<i2'))
+            finally:
+                assert pipeline._segments == {}
+
+
+def test_garbage_collected_pipeline_releases_segments(plane, no_leaks):
+    pipeline = SharedBlockPipeline(workers=1)
+    source, _ = pipeline.share(plane)
+    assert source.name in shm_entries()
+    del pipeline
+    assert source.name not in shm_entries()
+
+
+def test_error_in_with_block_releases_segments(plane, no_leaks):
+    with pytest.raises(RuntimeError):
+        with SharedBlockPipeline(workers=1) as pipeline:
+            source, _ = pipeline.share(plane)
+            pipeline.run(source, qt_choice=2)
+            raise RuntimeError('caller failed')
+    assert pipeline.closed
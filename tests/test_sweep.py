@@ -0,0 +1,48 @@
+import csv
+import json
+
+from PIL import Image
+
+from sweep import (FIELDS, parse_qualities, rate_distortion, run_sweep,
+                   sweep_image, write_records)
+
+QUALITIES = (30, 90)
+
+
+def test_quality_is_monotonic(rgb):
+    low, high = sweep_image(rgb, QUALITIES)
+    assert (low['quality'], high['quality']) == QUALITIES
+    assert low['bytes'] < high['bytes']
+    assert low['bpp'] < high['bpp']
+    assert 20 < low['psnr'] < high['psnr']
+    assert 0 < low['ssim'] < high['ssim'] <= 1
+    assert high['bpp'] == 8 * high['bytes'] / rgb[..., 0].size
+
+
+def test_corpus_records_and_curve(rgb, tmp_path):
+    paths = [tmp_path / 'a.png', tmp_path / 'b.png']
+    Image.fromarray(rgb).save(paths[0])
+    Image.fromarray(rgb[:, ::-1].copy()).save(paths[1])
+    # An unreadable file is reported and skipped.
+    (tmp_path / 'broken.png').write_bytes(b'not an image')
+    records = run_sweep([str(path) for path in paths]
+                        + [str(tmp_path / 'broken.png')], QUALITIES)
+    assert len(records) == 4
+    curve = rate_distortion(records)
+    assert [point['quality'] for point in curve] == list(QUALITIES)
+    assert [point['images'] for point in curve] == [2, 2]
+    assert curve[0]['bpp'] < curve[1]['bpp']
+    assert curve[0]['psnr'] < curve[1]['psnr']
+
+    write_records(records, str(tmp_path / 'sweep.csv'))
+    with open(tmp_path / 'sweep.csv', newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == 4 and tuple(rows[0]) == FIELDS
+    write_records(records, str(tmp_path / 'sweep.json'))
+    with open(tmp_path / 'sweep.json') as f:
+        assert json.load(f)['rate_distortion'] == curve
+
+
+def test_parse_qualities():
+    assert parse_qualities('10:30:10') == (10, 20, 30)
+    assert parse_qualities('50,75,90') == (50, 75, 90)
@@ -0,0 +1,33 @@
+import numpy as np
+
+from entropy_coding import decode_blocks, encode_blocks
+from huffman_table import COMPONENT_TABLES
+from transcode import requantize, transcode_image
+from unittest import JPEGQuantization
+
+
+def payloads(quantized):
+    return {name: encode_blocks(blocks, COMPONENT_TABLES[name][1])
+            for name, blocks in quantized.items()}
+
+
+def test_requantize_rounds_levels():
+    old, new = np.full((8, 8), 3), np.full((8, 8), 2)
+    blocks = np.zeros((1, 8, 8), dtype=np.int32)
+    blocks[0, 0, :3] = 5, -5, 1
+    result = requantize(blocks, old, new)
+    # 7.5 and -7.5 round to even, 1.5 to 2.
+    np.testing.assert_array_equal(result[0, 0, :3], [8, -8, 2])
+    np.testing.assert_array_equal(requantize(blocks, old, old), blocks)
+
+
+def test_transcode_image(quantized):
+    coded = payloads(quantized)
+    assert transcode_image(coded, None) == coded
+    smaller = transcode_image(coded, 40)
+    assert sum(map(len, smaller.values())) < sum(map(len, coded.values()))
+    for name, (qt_choice, layer_type) in COMPONENT_TABLES.items():
+        expected = requantize(quantized[name], JPEGQuantization(qt_choice),
+                              JPEGQuantization(qt_choice, 40))
+        np.testing.assert_array_equal(
+            decode_blocks(smaller[name], layer_type), expected)
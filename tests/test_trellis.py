@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from bitcost import block_bits
+from colorspace import rgb_to_ycbcr_blocks
+from fastdct import AANDCT
+from huffman_table import CHROMINANCE, LUMINANCE
+from trellis import TrellisQuantizer
+from unittest import JPEGQuantization
+
+LAYERS = ((0, 1, LUMINANCE), (1, 2, CHROMINANCE), (2, 2, CHROMINANCE))
+
+
+@pytest.fixture(scope='module')
+def coefficients(rgb):
+    """[(dct, qt_choice, layer_type)] of the Y, Cb and Cr planes of `rgb`."""
+    planes = rgb_to_ycbcr_blocks(rgb)
+    return [(AANDCT(qt_choice, dtype=np.float64).dct(planes[index]),
+             qt_choice, layer_type)
+            for index, qt_choice, layer_type in LAYERS]
+
+
+def test_zero_lambda_is_plain_rounding(coefficients):
+    for dct, qt_choice, layer_type in coefficients:
+        quant_table = JPEGQuantization(qt_choice).quant_table
+        levels = TrellisQuantizer(qt_choice, layer_type, 0,
+                                  batch_blocks=7).quantize(dct)
+        np.testing.assert_array_equal(levels, np.round(dct / quant_table))
+
+
+def test_larger_lambda_never_costs_more_bits(coefficients):
+    for dct, qt_choice, layer_type in coefficients:
+        previous = None
+        for lam in (0, 10, 100, 1000, 10000):
+            levels = TrellisQuantizer(qt_choice, layer_type,
+                                      lam).quantize(dct)
+            bits = block_bits(levels, layer_type)
+            if previous is not None:
+                assert (bits <= previous).all()
+            previous = bits
+        assert previous.sum() < block_bits(
+            TrellisQuantizer(qt_choice, layer_type, 0).quantize(dct),
+            layer_type).sum()
@@ -0,0 +1,96 @@
+"""DCT-domain requantization (transcoding) of entropy-coded payloads.
+
+Lowering the quality of an existing stream does not need pixels: a stored
+level q_old * Q_old is simply requantized with the new table,
+
+    q_new = round(q_old * Q_old / Q_new)
+
+and re-entropy-coded. The payloads are decoded to quantized coefficients
+and coded again; no IDCT, color conversion or DCT runs, and the result has
+no extra generation loss from a pixel round trip.
+
+    payloads = BatchEncoder output or {'Y': ..., 'Cb': ..., 'Cr': ...}
+    smaller = transcode_image(payloads, quality=40)
+"""
+import numpy as np
+
+import srcpath  # noqa: F401
+import profiler
+from entropy_coding import HUFFMAN, decode_blocks, encode_blocks
+from huffman_table import COMPONENT_TABLES
+from unittest import JPEGQuantization
+
+
+def _table(quantization):
+    if isinstance(quantization, JPEGQuantization):
+        return quantization.quant_table
+    return np.asarray(quantization)
+
+
+def requantize(blocks, old_quantization, new_quantization):
+    """Requantize coefficient blocks from one table to another.
+
+    Args:
+        blocks           : (N, 8, 8) coefficients quantized with the old
+                           table.
+        old_quantization : `JPEGQuantization` (or (8, 8) table) the blocks
+                           were quantized with.
+        new_quantization : `JPEGQuantization` (or (8, 8) table) to quantize
+                           with.
+
+    Returns:
+        (N, 8, 8) int32 blocks, `np.round(blocks * old / new)` (ties to even,
+        as `JPEGQuantization.quantize`).
+    """
+    old_table = _table(old_quantization).astype(np.int64)
+    new_table = _table(new_quantization).astype(np.int64)
+    levels = np.asarray(blocks, dtype=np.int64).reshape(-1, 8, 8)
+    if np.array_equal(old_table, new_table):
+        return levels.astype(np.int32)
+    # Both products are integers, so the quotient is correctly rounded and
+    # exact halves stay exact.
+    return np.round(levels * old_table / new_table).astype(np.int32)
+
+
+@profiler.traced()
+def transcode_payload(payload, layer_type, old_quantization, new_quantization,
+                      coder=HUFFMAN, new_coder=None):
+    """Requantize one `encode_blocks` payload.
+
+    Args:
+        payload          : Bytes produced by `entropy_coding.encode_blocks`.
+        layer_type       : {LUMINANCE or CHROMINANCE}
+        old_quantization : Table the payload was quantized with.
+        new_quantization : Table to requantize to.
+        coder            : Entropy coder of the payload.
+        new_coder        : Entropy coder of the result; `coder` if None.
+
+    Returns:
+        bytes : The requantized payload.
+    """
+    blocks = decode_blocks(payload, layer_type, coder)
+    blocks = requantize(blocks, old_quantization, new_quantization)
+    profiler.count("quantized_blocks", len(blocks))
+    return encode_blocks(blocks, layer_type, new_coder or coder)
+
+
+def transcode_image(payloads, quality, old_quality=None, coder=HUFFMAN):
+    """Requantize the Y, Cb and Cr payloads of an image to a new quality.
+
+    Args:
+        payloads    : {'Y': bytes, 'Cb': bytes, 'Cr': bytes}, e.g. from
+                      `service.BatchEncoder.encode`.
+        quality     : Target quality factor (1-100), or None for the fixed
+                      tables.
+        old_quality : Quality the payloads were coded at; None for the
+                      fixed tables.
+        coder       : Entropy coder of the payloads and the result.
+
+    Returns:
+        dict : {'Y': bytes, 'Cb': bytes, 'Cr': bytes}
+    """
+    return {name: transcode_payload(
+                payloads[name], layer_type,
+                JPEGQuantization(qt_choice, old_quality),
+                JPEGQuantization(qt_choice, quality), coder)
+            for name, (qt_choice, layer_type) in COMPONENT_TABLES.items()}
@@ -0,0 +1,139 @@
+"""Rate-distortion optimized (trellis) quantization.
+
+For every block the AC coefficients are visited in zig-zag order and a
+dynamic program picks, per coefficient, between the rounded level, the
+level one step closer to zero, or zero (extending the current run), and
+where the block ends (EOB placement). The cost minimized is
+
+    distortion + lambda * bits
+
+with distortion the squared error of the dequantized coefficient and bits
+the active Huffman code lengths plus amplitude bits, including ZRL codes
+for runs of 16 or more. The DC coefficient is plain-rounded, as its cost
+depends on the neighbouring block through DC prediction. All blocks of a
+batch advance through the trellis together.
+"""
+import numpy as np
+
+import srcpath  # noqa: F401
+from bitcost import NO_CODE, code_length_tables
+from huffman_table import EOB, ZRL, ZIG_ZAG_INDEX, bit_length, to_zig_zag
+from unittest import JPEGQuantization
+
+# Cost given to symbols that have no codeword, so they are never chosen.
+_NO_CODE_BITS = 1e9
+
+
+class TrellisQuantizer:
+    def __init__(self, quantization, layer_type, lam, code_lengths=None,
+                 batch_blocks=4096):
+        """Create an RDO quantizer.
+
+        Args:
+            quantization : A `JPEGQuantization` or a qt_choice.
+            layer_type   : {LUMINANCE or CHROMINANCE}, selects the Huffman
+                           table whose code lengths price each symbol.
+            lam          : Lagrange multiplier, in squared-error units per
+                           bit. 0 gives plain rounding; larger values trade
+                           fidelity for fewer bits.
+            code_lengths : Optional tables of `bitcost.code_length_tables`
+                           (e.g. optimized tables) overriding the baseline.
+            batch_blocks : Blocks processed per vectorized batch.
+        """
+        if not isinstance(quantization, JPEGQuantization):
+            quantization = JPEGQuantization(qt_choice=quantization)
+        self.quantization = quantization
+        self.lam = float(lam)
+        self.batch_blocks = batch_blocks
+        if code_lengths is None:
+            code_lengths = code_length_tables(layer_type)
+        _, ac_lengths = code_lengths
+        ac_bits = np.where(ac_lengths == NO_CODE, _NO_CODE_BITS,
+                           ac_lengths).astype(np.float64)
+        self._eob_bits = ac_bits[EOB]
+        # _run_bits[run, size]: codeword bits of a nonzero coefficient of
+        # category `size` after `run` zeros, ZRL codes included.
+        runs = np.arange(64)
+        self._run_bits = (ac_bits[runs % 16]
+                          + (runs // 16)[:, None] * ac_bits[ZRL])
+        self._steps = np.empty(64)
+        self._steps[ZIG_ZAG_INDEX.ravel()] = \
+            self.quantization.quant_table.ravel()
+
+    def quantize(self, dct_blocks):
+        """Quantize orthonormal DCT coefficients (e.g. `AANDCT.dct`).
+
+        Args:
+            dct_blocks : (N, 8, 8) DCT coefficients.
+
+        Returns:
+            (N, 8, 8) int32 quantized coefficients.
+        """
+        zig_zag = to_zig_zag(np.asarray(dct_blocks, dtype=np.float64))
+        levels = np.empty(zig_zag.shape, dtype=np.int32)
+        for start in range(0, len(zig_zag), self.batch_blocks):
+            stop = start + self.batch_blocks
+            levels[start:stop] = self._quantize_batch(zig_zag[start:stop])
+        return levels[:, ZIG_ZAG_INDEX]
+
+    def _quantize_batch(self, coefficients):
+        count = len(coefficients)
+        steps = self._steps
+        lam = self.lam
+        rows = np.arange(count)
+
+        rounded = np.rint(coefficients / steps)
+        # Candidate levels: rounded, and one step toward zero when that is
+        # still nonzero. Zero is reached by extending a run instead.
+        candidates = np.stack((rounded, rounded - np.sign(rounded)), axis=2)
+        candidates[:, :, 1][np.abs(rounded) < 2] = 0
+        sizes = bit_length(candidates).astype(np.intp)
+        error = (coefficients[:, :, None] - candidates * steps[None, :, None])
+        distortion = error ** 2
+        # Squared error of zeroing positions [0, k) cumulatively.
+        zero_cost = np.concatenate(
+            (np.zeros((count, 1)), np.cumsum(coefficients ** 2, axis=1)),
+            axis=1
+        )
+
+        # cost[:, j]: best cost of positions 1..j with j the last nonzero
+        # coefficient so far (j = 0: no AC coefficient yet).
+        cost = np.full((count, 64), np.inf)
+        cost[:, 0] = 0.0
+        previous = np.zeros((count, 64, 2), dtype=np.int8)
+        choice = np.zeros((count, 64), dtype=np.int8)
+        for i in range(1, 64):
+            runs = i - 1 - np.arange(i)
+            # Cost of reaching i from every earlier j, zeros in between.
+            reach = cost[:, :i] + zero_cost[:, [i]] - zero_cost[:, 1:i + 1]
+            best_cost = np.full((count, 2), np.inf)
+            for c in range(2):
+                level_sizes = sizes[:, i, c]
+                bits = (self._run_bits[runs][:, level_sizes].T
+                        + level_sizes[:, None])
+                total = reach + lam * bits
+                best_j = np.argmin(total, axis=1)
+                previous[:, i, c] = best_j
+                valid = candidates[:, i, c] != 0
+                best_cost[:, c] = np.where(
+                    valid, total[rows, best_j] + distortion[:, i, c], np.inf
+                )
+            choice[:, i] = np.argmin(best_cost, axis=1)
+            cost[:, i] = best_cost[rows, choice[:, i]]
+
+        # Every block ends with EOB in the `H_Encoder` stream.
+        final = cost + (zero_cost[:, [64]] - zero_cost[:, 1:65]) \
+            + lam * self._eob_bits
+        position = np.argmin(final, axis=1)
+
+        levels = np.zeros((count, 64), dtype=np.int32)
+        levels[:, 0] = rounded[:, 0]
+        active = position > 0
+        while active.any():
+            idx = rows[active]
+            pos = position[active]
+            picked = choice[idx, pos]
+            levels[idx, pos] = candidates[idx, pos, picked]
+            position[active] = previous[idx, pos, picked]
+            active = position > 0
+        return levels
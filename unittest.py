@@ -1,3 +1,4 @@
+import os
 import numpy as np
 import subprocess
 import time
@@ -29,9 +30,54 @@ class JPEGDCT:
                 dct_block[u][v] = final // 4
 
         return dct_block
+
+    def process_blocks(self, blocks, chunk_blocks=8192):
+        """Bit-exact batched version of `process_block`.
+
+        Args:
+            blocks: (N, 8, 8) stack of input blocks
+            chunk_blocks: Number of blocks transformed per vectorized step;
+                the per-step intermediate is 8 times the chunk size
+
+        Returns:
+            (N, 8, 8) int64 stack, identical to calling `process_block` on
+            every block
+        """
+        N = 8
+        blocks = np.asarray(blocks).reshape(-1, N, N)
+        out = np.empty(blocks.shape, dtype=np.int64)
+        for start in range(0, len(blocks), chunk_blocks):
+            stop = min(start + chunk_blocks, len(blocks))
+            out[start:stop] = self._process_chunk(blocks[start:stop])
+        return out
+
+    def _process_chunk(self, blocks):
+        N = 8
+        shifted = blocks.astype(np.int64) - 128
+        k = np.arange(N)
+        # cos_table[u, i] == int(np.cos((2 * i + 1) * u * np.pi / 16) * 100)
+        cos_table = (np.cos(np.outer(k, 2 * k + 1) * np.pi / 16) * 100)
+        cos_table = np.trunc(cos_table).astype(np.int64)
+        alpha = np.full(N, 100, dtype=np.int64)
+        alpha[0] = int((1.0 / np.sqrt(2)) * 100)
+
+        # (pixel_value * cos_i) // 100 for every (block, u, i, j)
+        partial = (shifted[:, None, :, :] * cos_table[None, :, :, None]) // 100
+        sum_val = np.einsum('nuij,vj->nuv', partial, cos_table)
+        intermediate = (sum_val * alpha[None, :, None]) // 100
+        final = (intermediate * alpha[None, None, :]) // 100
+        return final // 4
+def scale_quant_table(quant_table, quality):
+    """Scale a base table to a 1-100 quality factor (IJG convention)"""
+    if not 1 <= quality <= 100:
+        raise ValueError(f"Quality must be within [1, 100], got {quality}")
+    scale = 5000 // quality if quality < 50 else 200 - 2 * quality
+    return np.clip((quant_table * scale + 50) // 100, 1, 255)
+
 class JPEGQuantization:
-    def __init__(self, qt_choice=1):
+    def __init__(self, qt_choice=1, quality=None):
         self.qt_choice = qt_choice
+        self.quality = quality
         # Define quantization tables based on qt_choice
         if qt_choice == 1:  # Luminance (Y)
             self.quant_table = np.array([
@@ -55,10 +101,30 @@ class JPEGQuantization:
                 [99, 99, 99, 99, 99, 99, 99, 99],
                 [99, 99, 99, 99, 99, 99, 99, 99]
             ])
+        # quality=None keeps the fixed tables the hardware uses
+        if quality is not None:
+            self.quant_table = scale_quant_table(self.quant_table, quality)
 
     def quantize(self, dct_block):
         """Quantize the DCT coefficients"""
         return np.round(dct_block / self.quant_table).astype(np.int32)
+
+    def reciprocal_table(self, scale=1.0):
+        """Multipliers that quantize coefficients carrying a known scale
+
+        round(coefficient * scale * reciprocal_table(scale)) equals
+        quantize(coefficient), which lets a scaled transform (e.g. AAN)
+        quantize with one multiply.
+        """
+        return 1.0 / (self.quant_table * np.asarray(scale, dtype=np.float64))
+
+    def quantize_rdo(self, dct_blocks, layer_type, lam):
+        """Rate-distortion optimized quantization of (N, 8, 8) coefficients
+
+        See trellis.TrellisQuantizer; lam=0 matches quantize.
+        """
+        from trellis import TrellisQuantizer
+        return TrellisQuantizer(self, layer_type, lam).quantize(dct_blocks)
     
 class JPEGZigzag:
     def __init__(self):
@@ -77,6 +143,11 @@ class JPEGZigzag:
     def scan(self, block):
         """Convert block to 1D array in zigzag order"""
         return [block[i][j] for i, j in self.zigzag_order]
+
+    def scan_blocks(self, blocks):
+        """Zigzag scan a (N, 8, 8) stack into a (N, 64) array"""
+        rows, cols = zip(*self.zigzag_order)
+        return np.asarray(blocks)[:, list(rows), list(cols)]
     
 class JPEGTest:
     @staticmethod
@@ -119,44 +190,127 @@ class JPEGTest:
         
         return zigzag_result
     
-def compare_results(hw_file, sw_result, stage_name, threshold=1000):
+def load_stage_values(path):
+    """
+    Load a stage dump as a (num_blocks, 64) int64 array
+
+    Only `.npy` dumps are memory-mapped (not read up front). Text dumps, one
+    value per line as written by the Chisel tests, are parsed in full with
+    np.loadtxt, the fastest of numpy's text readers here.
+    """
+    if str(path).endswith('.npy'):
+        values = np.load(path, mmap_mode='r')
+    else:
+        values = np.loadtxt(path, dtype=np.int64)
+    return values.reshape(-1, 64)
+
+def compare_blocks(hw_values, sw_values, stage_name, threshold=1000,
+                   worst=5, fail_fast=False, chunk_blocks=65536):
+    """
+    Compare every block of a hardware and a software stage output
+
+    Args:
+        hw_values: (N, 64) or (N, 8, 8) hardware output, may be a memmap
+        sw_values: Software output with the same number of values per block
+        stage_name: Name used to pick the stage scaling (DCT, Quantization,
+            Zigzag) like `compare_results`
+        threshold: A block passes when its max absolute error is below this
+        worst: Number of worst offending blocks to report
+        fail_fast: Stop after the first chunk that contains a failing block
+        chunk_blocks: Number of blocks compared per vectorized step
+
+    Returns:
+        Dictionary with the per-block max error, the worst blocks as
+        (block index, max error) pairs and the first failing block
+    """
+    hw_values = np.asarray(hw_values).reshape(-1, 64)
+    sw_values = np.asarray(sw_values).reshape(-1, 64)
+    if hw_values.shape != sw_values.shape:
+        raise ValueError(f"{stage_name}: hardware has {hw_values.shape[0]} "
+                         f"blocks, software has {sw_values.shape[0]}")
+
+    hw_scale = 10000 if 'DCT' in stage_name else 1
+    sw_scale = 10000 if ('Quantization' in stage_name
+                         or 'Zigzag' in stage_name) else 1
+
+    num_blocks = hw_values.shape[0]
+    block_max = np.zeros(num_blocks, dtype=np.int64)
+    first_failure = None
+    checked = 0
+    for start in range(0, num_blocks, chunk_blocks):
+        stop = min(start + chunk_blocks, num_blocks)
+        hw_chunk = hw_values[start:stop].astype(np.int64) // hw_scale
+        sw_chunk = sw_values[start:stop].astype(np.int64) // sw_scale
+        block_max[start:stop] = np.abs(hw_chunk - sw_chunk).max(axis=1)
+        checked = stop
+        failing = np.flatnonzero(block_max[start:stop] >= threshold)
+        if failing.size:
+            if first_failure is None:
+                first_failure = start + int(failing[0])
+            if fail_fast:
+                break
+
+    block_max = block_max[:checked]
+    order = np.argsort(block_max, kind='stable')[::-1][:worst]
+    return {
+        'stage': stage_name,
+        'passed': first_failure is None,
+        'blocks_checked': checked,
+        'blocks_total': num_blocks,
+        'max_diff': int(block_max.max()) if checked else 0,
+        'block_max_diff': block_max,
+        'worst_blocks': [(int(i), int(block_max[i])) for i in order],
+        'first_failure': first_failure,
+    }
+
+def report_comparison(result):
+    """Print the outcome of `compare_blocks`"""
+    stage_name = result['stage']
+    blocks = f"{result['blocks_checked']}/{result['blocks_total']} blocks"
+    if result['passed']:
+        print(f"Test {stage_name}: PASS ({blocks})")
+        return
+    print(f"Test {stage_name}: FAIL (max diff: {result['max_diff']}, "
+          f"first failing block: {result['first_failure']}, {blocks})")
+    worst = ", ".join(f"#{idx}: {err}" for idx, err in result['worst_blocks'])
+    print(f"Worst blocks: {worst}")
+
+def compare_results(hw_file, sw_result, stage_name, threshold=1000,
+                    fail_fast=False):
     try:
-        hw_values = np.loadtxt(hw_file, dtype=np.int64)
-        
-        if isinstance(sw_result, list):
-            sw_result = np.array(sw_result, dtype=np.int64)
-        else:
-            sw_result = sw_result.astype(np.int64)
-            
-        if len(hw_values.shape) == 2:
-            hw_values = hw_values.flatten()
-        if len(sw_result.shape) == 2:
-            sw_result = sw_result.flatten()
-            
-        # For DCT stage
-        if 'DCT' in stage_name:
-            hw_values = hw_values // 10000
-            
-        # For both Quantization and ZigZag stages
-        if 'Quantization' in stage_name or 'Zigzag' in stage_name:
-            sw_result = sw_result // 10000
-            
-        diff = np.abs(hw_values - sw_result)
-        max_diff = np.max(diff)
-        
-        if max_diff < threshold:
-            print(f"Test {stage_name}: PASS")
-            return True
-        else:
-            print(f"Test {stage_name}: FAIL (max diff: {max_diff:.2f})")
+        hw_values = load_stage_values(hw_file)
+        sw_result = np.asarray(sw_result, dtype=np.int64).reshape(-1, 64)
+        # jpegTester.scala simulates and dumps only the first block of each
+        # component, so only the blocks the hardware emitted are compared;
+        # a dump with more blocks than the software run still fails.
+        sw_blocks = sw_result.shape[0]
+        if 0 < hw_values.shape[0] < sw_blocks:
+            print(f"{stage_name}: hardware dumped {hw_values.shape[0]} of "
+                  f"{sw_blocks} blocks, comparing those only")
+            sw_result = sw_result[:hw_values.shape[0]]
+
+        result = compare_blocks(hw_values, sw_result, stage_name,
+                                threshold=threshold, fail_fast=fail_fast)
+        report_comparison(result)
+        if not result['passed']:
             print(f"Hardware range: [{np.min(hw_values)}, {np.max(hw_values)}]")
             print(f"Software range: [{np.min(sw_result)}, {np.max(sw_result)}]")
-            return False
-            
+        return result['passed']
+
     except Exception as e:
         print(f"Test {stage_name}: ERROR - {str(e)}")
         return False
-def test_full_pipeline():
+def read_component_blocks(component, output_dir="hw_output"):
+    """Read every `<component>_block_<idx>.txt` input block as (N, 8, 8)"""
+    prefix = f"{component.lower()}_block_"
+    indices = sorted(int(name[len(prefix):-len('.txt')])
+                     for name in os.listdir(output_dir)
+                     if name.startswith(prefix) and name.endswith('.txt'))
+    if not indices:
+        raise FileNotFoundError(f"No {prefix}*.txt files in {output_dir}")
+    return np.stack([JPEGTest.read_block(f"{output_dir}/{prefix}{idx}.txt")
+                     for idx in indices])
+def test_full_pipeline(fail_fast=False):
     try:
         print("\nRunning hardware test...")
         hw_start_time = time.time()
@@ -182,12 +336,11 @@ def test_full_pipeline():
         ]
         for comp, qt_choice in components:
             print(f"\nTesting {comp} component:")
-            test = JPEGTest()
-            input_block = test.read_block(f"hw_output/{comp.lower()}_block_0.txt")
+            input_blocks = read_component_blocks(comp)
             
             # DCT
             dct = JPEGDCT()
-            sw_dct = dct.process_block(input_block)
+            sw_dct = dct.process_blocks(input_blocks)
             
             # Quantization
             quant = JPEGQuantization(qt_choice=qt_choice)
@@ -195,11 +348,11 @@ def test_full_pipeline():
             
             # Zigzag
             zigzag = JPEGZigzag()
-            sw_zigzag = zigzag.scan(sw_quant)
+            sw_zigzag = zigzag.scan_blocks(sw_quant)
             
-            compare_results(f"hw_output/chisel_dct_{comp}.txt", sw_dct, f"{comp}_DCT")
-            compare_results(f"hw_output/chisel_quant_{comp}.txt", sw_quant, f"{comp}_Quantization")
-            compare_results(f"hw_output/chisel_zigzag_{comp}.txt", sw_zigzag, f"{comp}_Zigzag")
+            compare_results(f"hw_output/chisel_dct_{comp}.txt", sw_dct, f"{comp}_DCT", fail_fast=fail_fast)
+            compare_results(f"hw_output/chisel_quant_{comp}.txt", sw_quant, f"{comp}_Quantization", fail_fast=fail_fast)
+            compare_results(f"hw_output/chisel_zigzag_{comp}.txt", sw_zigzag, f"{comp}_Zigzag", fail_fast=fail_fast)
             
     except Exception as e:
         print(f"Error during testing: {e}")
@@ -2,6 +2,8 @@ import numpy as np
 from PIL import Image
 import argparse
 
+from ingest import load_rgb
+
 if __name__ == "__main__":
     # 設定命令行參數解析
     parser = argparse.ArgumentParser(description='Convert image to BMP format')
@@ -9,16 +11,14 @@ if __name__ == "__main__":
     parser.add_argument('--output', '-o', type=str, default='output.bmp', 
                         help='Output BMP file path (default: output.bmp)')
     parser.add_argument('--quality', '-q', type=int, default=100,
-                        help='Output quality 0-100 (default: 100)')
+                        help='Output quality 0-100 for lossy formats such as '
+                             'JPEG; BMP is lossless and ignores it '
+                             '(default: 100)')
     
     args = parser.parse_args()
     
-    # 開啟圖片
-    img = Image.open(args.input_path)
-    
-    # 確保圖片是 RGB 模式
-    if img.mode != 'RGB':
-        img = img.convert('RGB')
+    # 開啟圖片 (RGB)
+    img = Image.fromarray(np.ascontiguousarray(load_rgb(args.input_path)))
     
-    # 儲存為 BMP
-    img.save(args.output, "BMP", quality=args.quality)
\ No newline at end of file
+    # 依副檔名儲存, quality 只影響有損格式
+    img.save(args.output, quality=args.quality)
\ No newline at end of file